@@ -8,6 +8,14 @@
 // Buffer settings
 #define SERIAL_BUFFER_SIZE 256
 
+// Binary framing (see middleware/serial_protocol.py)
+// Frame: SYNC | OPCODE | R | G | B | CRC8(OPCODE..B), reply: SYNC | (ACK_FLAG | OPCODE) or SYNC | NAK
+#define FRAME_SYNC 0xA5
+#define FRAME_LENGTH 6
+#define FRAME_OP_SET_RGB 0x01
+#define FRAME_ACK_FLAG 0x80
+#define FRAME_NAK 0x7F
+
 // LED settings
 #define MAX_LEDS 60
 #define LED_PIN 4
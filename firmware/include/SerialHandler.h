@@ -15,7 +15,16 @@ private:
     unsigned long lastReceiveTime;
     ColorCallback colorCallback;
 
+    // Binary frame state; frameIndex > 0 while a frame is being received
+    uint8_t frame[FRAME_LENGTH];
+    int frameIndex;
+    // Set once the middleware negotiates binary framing; silences verbose output
+    bool binaryMode;
+
     void processReceivedData();
+    void processFrame();
+    void sendReply(uint8_t status);
+    static uint8_t crc8(const uint8_t *data, size_t length);
     void clearBuffer();
     void debugPrint(const String &message);
     bool parseRGBCommand(const String &data, uint8_t &r, uint8_t &g, uint8_t &b, uint8_t &brightness);
@@ -25,6 +34,7 @@ public:
     void begin();
     void handleIncomingData();
     bool isDataAvailable();
+    bool isBinaryMode();
     void setColorCallback(ColorCallback callback);
 };
 
@@ -3,6 +3,8 @@
 SerialHandler::SerialHandler()
 {
     bufferIndex = 0;
+    frameIndex = 0;
+    binaryMode = false;
     lastReceiveTime = 0;
     colorCallback = nullptr;
     clearBuffer();
@@ -27,6 +29,18 @@ void SerialHandler::handleIncomingData()
         char incomingByte = Serial.read();
         lastReceiveTime = millis();
 
+        // Binary frames start with a sync byte that never appears in text commands
+        if (frameIndex > 0 || (bufferIndex == 0 && (uint8_t)incomingByte == FRAME_SYNC))
+        {
+            frame[frameIndex++] = (uint8_t)incomingByte;
+            if (frameIndex == FRAME_LENGTH)
+            {
+                processFrame();
+                frameIndex = 0;
+            }
+            continue;
+        }
+
         // Handle different line endings and process complete messages
         if (incomingByte == '\n' || incomingByte == '\r')
         {
@@ -52,17 +66,82 @@ void SerialHandler::handleIncomingData()
     }
 
     // Timeout handling - clear buffer if no data received for a while
-    if (bufferIndex > 0 && (millis() - lastReceiveTime) > SERIAL_TIMEOUT)
+    if ((bufferIndex > 0 || frameIndex > 0) && (millis() - lastReceiveTime) > SERIAL_TIMEOUT)
     {
         debugPrint("Serial timeout - clearing buffer");
         clearBuffer();
+        frameIndex = 0;
+    }
+}
+
+void SerialHandler::processFrame()
+{
+    // frame[0] is the sync byte; the CRC covers opcode and payload
+    if (crc8(&frame[1], FRAME_LENGTH - 2) != frame[FRAME_LENGTH - 1] || frame[1] != FRAME_OP_SET_RGB)
+    {
+        sendReply(FRAME_NAK);
+        return;
+    }
+
+    sendReply(FRAME_ACK_FLAG | FRAME_OP_SET_RGB);
+    if (colorCallback != nullptr)
+    {
+        colorCallback(frame[2], frame[3], frame[4], 255);
+    }
+}
+
+void SerialHandler::sendReply(uint8_t status)
+{
+    uint8_t reply[2] = {FRAME_SYNC, status};
+    Serial.write(reply, sizeof(reply));
+}
+
+uint8_t SerialHandler::crc8(const uint8_t *data, size_t length)
+{
+    // CRC-8/SMBUS: polynomial 0x07, initial value 0x00
+    uint8_t crc = 0;
+    for (size_t i = 0; i < length; i++)
+    {
+        crc ^= data[i];
+        for (int bit = 0; bit < 8; bit++)
+        {
+            crc = (crc & 0x80) ? (uint8_t)((crc << 1) ^ 0x07) : (uint8_t)(crc << 1);
+        }
     }
+    return crc;
 }
 
 void SerialHandler::processReceivedData()
 {
     String receivedData = String(buffer);
 
+    // Binary framing negotiation from the middleware
+    if (receivedData == "PROTO:BIN")
+    {
+        binaryMode = true;
+        Serial.println("PROTO:BIN OK");
+        return;
+    }
+
+    // In binary mode only the minimum is sent back over the link
+    if (binaryMode)
+    {
+        if (receivedData.startsWith("RGB:"))
+        {
+            uint8_t r, g, b, brightness;
+            if (parseRGBCommand(receivedData, r, g, b, brightness) && colorCallback != nullptr)
+            {
+                colorCallback(r, g, b, brightness);
+            }
+        }
+        else
+        {
+            Serial.print("Echo: ");
+            Serial.println(receivedData);
+        }
+        return;
+    }
+
     // Print received data
     Serial.println("=== Received Data ===");
     Serial.print("Raw data: ");
@@ -113,9 +192,14 @@ bool SerialHandler::isDataAvailable()
     return Serial.available() > 0;
 }
 
+bool SerialHandler::isBinaryMode()
+{
+    return binaryMode;
+}
+
 void SerialHandler::debugPrint(const String &message)
 {
-    if (DEBUG_ENABLED)
+    if (DEBUG_ENABLED && !binaryMode)
     {
         Serial.print("[DEBUG] ");
         Serial.println(message);
@@ -23,7 +23,10 @@ void updateLEDColor(uint8_t r, uint8_t g, uint8_t b, uint8_t brightness)
     targetColor = CRGB(r, g, b);
     transitionInProgress = true;
 
-    Serial.printf("Transitioning to: R=%d, G=%d, B=%d (Brightness fixed at 20%)\n", r, g, b);
+    if (!serialHandler.isBinaryMode())
+    {
+        Serial.printf("Transitioning to: R=%d, G=%d, B=%d (Brightness fixed at 20%)\n", r, g, b);
+    }
 }
 
 // Function to handle smooth color transitions using FastLED blend
@@ -54,8 +57,11 @@ void handleColorTransition()
         FastLED.show();
 
         transitionInProgress = false;
-        Serial.printf("Transition complete: R=%d, G=%d, B=%d\n",
-                      currentColor.r, currentColor.g, currentColor.b);
+        if (!serialHandler.isBinaryMode())
+        {
+            Serial.printf("Transition complete: R=%d, G=%d, B=%d\n",
+                          currentColor.r, currentColor.g, currentColor.b);
+        }
     }
 }
 
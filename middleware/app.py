@@ -1,81 +1,190 @@
+from firmware_config import Config
+from serving import ASYNC_EVENTLET, prepare_async_mode
+
+# Patch sockets and threads for the event loop before anything else creates them
+ASYNC_MODE = prepare_async_mode(Config.ASYNC_MODE)
+
+from startup import StartupTasks, setup_ready_routes
+
+# Times the imports; `python app.py` passes it on so /ready includes them
+startup = StartupTasks()
+
 from flask import Flask
 from flask_cors import CORS
 from flask_socketio import SocketIO
 import logging
 import atexit
 import os
+from typing import Optional
 
-from serial_controller import SerialController
-from firmware_config import Config
+import database
+from device_pool import DevicePool, parse_devices
+from port_inventory import PortInventory
 from color_queue import ColorQueue
 from routes import register_routes
 from obs import setup_obs_routes, update_obs_username
-from database import init_request_database
-
-# Initialize Flask app
-app = Flask(__name__)
-CORS(app)  # Enable CORS for web frontend
-app.config['SECRET_KEY'] = 'obs-websocket-secret'
-
-# Initialize SocketIO with proper CORS for external access
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading', 
-                   allow_upgrades=True, logger=True, engineio_logger=True)
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('middleware.log'),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
-
-# Initialize database
-logger.info("Initializing request database...")
-request_db = init_request_database()
+from queue_updates import setup_queue_updates
+from stats import setup_stats_routes
+from moderation import username_moderator
+from queue_journal import QueueJournal
+from metrics import MetricsRegistry, setup_metrics_routes
+from log_pipeline import setup_logging
 
-# Initialize serial controller
-serial_controller = SerialController()
+startup.mark('imports')
 
-# Function wrapper for OBS update callback
-def obs_update_callback(username):
-    """Wrapper function to call OBS update with socketio instance"""
-    return update_obs_username(username, socketio)
-
-# Initialize color queue with 20-second delay (with OBS update callback)
-color_queue = ColorQueue(serial_controller, obs_update_callback)
-color_queue.start_worker()
-
-# Setup OBS routes and handlers
-setup_obs_routes(app, socketio)
-
-# Register cleanup on app shutdown
-def cleanup():
-    color_queue.stop_worker()
-
-atexit.register(cleanup)
+logger = logging.getLogger(__name__)
 
-# Register API routes
-register_routes(app, serial_controller, color_queue)
+# Cleanup functions of the apps built so far, run once at exit
+_cleanups = []
+
+@atexit.register
+def _cleanup_apps():
+    for cleanup in list(_cleanups):
+        cleanup()
+
+def create_app(startup: Optional[StartupTasks] = None, db_path: str = 'requests.db'):
+    """Build the Flask app without waiting on slow resources
+
+    Only what the routes need to answer is set up here. The port scan, the
+    database, the ESP32 boards and the profanity matcher come up as
+    background tasks on startup (a fresh StartupTasks unless one is
+    passed), so requests are accepted straight away; /ready reports when
+    they are done. Requests that need one of them first open it lazily.
+    Each call builds its own components, including the RequestDatabase
+    at db_path; they are kept in app.extensions['middleware'] along with
+    a cleanup function, which also runs at exit. Importing this module
+    only selects the async mode, since eventlet has to patch the
+    standard library before anything else is imported.
+    """
+    startup = startup or StartupTasks()
+
+    # Configure logging; records are written out by a background thread
+    setup_logging(Config.LOG_LEVEL, Config.LOG_FILE, Config.LOG_FORMAT,
+                  max_bytes=Config.LOG_MAX_BYTES, backup_count=Config.LOG_BACKUP_COUNT)
+
+    # Initialize Flask app
+    app = Flask(__name__)
+    CORS(app)  # Enable CORS for web frontend
+    app.config['SECRET_KEY'] = 'obs-websocket-secret'
+
+    # Initialize SocketIO with proper CORS for external access
+    socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE,
+                       allow_upgrades=True, logger=logging.getLogger('socketio.server'),
+                       engineio_logger=logging.getLogger('engineio.server'))
+
+    # Serial ports are kept current by a hotplug watcher; the first scan is a startup task
+    port_inventory = PortInventory(watch_interval=Config.PORT_WATCH_INTERVAL, scan=False)
+    port_inventory.start()
+
+    # The configured ESP32 boards, else every ESP32 found
+    # With AUTO_RECONNECT each board's supervisor opens it and keeps it open
+    serial_controller = DevicePool(parse_devices(Config.SERIAL_DEVICES or Config.SERIAL_PORT),
+                                   binary_protocol=Config.SERIAL_BINARY_PROTOCOL,
+                                   inventory=port_inventory,
+                                   auto_reconnect=Config.AUTO_RECONNECT,
+                                   max_retry_delay=Config.CONNECTION_RETRY_DELAY)
+    startup.mark('serial setup')
+
+    # Function wrapper for OBS update callback
+    def obs_update_callback(username):
+        """Wrapper function to call OBS update with socketio instance"""
+        return update_obs_username(username, socketio)
+
+    # Initialize color queue with 20-second delay (with OBS update callback)
+    # Journal pending requests so a restart does not drop the backlog
+    queue_journal = QueueJournal(Config.QUEUE_JOURNAL_PATH) if Config.QUEUE_JOURNAL_PATH else None
+
+    color_queue = ColorQueue(serial_controller, obs_update_callback, policy=Config.QUEUE_POLICY,
+                             coalesce=Config.QUEUE_COALESCE,
+                             adaptive_slots=Config.QUEUE_ADAPTIVE_SLOTS,
+                             min_slot=Config.QUEUE_MIN_SLOT_SECONDS,
+                             target_depth=Config.QUEUE_TARGET_DEPTH,
+                             journal=queue_journal)
+    # Restored before requests are taken, so the backlog keeps its place in line
+    color_queue.restore_from_journal()
+    color_queue.start_worker()
+    startup.mark('queue')
+
+    # Setup OBS routes and handlers
+    setup_obs_routes(app, socketio)
+
+    # Push queue position updates to web viewers subscribed on the /queue namespace
+    queue_updates = setup_queue_updates(socketio, color_queue)
+
+    # Opened by a startup task, or by the first request that logs
+    request_database = database.DatabaseOpener(db_path)
+
+    # Register API routes
+    register_routes(app, serial_controller, color_queue, request_database)
+    setup_stats_routes(app, request_database)
+    setup_ready_routes(app, startup, serial_controller)
+
+    # Prometheus-style metrics; gauges are read at scrape time from this app's own registry
+    app_registry = MetricsRegistry()
+    app_registry.gauge('rgb_queue_depth', 'Pending color requests', color_queue.get_queue_depth)
+    app_registry.gauge('rgb_serial_connected', 'Whether any ESP32 serial port is open',
+                   lambda: int(serial_controller.is_connected()))
+    app_registry.gauge('rgb_serial_devices_connected', 'ESP32 boards with an open serial port',
+                   lambda: sum(1 for device in serial_controller.get_devices() if device.get('connected')))
+    setup_metrics_routes(app, app_registry)
+    startup.mark('routes')
+
+    def connect_devices():
+        """Open the ESP32 boards, after the port scan discovery needs"""
+        port_inventory.ensure_scanned()
+        if serial_controller.connect():
+            logger.info(f"Successfully connected to ESP32 devices: {', '.join(serial_controller.get_device_names())}")
+        else:
+            logger.warning("Could not connect to ESP32 on startup - will retry in the background or on first request")
+
+    startup.run_in_background('ports', port_inventory.ensure_scanned)
+    startup.run_in_background('database', request_database)
+    startup.run_in_background('serial', connect_devices)
+    # Compile the matcher now rather than on the first /api/color
+    startup.run_in_background('moderation', lambda: username_moderator.matcher)
+
+    # Stops this app's threads and flushes its database; runs once, here or at exit
+    def cleanup():
+        if cleanup not in _cleanups:
+            return
+        _cleanups.remove(cleanup)
+        color_queue.stop_worker()
+        port_inventory.stop()
+        request_database.close()
+        if queue_journal is not None:
+            queue_journal.close()
+
+    _cleanups.append(cleanup)
+    app.extensions['middleware'] = {
+        'startup': startup,
+        'socketio': socketio,
+        'port_inventory': port_inventory,
+        'serial_controller': serial_controller,
+        'queue_journal': queue_journal,
+        'color_queue': color_queue,
+        'queue_updates': queue_updates,
+        'database': request_database,
+        'cleanup': cleanup
+    }
+    return app
 
 if __name__ == '__main__':
+    app = create_app(startup)
+    socketio = app.extensions['middleware']['socketio']
     logger.info("Starting RGB Controller Middleware API...")
-
-    # Try to connect to ESP32 on startup
-    if serial_controller.connect():
-        logger.info("Successfully connected to ESP32")
-    else:
-        logger.warning("Could not connect to ESP32 on startup - will retry on first request")
-
     logger.info(f"OBS Browser Source available at http://{Config.HOST}:{Config.PORT}/obs")
+    logger.info(f"Serving in {ASYNC_MODE} mode")
+
+    # The eventlet server caps concurrent connections (long-polls and websockets included)
+    server_options = {'max_size': Config.ASYNC_MAX_CONNECTIONS} if ASYNC_MODE == ASYNC_EVENTLET else {}
 
-    # Start Flask app with SocketIO
+    # Start Flask app with SocketIO; the ESP32 boards keep connecting in the background
+    startup.accepting()
     socketio.run(
         app,
         host=Config.HOST,
         port=Config.PORT,
         debug=Config.DEBUG,
-        use_reloader=False
+        use_reloader=False,
+        **server_options
     )
\ No newline at end of file
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+HTTP load benchmark for the middleware
+
+Boots the full app (Flask routes, Socket.IO, color queue, write-behind
+request database) in-process on a random local port, with a mock ESP32
+and a throwaway working directory, then drives each endpoint from a pool
+of keep-alive clients and reports throughput and latency percentiles.
+
+  python bench_http.py                                  # run and print
+  python bench_http.py --save-baseline bench_baseline.json
+  python bench_http.py --baseline bench_baseline.json   # exit 1 on regression
+
+A result regresses when its throughput drops, or its p95 grows, by more
+than --tolerance (default 25%) relative to the baseline.
+
+With --async-mode the server runs in a child process in that mode
+(threading or eventlet), so serving modes can be compared side by side,
+and the child's OS threads and memory are reported. --viewers parks that
+many idle Socket.IO long-polls on /queue while the load runs:
+
+  python bench_http.py --async-mode threading --viewers 2000
+  python bench_http.py --async-mode eventlet --viewers 2000
+"""
+import argparse
+import http.client
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+
+from serving import ASYNC_EVENTLET, ASYNC_MODES, ASYNC_THREADING
+
+MIDDLEWARE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+ENDPOINTS = ('color', 'queue', 'status')
+
+# Seconds between Engine.IO pings in the benchmark server (default 25)
+VIEWER_PING_INTERVAL = 3600
+
+# Name and port of the one mock board
+MOCK_DEVICE = 'mock'
+
+
+def mock_controller_class(base):
+    """A SerialController whose ESP32 is always connected and takes every write at once
+
+    Subclassing the real controller keeps every attribute and signature the
+    device pool and routes use (configured_port, reconnect_attempts, the
+    supervisor, devices=), so a change to the controller cannot leave the
+    benchmark driving a stale stand-in. Only the serial I/O is replaced.
+    """
+
+    class MockSerialController(base):
+        def __init__(self, binary_protocol=True, port=None, **options):
+            super().__init__(binary_protocol, port or MOCK_DEVICE, **options)
+            self.protocol = 'binary' if binary_protocol else 'text'
+            self.sent = 0
+
+        def connect(self, port=None):
+            self.port = self.configured_port
+            return True
+
+        def disconnect(self):
+            pass
+
+        def is_connected(self):
+            return True
+
+        def start_supervisor(self):
+            pass  # nothing to reconnect or heartbeat
+
+        def get_available_ports(self):
+            return []
+
+        def get_port_info(self):
+            return {'port': self.configured_port, 'baud_rate': self.baud_rate, 'timeout': self.timeout,
+                    'connected': True, 'protocol': self.protocol, 'reconnect_attempts': self.reconnect_attempts}
+
+        def send_color_async(self, r, g, b, devices=None):
+            self.sent += 1
+            future = Future()
+            future.set_result((True, "Color sent successfully"))
+            return future
+
+    return MockSerialController
+
+
+def boot_app(workdir, async_mode=ASYNC_THREADING):
+    """Build the app inside workdir with the mock serial controller"""
+    os.chdir(workdir)
+    os.environ['QUEUE_JOURNAL_PATH'] = ''
+    os.environ['DEBUG'] = 'False'
+    os.environ['ASYNC_MODE'] = async_mode
+    os.environ['SERIAL_DEVICES'] = f"{MOCK_DEVICE}={MOCK_DEVICE}"  # one pinned board, nothing to discover
+    os.environ['AUTO_RECONNECT'] = 'False'  # the mock is always connected
+    sys.path.insert(0, MIDDLEWARE_DIR)
+
+    # Patch before the imports below create any locks or sockets
+    from serving import prepare_async_mode
+    prepare_async_mode(async_mode)
+
+    import serial_controller
+    serial_controller.SerialController = mock_controller_class(serial_controller.SerialController)
+    app = importlib.import_module('app').create_app()
+
+    # Per-request logging would dominate the numbers otherwise
+    import logging
+    logging.disable(logging.INFO)
+
+    # Benchmark viewers never answer pings; keep them connected for the whole run
+    app.extensions['socketio'].server.eio.ping_interval = VIEWER_PING_INTERVAL
+    return app
+
+
+def start_in_process(workdir):
+    """Serve the app from a thread of this process. Returns (app, base_url, server)"""
+    from werkzeug.serving import make_server
+
+    app = boot_app(workdir)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return app, f"http://127.0.0.1:{server.server_port}", server
+
+
+def serve(workdir, async_mode):
+    """Child process entry point: serve the app in async_mode and report the port on stdout"""
+    app = boot_app(workdir, async_mode)
+    if async_mode == ASYNC_EVENTLET:
+        import eventlet
+        import eventlet.wsgi
+        from firmware_config import Config
+        listener = eventlet.listen(('127.0.0.1', 0))
+        print(f"PORT {listener.getsockname()[1]}", flush=True)
+        eventlet.wsgi.server(listener, app, log_output=False,
+                             max_size=Config.ASYNC_MAX_CONNECTIONS)
+    else:
+        from werkzeug.serving import make_server
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        print(f"PORT {server.server_port}", flush=True)
+        server.serve_forever()
+
+
+def start_server_process(workdir, async_mode):
+    """Serve the app from a child process. Returns (process, base_url)"""
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', workdir,
+                                '--async-mode', async_mode], stdout=subprocess.PIPE, text=True)
+    for line in process.stdout:
+        if line.startswith('PORT '):
+            return process, f"http://127.0.0.1:{line.split()[1]}"
+    raise SystemExit(f"Benchmark server exited with code {process.wait()}")
+
+
+def open_viewers(base_url, count):
+    """Park count idle Socket.IO long-polls on /queue, like web viewers between updates"""
+    address = urlparse(base_url)
+    viewers = []
+    for _ in range(count):
+        connection = http.client.HTTPConnection(address.hostname, address.port, timeout=10)
+        try:
+            path = '/socket.io/?EIO=4&transport=polling'
+            connection.request('GET', path)
+            handshake = connection.getresponse().read().decode()
+            path += '&sid=' + json.loads(handshake[handshake.index('{'):])['sid']
+            connection.request('POST', path, body='40/queue,', headers={'Content-Type': 'text/plain;charset=UTF-8'})
+            connection.getresponse().read()
+            connection.request('GET', path)  # namespace connect acknowledgement
+            connection.getresponse().read()
+            connection.request('GET', path)  # held open until the server has something to send
+        except (OSError, http.client.HTTPException, ValueError, KeyError):
+            connection.close()
+            continue
+        viewers.append(connection)
+    return viewers
+
+
+def process_resources(pid):
+    """OS threads and resident memory of a process, from /proc (Linux only)"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        return {}
+    return {'threads': int(fields['Threads']), 'rss_mb': round(int(fields['VmRSS'].split()[0]) / 1024, 1)}
+
+
+def make_call(endpoint, base_url):
+    if endpoint == 'color':
+        # Digits can spell words in leetspeak (455), so skip names the moderator would reject
+        from moderation import username_moderator
+        usernames = [name for name in (f"bench_user_{n}" for n in range(1100))
+                     if not username_moderator.contains_profanity(name)][:1000]
+
+        def call(session, i):
+            payload = {
+                'username': usernames[i % len(usernames)],
+                'color': {'r': i % 256, 'g': (i * 7) % 256, 'b': (i * 13) % 256}
+            }
+            if i % 2:
+                payload['devices'] = [MOCK_DEVICE]  # half the requests name their board
+            return session.post(f"{base_url}/api/color", json=payload)
+    elif endpoint == 'queue':
+        def call(session, i):
+            return session.get(f"{base_url}/api/queue", params={'limit': 50})
+    else:
+        def call(session, i):
+            return session.get(f"{base_url}/api/status")
+    return call
+
+
+def run_endpoint(endpoint, base_url, total, concurrency):
+    call = make_call(endpoint, base_url)
+    local = threading.local()
+
+    def one(i):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            ok = call(session, i).status_code == 200
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    # Warm up connections and code paths before measuring
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(min(total, concurrency * 5))))
+
+        started = time.perf_counter()
+        results = list(pool.map(one, range(total)))
+        elapsed = time.perf_counter() - started
+
+    samples = sorted(latency for latency, _ in results)
+
+    def percentile(p):
+        return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 3)
+
+    return {
+        'requests': total,
+        'errors': sum(1 for _, ok in results if not ok),
+        'throughput_rps': round(total / elapsed, 1),
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'max_ms': round(samples[-1] * 1000, 3)
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regression messages against a saved baseline"""
+    regressions = []
+    for endpoint, result in results.items():
+        previous = baseline.get('results', {}).get(endpoint)
+        if previous is None:
+            continue
+        if result['throughput_rps'] < previous['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{endpoint}: throughput {result['throughput_rps']} rps vs baseline {previous['throughput_rps']} rps")
+        if result['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{endpoint}: p95 {result['p95_ms']} ms vs baseline {previous['p95_ms']} ms")
+        if result['errors'] > previous['errors']:
+            regressions.append(f"{endpoint}: {result['errors']} errors vs baseline {previous['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000, help='measured requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=8, help='parallel clients')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help='comma-separated subset of: ' + ', '.join(ENDPOINTS))
+    parser.add_argument('--baseline', help='compare against this baseline JSON and exit 1 on regression')
+    parser.add_argument('--save-baseline', help='write the results to this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative regression (default 0.25)')
+    parser.add_argument('--async-mode', choices=ASYNC_MODES, help='serve from a child process in this mode')
+    parser.add_argument('--viewers', type=int, default=0, help='idle Socket.IO long-polls held open during the run')
+    parser.add_argument('--serve', metavar='WORKDIR', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.async_mode or ASYNC_THREADING)
+        return
+
+    endpoints = [name.strip() for name in args.endpoints.split(',') if name.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    # Resolve output paths before boot_app changes the working directory
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    save_path = os.path.abspath(args.save_baseline) if args.save_baseline else None
+
+    server_stats = None
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.async_mode:
+            process, base_url = start_server_process(workdir, args.async_mode)
+        else:
+            app, base_url, server = start_in_process(workdir)
+        mode = args.async_mode or 'in-process threading'
+        print(f"Benchmarking {base_url} ({mode}) - {args.requests} requests per endpoint, concurrency {args.concurrency}")
+
+        viewers = open_viewers(base_url, args.viewers) if args.viewers else []
+        if args.viewers:
+            print(f"Holding {len(viewers)}/{args.viewers} idle viewer connections")
+        if args.async_mode:
+            server_stats = {'viewers': len(viewers), 'with_viewers': process_resources(process.pid)}
+
+        results = {}
+        for endpoint in endpoints:
+            results[endpoint] = run_endpoint(endpoint, base_url, args.requests, args.concurrency)
+
+        if args.async_mode:
+            server_stats['after_load'] = process_resources(process.pid)
+        for viewer in viewers:
+            viewer.close()
+        if args.async_mode:
+            process.terminate()
+            process.wait()
+        else:
+            server.shutdown()
+            app.extensions['middleware']['cleanup']()
+            os.chdir(MIDDLEWARE_DIR)
+
+    print(f"\n{'endpoint':<10}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>8}")
+    for endpoint, result in results.items():
+        print(f"{endpoint:<10}{result['throughput_rps']:>10.1f}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+              f"{result['p99_ms']:>10.2f}{result['max_ms']:>10.2f}{result['errors']:>8}")
+
+    if server_stats is not None:
+        print(f"\nServer ({args.async_mode}, {server_stats['viewers']} viewers): "
+              f"{server_stats['with_viewers'].get('threads')} OS threads with viewers connected, "
+              f"{server_stats['after_load'].get('threads')} after load, "
+              f"{server_stats['after_load'].get('rss_mb')} MB resident")
+
+    report = {
+        'config': {'requests': args.requests, 'concurrency': args.concurrency,
+                   'async_mode': args.async_mode, 'viewers': args.viewers},
+        'environment': {'python': platform.python_version(), 'machine': platform.machine()},
+        'results': results
+    }
+    if server_stats is not None:
+        report['server'] = server_stats
+
+    if save_path:
+        with open(save_path, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(f"\nSaved baseline to {save_path}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS:")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} of {baseline_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark for username moderation latency
+
+Compares better_profanity.contains_profanity with the compiled
+UsernameModerator on two workloads:
+  cold   - every username is new (verdict cache cleared, all misses)
+  repeat - usernames drawn from a small pool, as during a live stream
+
+Usage: python bench_moderation.py [--checks 20000] [--pool 2000]
+"""
+import argparse
+import random
+import string
+import time
+
+from better_profanity import profanity
+from moderation import UsernameModerator
+
+def random_username(rng):
+    length = rng.randint(4, 20)
+    return ''.join(rng.choice(string.ascii_letters + string.digits + "_-") for _ in range(length))
+
+def measure(check, usernames):
+    samples = []
+    for username in usernames:
+        started = time.perf_counter()
+        check(username)
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+
+    def percentile(p):
+        return samples[min(len(samples) - 1, int(p * len(samples)))] * 1e6
+
+    return {'p50_us': percentile(0.50), 'p99_us': percentile(0.99), 'max_us': samples[-1] * 1e6}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--checks', type=int, default=20000, help='checks per workload')
+    parser.add_argument('--pool', type=int, default=2000, help='distinct usernames in the repeat workload')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cold = [random_username(rng) for _ in range(args.checks)]
+    pool = [random_username(rng) for _ in range(args.pool)]
+    repeat = [rng.choice(pool) for _ in range(args.checks)]
+
+    profanity.load_censor_words()
+    moderator = UsernameModerator()
+    started = time.perf_counter()
+    moderator.matcher  # compile up front so it is not counted in the first check
+    print(f"Matcher compiled in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    # better_profanity is slow enough that a sample is plenty
+    baseline_sample = cold[:min(len(cold), 2000)]
+    results = {'better_profanity': measure(profanity.contains_profanity, baseline_sample)}
+
+    moderator.clear_cache()
+    results['moderator (cold)'] = measure(moderator.contains_profanity, cold)
+
+    moderator.clear_cache()
+    measure(moderator.contains_profanity, pool)  # warm the cache
+    results['moderator (repeat)'] = measure(moderator.contains_profanity, repeat)
+
+    print(f"\n{'workload':<22}{'p50 (us)':>12}{'p99 (us)':>12}{'max (us)':>12}")
+    for name, result in results.items():
+        print(f"{name:<22}{result['p50_us']:>12.1f}{result['p99_us']:>12.1f}{result['max_us']:>12.1f}")
+    print(f"\nCache: {moderator.get_stats()}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+End-to-end serial benchmark against the virtual ESP32
+
+Sends colors through SerialController (writer thread, framing, pty) to
+esp32_emulator and measures, per color, the time from send_color_async
+until the emulated firmware applied it. With --duration it keeps sending
+at --rate colors/s as a soak test, optionally with lossy or flapping links.
+With --devices N every color fans out through a DevicePool to N emulated
+boards, and counts as applied once the last board has it.
+
+Usage: python bench_serial.py [--colors 2000] [--protocol binary|text]
+                              [--baud 115200] [--latency 0.001] [--drop-rate 0]
+       python bench_serial.py --duration 300 --rate 20 --disconnect-every 30
+       python bench_serial.py --devices 8
+"""
+import argparse
+import logging
+import time
+from collections import deque
+
+from device_pool import DevicePool
+from esp32_emulator import ESP32Emulator
+from metrics import registry
+from serial_controller import COMMAND_BUFFER_SIZE
+
+def color_for(index):
+    # Unique per index so applied colors can be matched back to their send time
+    return (index >> 16) & 0xFF, (index >> 8) & 0xFF, index & 0xFF
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--colors', type=int, default=2000, help='colors to send (burst mode)')
+    parser.add_argument('--protocol', choices=('binary', 'text'), default='binary')
+    parser.add_argument('--baud', type=int, default=115200)
+    parser.add_argument('--latency', type=float, default=0.0, help='emulated reply latency in seconds')
+    parser.add_argument('--drop-rate', type=float, default=0.0)
+    parser.add_argument('--duration', type=float, help='soak for this many seconds instead of a burst')
+    parser.add_argument('--rate', type=float, default=20.0, help='colors per second in soak mode')
+    parser.add_argument('--disconnect-every', type=float, help='simulate an unplug every N seconds')
+    parser.add_argument('--devices', type=int, default=1, help='emulated boards every color fans out to')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    emulators = [ESP32Emulator(baud_rate=args.baud, latency=args.latency, drop_rate=args.drop_rate,
+                               disconnect_every=args.disconnect_every, transition_seconds=0.01)
+                 for _ in range(args.devices)]
+    for emulator in emulators:
+        emulator.start()
+    controller = DevicePool({f"board{index}": emulator.port for index, emulator in enumerate(emulators)},
+                            settle_seconds=0, binary_protocol=args.protocol == 'binary')
+    if not controller.connect():
+        raise SystemExit("Could not connect to the emulator")
+    boards = list(controller.controllers().values())
+    deadline = time.monotonic() + 1.0
+    while args.protocol == 'binary' and any(board.protocol != 'binary' for board in boards) \
+            and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    sent_at = {}
+    failures = 0
+    started = time.monotonic()
+    if args.duration:
+        index = 0
+        while time.monotonic() - started < args.duration:
+            sent_at[color_for(index)] = time.monotonic()
+            controller.send_color_async(*color_for(index))
+            index += 1
+            time.sleep(max(0.0, started + index / args.rate - time.monotonic()))
+    else:
+        # Stay within the command buffer so nothing is dropped on the host side
+        in_flight = deque()
+        for index in range(args.colors):
+            if len(in_flight) >= COMMAND_BUFFER_SIZE // 2:
+                failures += not in_flight.popleft().result(timeout=60)[0]
+            sent_at[color_for(index)] = time.monotonic()
+            in_flight.append(controller.send_color_async(*color_for(index)))
+        failures += sum(1 for future in in_flight if not future.result(timeout=60)[0])
+    written = time.monotonic() - started
+
+    # Wait until the emulators have worked through everything still in flight
+    applied = -1
+    while applied != sum(len(emulator.received_colors) for emulator in emulators):
+        applied = sum(len(emulator.received_colors) for emulator in emulators)
+        time.sleep(0.5)
+    elapsed = time.monotonic() - started - 0.5  # minus the final idle check
+
+    # A color is applied once every board shows it
+    applied_at = {}
+    for emulator in emulators:
+        for r, g, b, moment in emulator.received_colors:
+            if (r, g, b) in sent_at:
+                applied_at.setdefault((r, g, b), []).append(moment)
+    latencies = sorted(max(moments) - sent_at[color] for color, moments in applied_at.items()
+                       if len(moments) == len(emulators))
+    controller.disconnect()
+    for emulator in emulators:
+        emulator.stop()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else float('nan')
+
+    rtt = registry.get('rgb_serial_echo_rtt_seconds')
+    rtt_count = rtt.count
+    print(f"Protocol: {boards[0].protocol}, {args.devices} device(s), baud {args.baud}, "
+          f"latency {args.latency * 1000:.1f} ms, drop rate {args.drop_rate}")
+    print(f"Sent {len(sent_at)} colors in {written:.2f}s ({len(sent_at) / written:.0f}/s), {failures} write failures")
+    print(f"Applied by every emulator: {len(latencies)} ({len(sent_at) - len(latencies)} lost), "
+          f"{len(latencies) / elapsed:.0f}/s end to end")
+    print(f"Send-to-apply latency: p50 {percentile(0.50):.2f} ms, p95 {percentile(0.95):.2f} ms, p99 {percentile(0.99):.2f} ms")
+    if rtt_count:
+        print(f"Echo/ACK round trip: mean {rtt.sum / rtt_count * 1000:.2f} ms over {rtt_count} replies")
+    for index, emulator in enumerate(emulators):
+        print(f"Emulator board{index}: {emulator.stats}")
+
+if __name__ == '__main__':
+    main()
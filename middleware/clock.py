@@ -0,0 +1,63 @@
+"""
+Clocks
+Time sources for ColorQueue, so schedules can be simulated faster than real time
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+class SystemClock:
+    """Wall-clock time; what the running middleware uses"""
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def wait(self, condition: threading.Condition, timeout=None) -> bool:
+        """Wait on a held condition for up to timeout clock-seconds"""
+        return condition.wait(timeout)
+
+
+class SimulatedClock:
+    """Clock that only moves when told to
+
+    Time jumps straight to the next event, so a two-hour backlog replays in
+    milliseconds. Pair it with ColorQueue.dispatch_due() rather than the
+    worker thread: wait() only yields briefly, since nothing advances the
+    clock while a waiter sleeps.
+    """
+
+    def __init__(self, start: datetime = None):
+        self._now = start or datetime(2025, 1, 1)
+        self._lock = threading.Lock()
+
+    def now(self) -> datetime:
+        return self._now
+
+    def advance(self, seconds: float):
+        with self._lock:
+            self._now += timedelta(seconds=seconds)
+
+    def advance_to(self, moment: datetime):
+        with self._lock:
+            if moment > self._now:
+                self._now = moment
+
+    def wait(self, condition: threading.Condition, timeout=None) -> bool:
+        return condition.wait(0.001)
+
+
+class ScaledClock:
+    """Wall-clock time running `speed` times faster, for driving the real worker thread"""
+
+    def __init__(self, speed: float, start: datetime = None):
+        self.speed = speed
+        self._origin = start or datetime.now()
+        self._started = time.monotonic()
+
+    def now(self) -> datetime:
+        return self._origin + timedelta(seconds=(time.monotonic() - self._started) * self.speed)
+
+    def wait(self, condition: threading.Condition, timeout=None) -> bool:
+        return condition.wait(None if timeout is None else timeout / self.speed)
@@ -1,19 +1,95 @@
 import sqlite3
 import logging
-from datetime import datetime
+import queue
+import csv
+import io
+import json
+import zlib
+import colorsys
+from collections import Counter, deque
+from datetime import datetime, timedelta
 from contextlib import contextmanager
 import threading
+import time
 import os
 
+from serving import offload
+
 logger = logging.getLogger(__name__)
 
+# Write-behind defaults: flush when this many rows are buffered or this many seconds have passed
+WRITE_BEHIND_BATCH_SIZE = 100
+WRITE_BEHIND_FLUSH_INTERVAL = 0.5
+
+# Rows kept in memory if the database stops accepting writes; older rows are dropped beyond this
+WRITE_BEHIND_MAX_BUFFER = 100000
+
+# Longest wait between flush retries while the database keeps failing
+WRITE_BEHIND_MAX_BACKOFF = 30.0
+
+# Idle connections kept open for reuse; extra connections are closed when returned
+CONNECTION_POOL_SIZE = 4
+
+# Rows fetched per page when streaming exports
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_FORMATS = ('csv', 'ndjson')
+EXPORT_COLUMNS = ('id', 'timestamp', 'username', 'r', 'g', 'b')
+
+# Rollups: colors are quantized to 4 bits per channel, hues to 10 degree buckets
+COLOR_BUCKET_SHIFT = 4
+HUE_BUCKET_DEGREES = 10
+ACHROMATIC_HUE_BUCKET = -1  # greys, near-blacks and near-whites
+ACHROMATIC_THRESHOLD = 0.1  # saturation/value below this has no meaningful hue
+
+# Per-connection tuning: statement cache entries and page cache size (negative = KiB)
+STATEMENT_CACHE_SIZE = 128
+PAGE_CACHE_KIB = 8192
+
 class RequestDatabase:
-    """SQLite database for storing color requests"""
+    """SQLite database for storing color requests
+
+    With write_behind enabled, log_request only appends to an in-memory
+    buffer. A background thread writes buffered rows with executemany in
+    a single transaction every batch_size rows or flush_interval seconds,
+    so callers never wait on disk I/O.
+
+    Connections come from a small pool and stay open between calls. Each
+    one runs in WAL mode with synchronous=NORMAL, so reads and report
+    queries can run while inserts are in progress.
+
+    Rollup tables (per-minute, per-user, quantized color and hue counts)
+    are updated in the same transaction as the inserts, so the stats
+    queries read a few small rows however long the history is.
+    """
     
-    def __init__(self, db_path='requests.db'):
+    def __init__(self, db_path='requests.db', write_behind=False,
+                 batch_size=WRITE_BEHIND_BATCH_SIZE, flush_interval=WRITE_BEHIND_FLUSH_INTERVAL):
         self.db_path = db_path
         self._lock = threading.Lock()  # Thread safety
+        self.write_behind = write_behind
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer = deque(maxlen=WRITE_BEHIND_MAX_BUFFER)  # a full buffer drops its oldest row
+        self._buffer_changed = threading.Condition()
+        self._flush_lock = threading.Lock()  # Serializes flushes from the thread and flush()
+        self._flush_thread = None
+        self._flush_failures = 0  # consecutive failed flushes
+        self._closed = False
+        self._pool = queue.LifoQueue(maxsize=CONNECTION_POOL_SIZE)  # Idle connections, most recent first
+        self._stats = {
+            'rows_written': 0,
+            'rows_dropped': 0,
+            'rows_failed': 0,
+            'batches': 0,
+            'last_batch_size': 0,
+            'last_flush_ms': None,
+            'max_flush_ms': 0.0
+        }
         self.init_database()
+        
+        if self.write_behind:
+            self._flush_thread = threading.Thread(target=self._flush_loop, name="db-write-behind", daemon=True)
+            self._flush_thread.start()
     
     def init_database(self):
         """Initialize the database and create tables if they don't exist"""
@@ -35,91 +111,453 @@ class RequestDatabase:
                 conn.execute('CREATE INDEX IF NOT EXISTS idx_username ON color_requests(username)')
                 conn.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON color_requests(timestamp)')
                 
+                # Incrementally maintained rollups for the stats endpoints
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS stats_minute (
+                        minute TEXT PRIMARY KEY,
+                        count INTEGER NOT NULL
+                    )
+                ''')
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS stats_user (
+                        username TEXT PRIMARY KEY,
+                        count INTEGER NOT NULL,
+                        last_seen TEXT NOT NULL
+                    )
+                ''')
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS stats_color (
+                        bucket INTEGER PRIMARY KEY,
+                        count INTEGER NOT NULL
+                    )
+                ''')
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS stats_hue (
+                        hue INTEGER PRIMARY KEY,
+                        count INTEGER NOT NULL
+                    )
+                ''')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_stats_user_count ON stats_user(count)')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_stats_color_count ON stats_color(count)')
+                
                 conn.commit()
-                logger.info(f"Database initialized at {self.db_path}")
+                
+                # Databases from before the rollups existed get them built once
+                has_requests = conn.execute('SELECT 1 FROM color_requests LIMIT 1').fetchone()
+                has_rollups = conn.execute('SELECT 1 FROM stats_minute LIMIT 1').fetchone()
+            
+            if has_requests and not has_rollups:
+                self.rebuild_rollups()
+            logger.info(f"Database initialized at {self.db_path}")
         except Exception as e:
             logger.error(f"Failed to initialize database: {e}")
             raise
     
+    def _open_connection(self) -> sqlite3.Connection:
+        """Open a tuned connection for the pool"""
+        # Pooled connections move between threads, but only one thread uses a connection at a time
+        conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row  # Enable column access by name
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA cache_size=-{PAGE_CACHE_KIB}')
+        return conn
+    
     @contextmanager
     def get_connection(self):
-        """Context manager for database connections"""
-        conn = None
+        """Context manager lending a pooled database connection to the calling thread"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._open_connection()
+        
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30.0)
-            conn.row_factory = sqlite3.Row  # Enable column access by name
             yield conn
         except Exception as e:
-            if conn:
-                conn.rollback()
+            conn.rollback()
+            self._release(conn)
             raise e
-        finally:
-            if conn:
-                conn.close()
+        else:
+            self._release(conn)
+    
+    def _release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool, closing it if the pool is full"""
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+    
+    def close_connections(self):
+        """Close all idle pooled connections"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
     
-    def log_request(self, username: str, r: int, g: int, b: int) -> int:
-        """Log a color request to the database"""
+    def log_request(self, username: str, r: int, g: int, b: int):
+        """Log a color request to the database
+
+        Returns the row id, or None in write-behind mode where the row is
+        only buffered and written by the background thread.
+        """
+        if self.write_behind:
+            row = (datetime.now().isoformat(), username, r, g, b)
+            with self._buffer_changed:
+                if len(self._buffer) == self._buffer.maxlen:
+                    self._stats['rows_dropped'] += 1
+                self._buffer.append(row)
+                if len(self._buffer) >= self.batch_size:
+                    self._buffer_changed.notify()
+            return None
+        
         with self._lock:
             try:
                 with self.get_connection() as conn:
+                    row = (datetime.now().isoformat(), username, r, g, b)
                     cursor = conn.execute('''
                         INSERT INTO color_requests 
                         (timestamp, username, r, g, b)
                         VALUES (?, ?, ?, ?, ?)
-                    ''', (
-                        datetime.now().isoformat(),
-                        username,
-                        r, g, b
-                    ))
+                    ''', row)
+                    self._update_rollups(conn, [row])
                     conn.commit()
                     
                     request_db_id = cursor.lastrowid
-                    hex_color = f"#{r:02x}{g:02x}{b:02x}"
-                    logger.info(f"Logged request to database: {username} -> {hex_color} (ID: {request_db_id})")
+                    logger.debug("Logged request to database: %s -> #%02x%02x%02x (ID: %s)", username, r, g, b, request_db_id)
                     return request_db_id
                     
             except Exception as e:
                 logger.error(f"Failed to log request to database: {e}")
                 raise
 
+    @staticmethod
+    def color_bucket(r: int, g: int, b: int) -> int:
+        """Quantize a color to one of 4096 buckets (4 bits per channel)"""
+        shift = COLOR_BUCKET_SHIFT
+        return ((r >> shift) << 8) | ((g >> shift) << 4) | (b >> shift)
+    
+    @staticmethod
+    def hue_bucket(r: int, g: int, b: int) -> int:
+        """Hue in HUE_BUCKET_DEGREES buckets, or ACHROMATIC_HUE_BUCKET for greys"""
+        h, s, v = colorsys.rgb_to_hsv(r / 255, g / 255, b / 255)
+        if s < ACHROMATIC_THRESHOLD or v < ACHROMATIC_THRESHOLD:
+            return ACHROMATIC_HUE_BUCKET
+        return int(h * 360) // HUE_BUCKET_DEGREES % (360 // HUE_BUCKET_DEGREES)
+    
+    def _update_rollups(self, conn, rows):
+        """Fold (timestamp, username, r, g, b) rows into the rollup tables. Caller commits"""
+        minutes = Counter()
+        users = Counter()
+        last_seen = {}
+        colors = Counter()
+        hues = Counter()
+        for timestamp, username, r, g, b in rows:
+            minutes[timestamp[:16]] += 1  # YYYY-MM-DDTHH:MM
+            users[username] += 1
+            last_seen[username] = max(timestamp, last_seen.get(username, timestamp))
+            colors[self.color_bucket(r, g, b)] += 1
+            hues[self.hue_bucket(r, g, b)] += 1
+        
+        conn.executemany('''
+            INSERT INTO stats_minute (minute, count) VALUES (?, ?)
+            ON CONFLICT(minute) DO UPDATE SET count = count + excluded.count
+        ''', minutes.items())
+        conn.executemany('''
+            INSERT INTO stats_user (username, count, last_seen) VALUES (?, ?, ?)
+            ON CONFLICT(username) DO UPDATE SET
+                count = count + excluded.count,
+                last_seen = MAX(last_seen, excluded.last_seen)
+        ''', [(username, count, last_seen[username]) for username, count in users.items()])
+        conn.executemany('''
+            INSERT INTO stats_color (bucket, count) VALUES (?, ?)
+            ON CONFLICT(bucket) DO UPDATE SET count = count + excluded.count
+        ''', colors.items())
+        conn.executemany('''
+            INSERT INTO stats_hue (hue, count) VALUES (?, ?)
+            ON CONFLICT(hue) DO UPDATE SET count = count + excluded.count
+        ''', hues.items())
+    
+    def rebuild_rollups(self):
+        """Recompute all rollup tables from color_requests (one pass over the history)"""
+        logger.info("Rebuilding request statistics rollups...")
+        with self._lock:
+            with self.get_connection() as conn:
+                for table in ('stats_minute', 'stats_user', 'stats_color', 'stats_hue'):
+                    conn.execute(f'DELETE FROM {table}')
+                batch = []
+                for row in self.iter_rows():
+                    batch.append(row[1:])
+                    if len(batch) >= EXPORT_CHUNK_SIZE:
+                        self._update_rollups(conn, batch)
+                        batch = []
+                if batch:
+                    self._update_rollups(conn, batch)
+                conn.commit()
+        logger.info("Request statistics rollups rebuilt")
+    
+    def get_top_users(self, limit: int = 10) -> list:
+        """Users with the most requests"""
+        with self.get_connection() as conn:
+            rows = conn.execute(
+                'SELECT username, count, last_seen FROM stats_user ORDER BY count DESC LIMIT ?', (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+    
+    def get_top_colors(self, limit: int = 10) -> list:
+        """Most requested colors, quantized; each bucket is reported by its center color"""
+        with self.get_connection() as conn:
+            rows = conn.execute(
+                'SELECT bucket, count FROM stats_color ORDER BY count DESC LIMIT ?', (limit,)
+            ).fetchall()
+        
+        shift = COLOR_BUCKET_SHIFT
+        half = 1 << (shift - 1)
+        colors = []
+        for row in rows:
+            bucket = row['bucket']
+            r = (((bucket >> 8) & 0xF) << shift) | half
+            g = (((bucket >> 4) & 0xF) << shift) | half
+            b = ((bucket & 0xF) << shift) | half
+            colors.append({'color': {'r': r, 'g': g, 'b': b}, 'hex': f"#{r:02x}{g:02x}{b:02x}", 'count': row['count']})
+        return colors
+    
+    def get_request_rate(self, minutes: int = 60) -> list:
+        """Requests per minute for the last N minutes (minutes without requests are omitted)"""
+        start = (datetime.now() - timedelta(minutes=minutes)).isoformat()[:16]
+        with self.get_connection() as conn:
+            rows = conn.execute(
+                'SELECT minute, count FROM stats_minute WHERE minute >= ? ORDER BY minute', (start,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+    
+    def get_hue_histogram(self) -> list:
+        """Request counts per hue bucket; hue -1 collects greys"""
+        with self.get_connection() as conn:
+            rows = conn.execute('SELECT hue, count FROM stats_hue ORDER BY hue').fetchall()
+        return [{'hue': row['hue'],
+                 'degrees': None if row['hue'] == ACHROMATIC_HUE_BUCKET else row['hue'] * HUE_BUCKET_DEGREES,
+                 'count': row['count']} for row in rows]
+    
+    def get_total_requests(self) -> int:
+        """Total number of logged requests (summed over the small hue rollup)"""
+        with self.get_connection() as conn:
+            return conn.execute('SELECT COALESCE(SUM(count), 0) FROM stats_hue').fetchone()[0]
+    
+    def _flush_loop(self):
+        """Background thread draining the write-behind buffer"""
+        while not self._closed:
+            with self._buffer_changed:
+                if self._flush_failures:
+                    # Back off while the database is failing (locked, disk error)
+                    self._buffer_changed.wait(min(self.flush_interval * 2 ** self._flush_failures,
+                                                  WRITE_BEHIND_MAX_BACKOFF))
+                elif len(self._buffer) < self.batch_size:
+                    self._buffer_changed.wait(self.flush_interval)
+            self.flush()
+    
+    def flush(self) -> int:
+        """Write all buffered rows in one transaction. Returns the number of rows written"""
+        with self._flush_lock:
+            with self._buffer_changed:
+                rows, self._buffer = self._buffer, deque(maxlen=WRITE_BEHIND_MAX_BUFFER)
+            if not rows:
+                return 0
+            
+            started = time.perf_counter()
+            try:
+                with self._lock:
+                    with self.get_connection() as conn:
+                        # Off the event loop in async mode; the commit can take milliseconds
+                        offload(self._write_rows, conn, rows)
+            except Exception as e:
+                self._stats['rows_failed'] += len(rows)
+                self._flush_failures += 1
+                logger.error(f"Failed to write {len(rows)} buffered requests to database, will retry: {e}")
+                # Put the rows back ahead of anything logged since, dropping the oldest beyond the cap
+                with self._buffer_changed:
+                    # extendleft would drop the newest rows from the right end, so trim the oldest first
+                    overflow = len(rows) + len(self._buffer) - self._buffer.maxlen
+                    if overflow > 0:
+                        rows = list(rows)[overflow:]
+                        self._stats['rows_dropped'] += overflow
+                    self._buffer.extendleft(reversed(rows))
+                return 0
+            
+            self._flush_failures = 0
+            
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._stats['rows_written'] += len(rows)
+            self._stats['batches'] += 1
+            self._stats['last_batch_size'] = len(rows)
+            self._stats['last_flush_ms'] = round(elapsed_ms, 3)
+            self._stats['max_flush_ms'] = round(max(self._stats['max_flush_ms'], elapsed_ms), 3)
+            logger.debug(f"Flushed {len(rows)} requests to database in {elapsed_ms:.1f} ms")
+            return len(rows)
+    
+    def _write_rows(self, conn, rows):
+        """Insert rows and fold them into the rollups in one transaction"""
+        conn.executemany('''
+            INSERT INTO color_requests 
+            (timestamp, username, r, g, b)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+        self._update_rollups(conn, rows)
+        conn.commit()
+    
+    def get_flush_stats(self) -> dict:
+        """Get write-behind statistics"""
+        with self._buffer_changed:
+            buffered = len(self._buffer)
+        stats = dict(self._stats)
+        stats['rows_buffered'] = buffered
+        stats['write_behind'] = self.write_behind
+        return stats
+    
+    def close(self):
+        """Stop the write-behind thread and flush anything still buffered"""
+        self._closed = True
+        with self._buffer_changed:
+            self._buffer_changed.notify_all()
+        if self._flush_thread is not None:
+            self._flush_thread.join(timeout=5)
+        written = self.flush()
+        if written:
+            logger.info(f"Flushed {written} buffered requests to database on shutdown")
+        self.close_connections()
+
+    def iter_rows(self, since_id: int = 0, since: str = None, until: str = None,
+                  chunk_size: int = EXPORT_CHUNK_SIZE):
+        """Yield request rows in id order, one page at a time
+
+        Uses keyset pagination on id, so each page is an index range scan
+        and memory stays flat however large the table is. since/until are
+        ISO timestamps bounding the window (until is exclusive).
+        """
+        query = 'SELECT id, timestamp, username, r, g, b FROM color_requests WHERE id > ?'
+        filters = []
+        if since:
+            query += ' AND timestamp >= ?'
+            filters.append(since)
+        if until:
+            query += ' AND timestamp < ?'
+            filters.append(until)
+        query += ' ORDER BY id LIMIT ?'
+        
+        last_id = since_id or 0
+        while True:
+            # Borrow a connection per page so a slow consumer does not pin one
+            with self.get_connection() as conn:
+                rows = conn.execute(query, (last_id, *filters, chunk_size)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield tuple(row)
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1][0]
+    
+    def iter_export(self, fmt: str = 'csv', compress: bool = False, include_id: bool = True, **window):
+        """Stream the requests table as CSV or NDJSON bytes, optionally gzip-compressed
+
+        Accepts the same window arguments as iter_rows. Yields one chunk per page.
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}")
+        
+        columns = EXPORT_COLUMNS if include_id else EXPORT_COLUMNS[1:]
+        compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 -> gzip container
+        
+        def encode(text):
+            data = text.encode('utf-8')
+            return compressor.compress(data) if compressor else data
+        
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == 'csv':
+            writer.writerow(columns)
+        
+        count = 0
+        for row in self.iter_rows(**window):
+            if not include_id:
+                row = row[1:]
+            if fmt == 'csv':
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(dict(zip(columns, row))))
+                buffer.write('\n')
+            count += 1
+            if count % window.get('chunk_size', EXPORT_CHUNK_SIZE) == 0:
+                chunk = encode(buffer.getvalue())
+                buffer.seek(0)
+                buffer.truncate()
+                if chunk:
+                    yield chunk
+        
+        chunk = encode(buffer.getvalue())
+        if compressor:
+            chunk += compressor.flush()
+        if chunk:
+            yield chunk
+        logger.info(f"Exported {count} requests as {fmt}{' (gzip)' if compress else ''}")
+
     def export_to_csv(self, output_file: str = 'requests_export.csv') -> bool:
         """Export all requests to CSV file"""
         try:
-            import csv
+            with open(output_file, 'wb') as csvfile:
+                for chunk in self.iter_export('csv', include_id=False):
+                    csvfile.write(chunk)
             
-            with self.get_connection() as conn:
-                cursor = conn.execute('''
-                    SELECT timestamp, username, r, g, b
-                    FROM color_requests 
-                    ORDER BY id
-                ''')
-                
-                with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-                    writer = csv.writer(csvfile)
-                    # Write header
-                    writer.writerow(['timestamp', 'username', 'r', 'g', 'b'])
-                    # Write data
-                    writer.writerows(cursor.fetchall())
-                
-                logger.info(f"Exported requests to {output_file}")
-                return True
+            logger.info(f"Exported requests to {output_file}")
+            return True
                 
         except Exception as e:
             logger.error(f"Failed to export to CSV: {e}")
             return False
 
+class DatabaseOpener:
+    """Opens a RequestDatabase on first use; create_app() gives each app its own"""
+
+    def __init__(self, db_path='requests.db', write_behind=True):
+        self.db_path = db_path
+        self.write_behind = write_behind
+        self.db = None
+        self._lock = threading.Lock()
+
+    def __call__(self) -> RequestDatabase:
+        if self.db is None:
+            # Startup opens it in the background; a request may get here first
+            with self._lock:
+                if self.db is None:
+                    self.db = RequestDatabase(self.db_path, write_behind=self.write_behind)
+        return self.db
+
+    def close(self):
+        """Flush and close the database if it was opened"""
+        with self._lock:
+            if self.db is not None:
+                self.db.close()
+
 # Global database instance
 request_db = None
+_init_lock = threading.Lock()
 
-def init_request_database(db_path='requests.db'):
-    """Initialize the global database instance"""
+def init_request_database(db_path='requests.db', write_behind=True):
+    """Initialize the global database instance (write-behind logging by default)"""
     global request_db
-    request_db = RequestDatabase(db_path)
+    with _init_lock:
+        request_db = RequestDatabase(db_path, write_behind=write_behind)
     return request_db
 
 def get_request_database():
-    """Get the global database instance"""
+    """Get the global database instance, opening it on first use"""
     global request_db
     if request_db is None:
-        request_db = init_request_database()
+        # Startup opens it in the background; a request may get here first
+        with _init_lock:
+            if request_db is None:
+                request_db = RequestDatabase('requests.db', write_behind=True)
     return request_db
\ No newline at end of file
@@ -0,0 +1,241 @@
+"""
+Device Pool
+Drives several ESP32 boards (porch, window, stage...) from one middleware
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+from serial_controller import CONNECT_SETTLE_SECONDS, MAX_RETRY_DELAY_SECONDS, SerialController
+
+logger = logging.getLogger(__name__)
+
+# How long connect() waits for the boards to open before reporting which made it
+CONNECT_TIMEOUT_SECONDS = 5.0
+
+
+def device_name(port: str) -> str:
+    """Default name for a board: its device file, e.g. ttyUSB0"""
+    return os.path.basename(port)
+
+
+def parse_devices(spec: str) -> Dict[str, str]:
+    """Parse SERIAL_DEVICES, e.g. "porch=/dev/ttyUSB0,window=/dev/ttyUSB1", into {name: port}
+
+    A bare port is named after its device file.
+    """
+    devices = {}
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, separator, port = item.partition('=')
+        if not separator:
+            name, port = device_name(item), item
+        devices[name.strip()] = port.strip()
+    return devices
+
+
+class DevicePool:
+    """Registry of ESP32 boards with parallel fan-out
+
+    Stands in for a single SerialController. Each board gets its own
+    SerialController, so its own writer thread, reader thread and command
+    buffer. A color is appended to every target board's buffer and the
+    writers send it in parallel. Fan-out latency is the slowest board's
+    write rather than the sum, and a hung board only backs up its own
+    buffer.
+
+    With devices given, the pool is pinned to those ports. Otherwise every
+    port that looks like an ESP32 is opened, named after its device file.
+    With an inventory, port lookups read its cache, and boards plugged in
+    later are registered (auto-discovery) or reopened (pinned) as soon as
+    the watcher sees them. With auto_reconnect, every board runs a
+    reconnect supervisor (see SerialController.start_supervisor).
+    """
+
+    def __init__(self, devices: Optional[Dict[str, str]] = None, binary_protocol: bool = True,
+                 settle_seconds: float = CONNECT_SETTLE_SECONDS, inventory=None,
+                 auto_reconnect: bool = False, max_retry_delay: float = MAX_RETRY_DELAY_SECONDS):
+        self.binary_protocol = binary_protocol
+        self.settle_seconds = settle_seconds
+        self.auto_discover = not devices
+        self.inventory = inventory
+        self.auto_reconnect = auto_reconnect
+        self.max_retry_delay = max_retry_delay
+        self._controllers = {}  # name -> SerialController, in registration order
+        self._lock = threading.Lock()
+        # Port listing only, never connected
+        self._probe = SerialController(binary_protocol=binary_protocol, inventory=inventory)
+        for name, port in (devices or {}).items():
+            self._add_locked(name, port)
+        if inventory is not None:
+            inventory.add_listener(self._on_ports_changed)
+
+    def _add_locked(self, name: str, port: str) -> SerialController:
+        controller = SerialController(binary_protocol=self.binary_protocol, port=port,
+                                      settle_seconds=self.settle_seconds, inventory=self.inventory,
+                                      max_retry_delay=self.max_retry_delay)
+        self._controllers[name] = controller
+        if self.auto_reconnect:
+            controller.start_supervisor()
+        return controller
+
+    def discover(self) -> List[str]:
+        """Register ESP32 ports not seen before (auto-discovery only). Returns the new device names"""
+        if not self.auto_discover:
+            return []
+        ports = self._probe.find_esp32_ports()
+        added = []
+        with self._lock:
+            known = {controller.configured_port for controller in self._controllers.values()}
+            for port in ports:
+                if port not in known:
+                    name = device_name(port)
+                    self._add_locked(name, port)
+                    added.append(name)
+        if added:
+            logger.info(f"Registered ESP32 devices: {', '.join(added)}")
+        return added
+
+    def _on_ports_changed(self, added: List[str], removed: List[str]):
+        """Open boards as soon as they are plugged in (runs on the watcher thread)"""
+        new_devices = self.discover()
+        replugged = [controller for controller in self.controllers().values()
+                     if controller.configured_port in added and not controller.is_connected()]
+        if self.auto_reconnect:
+            # New boards are already supervised; skip the backoff for returning ones
+            for controller in replugged:
+                controller.request_reconnect()
+        elif new_devices or replugged:
+            threading.Thread(target=self.connect, name="serial-hotplug-connect", daemon=True).start()
+
+    def controllers(self) -> Dict[str, SerialController]:
+        with self._lock:
+            return dict(self._controllers)
+
+    def get_device_names(self) -> List[str]:
+        with self._lock:
+            return list(self._controllers)
+
+    def connect(self, port: Optional[str] = None) -> bool:
+        """Open every registered board in parallel. True if at least one is connected
+
+        A port adds that board to the pool first.
+        """
+        if port is not None:
+            with self._lock:
+                if port not in {controller.configured_port for controller in self._controllers.values()}:
+                    self._add_locked(device_name(port), port)
+        self.discover()
+
+        controllers = self.controllers()
+        if not controllers:
+            logger.error("Could not find any ESP32 device")
+            return False
+        if self.auto_reconnect:
+            for controller in controllers.values():
+                controller.start_supervisor()
+
+        # A board whose port hangs on open is left to finish in the background
+        threads = [threading.Thread(target=controller.connect, name=f"serial-connect-{name}", daemon=True)
+                   for name, controller in controllers.items() if not controller.is_connected()]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + CONNECT_TIMEOUT_SECONDS
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+        connected = [name for name, controller in controllers.items() if controller.is_connected()]
+        logger.info(f"Connected to {len(connected)}/{len(controllers)} ESP32 devices: {', '.join(connected) or 'none'}")
+        return bool(connected)
+
+    def disconnect(self):
+        """Close every board and keep them closed until connect()"""
+        for controller in self.controllers().values():
+            controller.stop_supervisor()
+            controller.disconnect()
+
+    def is_connected(self) -> bool:
+        """True if any board is connected"""
+        return any(controller.is_connected() for controller in self.controllers().values())
+
+    def get_available_ports(self) -> List[Dict]:
+        return self._probe.get_available_ports()
+
+    def get_port_info(self) -> Optional[Dict]:
+        """Port details of the first connected board (the first board if none is)"""
+        infos = [info for info in (controller.get_port_info() for controller in self.controllers().values()) if info]
+        connected = [info for info in infos if info.get('connected', True)]
+        return (connected or infos or [None])[0]
+
+    def get_devices(self) -> List[Dict]:
+        """Name, port and connection state of every registered board"""
+        devices = []
+        for name, controller in self.controllers().items():
+            info = controller.get_port_info() or {'port': controller.configured_port, 'connected': False,
+                                                  'reconnect_attempts': controller.reconnect_attempts}
+            devices.append(dict(info, name=name))
+        return devices
+
+    def send_color_async(self, r: int, g: int, b: int, devices: Optional[List[str]] = None) -> Future:
+        """Queue a color on every board, or on the named subset
+
+        Returns a Future resolving to (success, message) once every target
+        board has written it; success means all of them did.
+        """
+        controllers = self.controllers()
+        if devices is not None:
+            unknown = [name for name in devices if name not in controllers]
+            if unknown:
+                logger.warning(f"Ignoring unknown devices: {', '.join(unknown)}")
+            controllers = {name: controllers[name] for name in devices if name in controllers}
+        if not controllers:
+            future = Future()
+            future.set_result((False, "No ESP32 devices available"))
+            return future
+        return self._gather({name: controller.send_color_async(r, g, b) for name, controller in controllers.items()})
+
+    def send_color(self, r: int, g: int, b: int, devices: Optional[List[str]] = None) -> Tuple[bool, str]:
+        """Send a color and wait for every target board's write"""
+        try:
+            return self.send_color_async(r, g, b, devices).result(timeout=self.settle_seconds + 4)
+        except Exception as e:
+            logger.error(f"Unexpected error sending color: {e}")
+            return False, f"Unexpected error: {e}"
+
+    @staticmethod
+    def _gather(futures: Dict[str, Future]) -> Future:
+        """Combine per-board write futures into one (success, message) future"""
+        combined = Future()
+        results = {}
+        lock = threading.Lock()
+
+        def on_done(name, future):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = (False, str(e))
+            with lock:
+                results[name] = result
+                if len(results) < len(futures):
+                    return
+            combined.set_result(DevicePool._summarize(results))
+
+        for name, future in futures.items():
+            future.add_done_callback(lambda future, name=name: on_done(name, future))
+        return combined
+
+    @staticmethod
+    def _summarize(results: Dict[str, Tuple[bool, str]]) -> Tuple[bool, str]:
+        if len(results) == 1:
+            return next(iter(results.values()))
+        failed = {name: message for name, (success, message) in results.items() if not success}
+        if not failed:
+            return True, f"Color sent to {len(results)} devices"
+        details = '; '.join(f"{name}: {message}" for name, message in failed.items())
+        return False, f"Color sent to {len(results) - len(failed)}/{len(results)} devices ({details})"
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Virtual ESP32
+Emulates the RGB controller firmware on a Linux pseudo-terminal so the
+serial path can be exercised without a board attached
+
+The emulator mirrors firmware/src/SerialHandler.cpp and main.cpp: verbose
+"=== Received Data ===" echoes for text commands, PROTO:BIN negotiation,
+binary frames answered with ACK/NAK, quiet output in binary mode and a
+"Transition complete" line once a color has faded in. Link conditions are
+configurable: baud-rate throttling, added latency, randomly dropped bytes
+and periodic disconnects. Setting paused stops reading, like a hung board:
+host writes back up and eventually time out.
+
+The port is exposed through a symlink that survives simulated
+disconnects, so point SerialController at emulator.port:
+
+    emulator = ESP32Emulator(latency=0.002)
+    emulator.start()
+    controller = SerialController(port=emulator.port, settle_seconds=0)
+    controller.connect()
+
+Usage: python esp32_emulator.py [--baud 115200] [--latency 0.002]
+                                [--drop-rate 0.001] [--disconnect-every 60]
+"""
+import argparse
+import logging
+import os
+import pty
+import random
+import select
+import tempfile
+import threading
+import time
+import tty
+
+import serial_protocol
+
+logger = logging.getLogger(__name__)
+
+# Mirrors firmware/include/Config.h
+SERIAL_BUFFER_SIZE = 256
+SERIAL_TIMEOUT_SECONDS = 1.0
+
+# Roughly how long main.cpp's 20/255-per-10ms blend takes to reach the target
+TRANSITION_SECONDS = 0.3
+
+BOOT_BANNER = (
+    "ESP32 RGB Controller Starting...",
+    "LEDs set to blue at 20% brightness",
+    "Waiting for color data over USB serial...",
+    "Send commands like: RGB:255,0,0 (red) or RGB:0,255,0 (green)",
+    "Note: Brightness is fixed at 20% - brightness values in commands are ignored",
+    "[DEBUG] Serial handler initialized",
+)
+
+
+def parse_rgb_command(data: str):
+    """Port of SerialHandler::parseRGBCommand. Returns (r, g, b, brightness) or None"""
+    parts = data[4:].split(',')
+    if len(data) <= 4 or len(parts) < 3:
+        return None
+
+    def to_int(text):
+        # Arduino String::toInt parses a leading integer and returns 0 otherwise
+        digits = ''
+        for char in text.strip():
+            if char.isdigit() or (char == '-' and not digits):
+                digits += char
+            else:
+                break
+        try:
+            return int(digits)
+        except ValueError:
+            return 0
+
+    r, g, b = to_int(parts[0]), to_int(parts[1]), to_int(parts[2])
+    brightness = to_int(parts[3]) if len(parts) > 3 else 255
+    values = (r, g, b, brightness)
+    if any(value > 255 for value in values):
+        return None
+    # The firmware stores these in uint8_t
+    return tuple(value & 0xFF for value in values)
+
+
+class ESP32Emulator:
+    """Firmware emulator bound to a pty, running on a background thread"""
+
+    def __init__(self, baud_rate=115200, latency=0.0, drop_rate=0.0, disconnect_every=None,
+                 transition_seconds=TRANSITION_SECONDS, boot_banner=True, link_path=None, seed=None):
+        self.baud_rate = baud_rate
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.disconnect_every = disconnect_every
+        self.transition_seconds = transition_seconds
+        self.boot_banner = boot_banner
+        self._link_dir = None
+        if link_path is None:
+            self._link_dir = tempfile.mkdtemp(prefix='esp32-')
+            link_path = os.path.join(self._link_dir, 'ttyESP32')
+        self.port = link_path
+        self._random = random.Random(seed)
+        self._master = None
+        self._slave = None
+        self._thread = None
+        self._running = False
+        self.paused = False
+        self._lock = threading.Lock()
+
+        # Emulated firmware state
+        self.binary_mode = False
+        self.color = (0, 0, 255)  # boots blue
+        self._buffer = bytearray()
+        self._frame = bytearray()
+        self._last_receive = 0.0
+        self._transition_due = None
+        self._boot_time = time.monotonic()
+
+        # Counters for tests and benchmarks
+        self.stats = {'commands': 0, 'colors': 0, 'frames_acked': 0, 'frames_nacked': 0,
+                      'bytes_dropped': 0, 'disconnects': 0}
+        self.received_colors = []  # (r, g, b, monotonic time) in the order they were applied
+
+    def start(self):
+        """Open the pty and start emulating"""
+        self._open_pty()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        logger.info(f"ESP32 emulator listening on {self.port}")
+        return self.port
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self._close_pty()
+        if os.path.islink(self.port):
+            os.unlink(self.port)
+        if self._link_dir is not None:
+            os.rmdir(self._link_dir)
+            self._link_dir = None
+
+    def disconnect(self):
+        """Simulate unplugging and replugging: the open port fails and a fresh pty takes its place"""
+        with self._lock:
+            self._close_pty()
+            self.stats['disconnects'] += 1
+            self._open_pty()
+        logger.info("ESP32 emulator simulated a disconnect")
+
+    def _open_pty(self):
+        self._master, self._slave = pty.openpty()
+        # No echo or line editing on the device side, like a real USB CDC port
+        tty.setraw(self._slave)
+        tmp_link = self.port + '.new'
+        os.symlink(os.ttyname(self._slave), tmp_link)
+        os.replace(tmp_link, self.port)
+
+        # Opening the port resets the board
+        self.binary_mode = False
+        self._buffer.clear()
+        self._frame.clear()
+        self._transition_due = None
+        self._boot_time = time.monotonic()
+        if self.boot_banner:
+            self._println(*BOOT_BANNER)
+
+    def _close_pty(self):
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._master = self._slave = None
+
+    def _run(self):
+        while self._running:
+            if self.disconnect_every and time.monotonic() - self._boot_time >= self.disconnect_every:
+                self.disconnect()
+
+            if self.paused:
+                time.sleep(0.01)
+                continue
+
+            master = self._master
+            try:
+                readable, _, _ = select.select([master], [], [], 0.01)
+                data = os.read(master, 4096) if readable else b''
+            except (OSError, ValueError, TypeError):
+                # Host side closed, or the pty was replaced under us
+                time.sleep(0.01)
+                continue
+
+            now = time.monotonic()
+            for byte in data:
+                if self.drop_rate and self._random.random() < self.drop_rate:
+                    self.stats['bytes_dropped'] += 1
+                    continue
+                self._last_receive = now
+                self._handle_byte(byte)
+
+            # SerialHandler clears a partial command after SERIAL_TIMEOUT
+            if (self._buffer or self._frame) and now - self._last_receive > SERIAL_TIMEOUT_SECONDS:
+                self._debug("Serial timeout - clearing buffer")
+                self._buffer.clear()
+                self._frame.clear()
+
+            if self._transition_due is not None and now >= self._transition_due:
+                self._transition_due = None
+                if not self.binary_mode:
+                    r, g, b = self.color
+                    self._println(f"Transition complete: R={r}, G={g}, B={b}")
+
+    def _handle_byte(self, byte: int):
+        """Port of SerialHandler::handleIncomingData for one byte"""
+        if self._frame or (not self._buffer and byte == serial_protocol.SYNC):
+            self._frame.append(byte)
+            if len(self._frame) == serial_protocol.FRAME_LENGTH:
+                self._process_frame(bytes(self._frame))
+                self._frame.clear()
+            return
+
+        if byte in (0x0A, 0x0D):
+            if self._buffer:
+                self._process_text(self._buffer.decode('latin-1'))
+                self._buffer.clear()
+        elif len(self._buffer) < SERIAL_BUFFER_SIZE - 1:
+            self._buffer.append(byte)
+        else:
+            self._debug("Buffer overflow! Clearing buffer.")
+            self._buffer.clear()
+
+    def _process_frame(self, frame: bytes):
+        decoded = serial_protocol.decode_frame(frame)
+        if decoded is None or decoded[0] != serial_protocol.OP_SET_RGB:
+            self.stats['frames_nacked'] += 1
+            self._send(bytes((serial_protocol.SYNC, serial_protocol.NAK)))
+            return
+        self.stats['frames_acked'] += 1
+        self._send(bytes((serial_protocol.SYNC, serial_protocol.ACK_FLAG | serial_protocol.OP_SET_RGB)))
+        r, g, b = decoded[1]
+        self._apply_color(r, g, b)
+
+    def _process_text(self, data: str):
+        """Port of SerialHandler::processReceivedData"""
+        self.stats['commands'] += 1
+        if data == serial_protocol.NEGOTIATE_COMMAND:
+            self.binary_mode = True
+            self._println(serial_protocol.NEGOTIATE_REPLY)
+            return
+
+        if self.binary_mode:
+            if data.startswith("RGB:"):
+                parsed = parse_rgb_command(data)
+                if parsed is not None:
+                    self._apply_color(*parsed[:3])
+            else:
+                self._println(f"Echo: {data}")
+            return
+
+        lines = [
+            "=== Received Data ===",
+            f"Raw data: {data}",
+            f"Length: {len(data)}",
+            f"Timestamp: {int((time.monotonic() - self._boot_time) * 1000)}",
+        ]
+        parsed = None
+        if data.startswith("RGB:"):
+            lines.append("[DEBUG] Detected RGB color command")
+            parsed = parse_rgb_command(data)
+            if parsed is not None:
+                r, g, b, brightness = parsed
+                lines.append(f"Parsed RGB: R={r}, G={g}, B={b}, Brightness={brightness}")
+                lines.append(f"Transitioning to: R={r}, G={g}, B={b} (Brightness fixed at 20%)")
+            else:
+                lines.append("Failed to parse RGB command")
+        else:
+            lines.append("Generic data received - echoing back:")
+            lines.append(f"Echo: {data}")
+        lines.extend(("=====================", ""))
+        self._println(*lines)
+
+        if parsed is not None:
+            self._apply_color(*parsed[:3], announce=False)
+
+    def _apply_color(self, r, g, b, announce=True):
+        self.color = (r, g, b)
+        self.stats['colors'] += 1
+        self.received_colors.append((r, g, b, time.monotonic()))
+        self._transition_due = time.monotonic() + self.transition_seconds
+        if announce and not self.binary_mode:
+            self._println(f"Transitioning to: R={r}, G={g}, B={b} (Brightness fixed at 20%)")
+
+    def _debug(self, message: str):
+        if not self.binary_mode:
+            self._println(f"[DEBUG] {message}")
+
+    def _println(self, *lines):
+        self._send(''.join(f"{line}\r\n" for line in lines).encode('utf-8'))
+
+    def _send(self, payload: bytes):
+        """Write to the host, applying latency, baud-rate throttling and byte drops"""
+        if self.latency:
+            time.sleep(self.latency)
+        if self.drop_rate:
+            kept = bytearray()
+            for byte in payload:
+                if self._random.random() < self.drop_rate:
+                    self.stats['bytes_dropped'] += 1
+                else:
+                    kept.append(byte)
+            payload = bytes(kept)
+        if self.baud_rate:
+            # 8N1: ten bit times per byte
+            time.sleep(len(payload) * 10 / self.baud_rate)
+        try:
+            os.write(self._master, payload)
+        except (OSError, TypeError):
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--baud', type=int, default=115200, help='throttle output to this baud rate (0 = unthrottled)')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added before every reply')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='probability of dropping each byte')
+    parser.add_argument('--disconnect-every', type=float, help='simulate an unplug every N seconds')
+    parser.add_argument('--link', help='symlink path for the port (default: a temp directory)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    emulator = ESP32Emulator(baud_rate=args.baud, latency=args.latency, drop_rate=args.drop_rate,
+                             disconnect_every=args.disconnect_every, link_path=args.link)
+    port = emulator.start()
+    print(f"Virtual ESP32 on {port} - run the middleware with SERIAL_PORT={port}")
+    try:
+        while True:
+            time.sleep(5)
+            logger.info(f"Emulator stats: {emulator.stats}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        emulator.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -7,22 +7,39 @@ class Config:
     HOST = os.getenv('HOST', '127.0.0.1')  # localhost
     PORT = int(os.getenv('PORT', 5001))
     DEBUG = os.getenv('DEBUG', 'True').lower() == 'true'
+    ASYNC_MODE = os.getenv('ASYNC_MODE', 'threading').lower()  # 'threading' or 'eventlet'
+    ASYNC_MAX_CONNECTIONS = int(os.getenv('ASYNC_MAX_CONNECTIONS', 10000))  # eventlet only
     
     # Serial communication settings
     SERIAL_BAUD_RATE = int(os.getenv('SERIAL_BAUD_RATE', 115200))
     SERIAL_TIMEOUT = int(os.getenv('SERIAL_TIMEOUT', 2))
+    SERIAL_BINARY_PROTOCOL = os.getenv('SERIAL_BINARY_PROTOCOL', 'True').lower() == 'true'
+    SERIAL_PORT = os.getenv('SERIAL_PORT', '')  # empty = auto-detect the ESP32
+    SERIAL_DEVICES = os.getenv('SERIAL_DEVICES', '')  # name=port pairs, e.g. porch=/dev/ttyUSB0,stage=/dev/ttyUSB1
+    PORT_WATCH_INTERVAL = float(os.getenv('PORT_WATCH_INTERVAL', 1.0))  # seconds between hotplug checks
     
     # Logging settings
-    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
-    LOG_FILE = os.getenv('LOG_FILE', 'middleware.log')
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')  # plus per-subsystem levels, e.g. INFO,color_queue=DEBUG
+    LOG_FILE = os.getenv('LOG_FILE', 'middleware.log')  # empty = console only
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()  # log file format: 'json' or 'text'
+    LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))  # rotate the log file at this size
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))  # rotated files kept
     
     # API settings
     MAX_USERNAME_LENGTH = int(os.getenv('MAX_USERNAME_LENGTH', 50))
     ENABLE_CORS = os.getenv('ENABLE_CORS', 'True').lower() == 'true'
     
+    # Queue settings
+    QUEUE_POLICY = os.getenv('QUEUE_POLICY', 'fifo').lower()  # 'fifo' or 'fair'
+    QUEUE_COALESCE = os.getenv('QUEUE_COALESCE', 'False').lower() == 'true'
+    QUEUE_ADAPTIVE_SLOTS = os.getenv('QUEUE_ADAPTIVE_SLOTS', 'False').lower() == 'true'
+    QUEUE_MIN_SLOT_SECONDS = float(os.getenv('QUEUE_MIN_SLOT_SECONDS', 5))
+    QUEUE_TARGET_DEPTH = int(os.getenv('QUEUE_TARGET_DEPTH', 15))
+    QUEUE_JOURNAL_PATH = os.getenv('QUEUE_JOURNAL_PATH', 'queue_journal.log')  # empty disables journaling
+    
     # ESP32 connection settings
     AUTO_RECONNECT = os.getenv('AUTO_RECONNECT', 'True').lower() == 'true'
-    CONNECTION_RETRY_DELAY = int(os.getenv('CONNECTION_RETRY_DELAY', 5))
+    CONNECTION_RETRY_DELAY = float(os.getenv('CONNECTION_RETRY_DELAY', 5))  # longest reconnect backoff, seconds
     
     @classmethod
     def get_all_settings(cls):
@@ -31,12 +48,27 @@ class Config:
             'HOST': cls.HOST,
             'PORT': cls.PORT,
             'DEBUG': cls.DEBUG,
+            'ASYNC_MODE': cls.ASYNC_MODE,
+            'ASYNC_MAX_CONNECTIONS': cls.ASYNC_MAX_CONNECTIONS,
             'SERIAL_BAUD_RATE': cls.SERIAL_BAUD_RATE,
             'SERIAL_TIMEOUT': cls.SERIAL_TIMEOUT,
+            'SERIAL_BINARY_PROTOCOL': cls.SERIAL_BINARY_PROTOCOL,
+            'SERIAL_PORT': cls.SERIAL_PORT,
+            'SERIAL_DEVICES': cls.SERIAL_DEVICES,
+            'PORT_WATCH_INTERVAL': cls.PORT_WATCH_INTERVAL,
             'LOG_LEVEL': cls.LOG_LEVEL,
             'LOG_FILE': cls.LOG_FILE,
+            'LOG_FORMAT': cls.LOG_FORMAT,
+            'LOG_MAX_BYTES': cls.LOG_MAX_BYTES,
+            'LOG_BACKUP_COUNT': cls.LOG_BACKUP_COUNT,
             'MAX_USERNAME_LENGTH': cls.MAX_USERNAME_LENGTH,
             'ENABLE_CORS': cls.ENABLE_CORS,
+            'QUEUE_POLICY': cls.QUEUE_POLICY,
+            'QUEUE_COALESCE': cls.QUEUE_COALESCE,
+            'QUEUE_ADAPTIVE_SLOTS': cls.QUEUE_ADAPTIVE_SLOTS,
+            'QUEUE_MIN_SLOT_SECONDS': cls.QUEUE_MIN_SLOT_SECONDS,
+            'QUEUE_TARGET_DEPTH': cls.QUEUE_TARGET_DEPTH,
+            'QUEUE_JOURNAL_PATH': cls.QUEUE_JOURNAL_PATH,
             'AUTO_RECONNECT': cls.AUTO_RECONNECT,
             'CONNECTION_RETRY_DELAY': cls.CONNECTION_RETRY_DELAY
         }
\ No newline at end of file
@@ -0,0 +1,163 @@
+"""
+Log Pipeline
+Queue-based logging: callers only enqueue records, and a background writer
+sends them to the console and a size-rotated log file
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+from datetime import datetime
+from typing import Dict, Tuple
+
+from metrics import registry
+from serving import native_module
+
+FORMAT_JSON = 'json'
+FORMAT_TEXT = 'text'
+LOG_FORMATS = (FORMAT_JSON, FORMAT_TEXT)
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Records waiting for the writer; a full queue drops new records instead of blocking the caller
+QUEUE_SIZE = 10000
+
+# Rotation defaults: start a new file at this size and keep this many old ones
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 5
+
+# Socket.IO and Engine.IO log every packet at INFO; LOG_LEVEL can turn them back up
+DEFAULT_LEVELS = {'socketio': 'WARNING', 'engineio': 'WARNING'}
+
+LOG_RECORDS_DROPPED = registry.counter('rgb_log_records_dropped', 'Log records dropped because the log queue was full')
+
+# Attributes every record has; anything else came in through extra= and goes into the JSON
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'taskName'}
+
+
+def parse_levels(spec: str) -> Tuple[str, Dict[str, str]]:
+    """Parse LOG_LEVEL, e.g. "INFO,color_queue=DEBUG,engineio=INFO", into (root level, {logger: level})
+
+    A bare level is the default for everything. A name=level pair sets one
+    subsystem: that logger and the loggers below it (engineio covers
+    engineio.server).
+    """
+    root = 'INFO'
+    levels = dict(DEFAULT_LEVELS)
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, separator, level = item.partition('=')
+        if separator:
+            levels[name.strip()] = level.strip().upper()
+        else:
+            root = item.upper()
+    for level in [root, *levels.values()]:
+        if not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f"Unknown log level: {level}")
+    return root, levels
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, thread, message and any extra= fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues without ever waiting; counts what a full queue drops"""
+
+    writer = None  # the LogWriter draining this queue, when set up by setup_logging()
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class LogWriter(logging.handlers.QueueListener):
+    """QueueListener on a native OS thread
+
+    Under eventlet a green writer thread would block the event loop on
+    every file write, so the writer and its queue come from the unpatched
+    standard library.
+    """
+
+    def start(self):
+        self._thread = native_module('threading').Thread(target=self._monitor, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def enqueue_sentinel(self):
+        # Waits for room rather than dropping it, or stop() would never return
+        self.queue.put(self._sentinel)
+
+    def stop(self):
+        """Write out everything queued so far, stop the thread and close the handlers"""
+        if self._thread is None:
+            return
+        super().stop()
+        for handler in self.handlers:
+            handler.close()
+
+
+def setup_logging(level_spec: str = 'INFO', log_file: str = 'middleware.log', log_format: str = FORMAT_JSON,
+                  max_bytes: int = MAX_BYTES, backup_count: int = BACKUP_COUNT, console: bool = True) -> LogWriter:
+    """Route every log record through a queue to a background writer
+
+    The root logger gets a single QueueHandler, so a logging call on a
+    request or dispatch thread only merges its message and enqueues it.
+    The writer thread prints text to the console (unless console is off)
+    and writes log_format (json or text) to log_file, rotated at
+    max_bytes with backup_count old files kept. Returns the started
+    writer; it drains the queue at exit. Calling it again replaces the
+    previous pipeline and stops its writer.
+    """
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"Unknown log format: {log_format}")
+    root_level, levels = parse_levels(level_spec)
+
+    handlers = []
+    if console:
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        handlers.append(stream_handler)
+    if log_file:
+        file_handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes,
+                                                            backupCount=backup_count, encoding='utf-8')
+        file_handler.setFormatter(JsonFormatter() if log_format == FORMAT_JSON else logging.Formatter(TEXT_FORMAT))
+        handlers.append(file_handler)
+
+    log_queue = native_module('queue').Queue(QUEUE_SIZE)
+    writer = LogWriter(log_queue, *handlers, respect_handler_level=True)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        if isinstance(handler, NonBlockingQueueHandler) and handler.writer is not None:
+            handler.writer.stop()
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.writer = writer
+    root.addHandler(queue_handler)
+    root.setLevel(root_level)
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level)
+
+    writer.start()
+    atexit.register(writer.stop)
+    return writer
@@ -0,0 +1,205 @@
+"""
+Metrics
+In-process counters, gauges and histograms exposed at /metrics in the
+Prometheus text exposition format
+"""
+
+import functools
+import logging
+import threading
+import time
+from bisect import bisect_left
+from flask import Response
+
+logger = logging.getLogger(__name__)
+
+# Default histogram buckets (seconds), from sub-millisecond stages up to slow serial writes
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonically increasing count"""
+    type_name = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def samples(self):
+        yield self.name + '_total', self._value
+
+
+class Gauge:
+    """Value that can go up and down, or is read from a function at scrape time"""
+    type_name = 'gauge'
+
+    def __init__(self, name, help_text, function=None):
+        self.name = name
+        self.help = help_text
+        self._value = 0
+        self._function = function
+
+    def set(self, value):
+        self._value = value
+
+    def set_function(self, function):
+        self._function = function
+
+    @property
+    def value(self):
+        return self._function() if self._function is not None else self._value
+
+    def samples(self):
+        yield self.name, self.value
+
+
+class Histogram:
+    """Observations counted into fixed cumulative buckets"""
+    type_name = 'histogram'
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._counts = [0] * len(self.buckets)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def time(self):
+        """Context manager / decorator observing the elapsed wall time in seconds"""
+        return _Timer(self)
+
+    @property
+    def count(self):
+        return sum(self._counts)
+
+    @property
+    def sum(self):
+        return self._sum
+
+    def samples(self):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            yield f'{self.name}_bucket{{le="{_format_value(bound)}"}}', cumulative
+        yield self.name + '_sum', total
+        yield self.name + '_count', cumulative
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self._started)
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Timer(self.histogram):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+class MetricsRegistry:
+    """Named metrics rendered together in the text exposition format
+
+    Each metric has its own small lock, so recording on one hot path never
+    waits on another, and scraping only holds a histogram's lock long
+    enough to copy its buckets.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text) -> Counter:
+        return self._register(Counter(name, help_text))
+
+    def gauge(self, name, help_text, function=None) -> Gauge:
+        gauge = self._register(Gauge(name, help_text))
+        if function is not None:
+            gauge.set_function(function)
+        return gauge
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, buckets))
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            try:
+                for sample, value in metric.samples():
+                    lines.append(f"{sample} {_format_value(value)}")
+            except Exception as e:
+                logger.error(f"Error collecting metric {metric.name}: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+# Shared registry the middleware modules record into
+registry = MetricsRegistry()
+
+
+def setup_metrics_routes(app, app_registry: MetricsRegistry = None):
+    """Set up the /metrics endpoint (local access only, like the OBS routes)
+
+    app_registry holds this app's own metrics (its queue and board gauges)
+    and is rendered after the shared registry.
+    """
+    from routes import is_local_request
+
+    @app.route('/metrics', methods=['GET'])
+    def get_metrics():
+        if not is_local_request():
+            return Response('Access denied: local access only\n', status=403, mimetype='text/plain')
+        text = registry.render()
+        if app_registry is not None:
+            text += app_registry.render()
+        return Response(text, content_type=CONTENT_TYPE)
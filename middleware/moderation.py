@@ -0,0 +1,190 @@
+"""
+Username Moderation
+Precompiled profanity matcher with a verdict cache, replacing per-request
+better_profanity scans on the /api/color hot path
+"""
+
+import logging
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from better_profanity import profanity
+from better_profanity.utils import get_complete_path_of_file, read_wordlist
+
+logger = logging.getLogger(__name__)
+
+# Verdict cache bounds
+CACHE_SIZE = 10000
+CACHE_TTL_SECONDS = 3600
+
+
+class ProfanityMatcher:
+    """Multi-pattern matcher built once from the better_profanity word list
+
+    All censor words are compiled into a single trie. Text is walked once
+    from each word start, following every trie edge the current character
+    can stand for (so '@' advances along both 'a' and 'o'), which replaces
+    better_profanity's comparison of every token against every word. As in
+    better_profanity, a match has to end on a word boundary, and
+    multi-word entries match whether the words are joined by their
+    separators or run together.
+    """
+
+    def __init__(self, words=None, char_map=None, allowed_characters=None):
+        if words is None:
+            words = read_wordlist(get_complete_path_of_file("profanity_wordlist.txt"))
+        char_map = char_map if char_map is not None else profanity.CHARS_MAPPING
+        self.allowed_characters = allowed_characters if allowed_characters is not None else profanity.ALLOWED_CHARACTERS
+
+        # Input character -> pattern characters it may stand for
+        self._alternatives = {}
+        for pattern_char, variants in char_map.items():
+            for variant in variants:
+                self._alternatives.setdefault(variant, set()).add(pattern_char)
+        # Every character can also stand for itself
+        self._alternatives = {char: tuple(chars | {char}) for char, chars in self._alternatives.items()}
+
+        self._edges = [{}]
+        self._terminal = [False]
+        self.max_words = 1
+        pattern_count = 0
+        for word in set(words):
+            word = word.lower()
+            node = 0
+            for char in word:
+                next_node = self._edges[node].get(char)
+                if next_node is None:
+                    next_node = len(self._edges)
+                    self._edges[node][char] = next_node
+                    self._edges.append({})
+                    self._terminal.append(False)
+                node = next_node
+            self._terminal[node] = True
+            pattern_count += 1
+            separators = sum(1 for char in word if char not in self.allowed_characters)
+            self.max_words = max(self.max_words, separators + 1)
+
+        logger.info(f"Compiled profanity matcher: {pattern_count} words, {len(self._edges)} states")
+
+    def _step(self, states, char):
+        edges = self._edges
+        next_states = set()
+        for pattern_char in self._alternatives.get(char, (char,)):
+            for state in states:
+                next_state = edges[state].get(pattern_char)
+                if next_state is not None:
+                    next_states.add(next_state)
+        return next_states
+
+    def contains_profanity(self, text: str) -> bool:
+        text = text.lower()
+        allowed = self.allowed_characters
+        length = len(text)
+
+        for start in range(length):
+            # Only start matching at the beginning of a word
+            if text[start] not in allowed or (start > 0 and text[start - 1] in allowed):
+                continue
+
+            states = {0}
+            words = 1
+            index = start
+            while index < length and states:
+                char = text[index]
+                if char in allowed:
+                    states = self._step(states, char)
+                    index += 1
+                    continue
+
+                # Word boundary: a terminal state here is a whole-word match
+                if any(self._terminal[state] for state in states):
+                    return True
+
+                separator_end = index
+                while separator_end < length and text[separator_end] not in allowed:
+                    separator_end += 1
+                words += 1
+                if separator_end >= length or words > self.max_words:
+                    states = set()
+                    break
+
+                # Either the pattern spells out the separators, or the words run together
+                literal = states
+                for separator in text[index:separator_end]:
+                    literal = self._step(literal, separator)
+                states = states | literal
+                index = separator_end
+
+            if states and any(self._terminal[state] for state in states):
+                return True
+
+        return False
+
+
+class UsernameModerator:
+    """Caches profanity verdicts per normalized username
+
+    The matcher is compiled on first use. Verdicts are kept in an LRU
+    cache with a TTL, so repeat usernames cost a dictionary lookup.
+    """
+
+    def __init__(self, cache_size=CACHE_SIZE, ttl=CACHE_TTL_SECONDS, matcher=None):
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self._matcher = matcher
+        self._cache = OrderedDict()  # normalized username -> (verdict, expires_at)
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def matcher(self) -> ProfanityMatcher:
+        if self._matcher is None:
+            with self._build_lock:
+                if self._matcher is None:
+                    self._matcher = ProfanityMatcher()
+        return self._matcher
+
+    @staticmethod
+    def normalize(username: str) -> str:
+        """Fold compatibility characters (e.g. full-width letters) and case"""
+        return unicodedata.normalize('NFKC', username).lower()
+
+    def contains_profanity(self, username: str) -> bool:
+        key = self.normalize(username)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[1] > now:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+
+        verdict = self.matcher.contains_profanity(key)
+
+        with self._lock:
+            self._cache[key] = (verdict, now + self.ttl)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return verdict
+
+    def check_many(self, usernames) -> dict:
+        """Check several usernames at once. Returns {username: contains_profanity}"""
+        return {username: self.contains_profanity(username) for username in usernames}
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {'cache_size': len(self._cache), 'hits': self.hits, 'misses': self.misses}
+
+
+# Shared moderator used by the routes
+username_moderator = UsernameModerator()
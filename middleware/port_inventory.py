@@ -0,0 +1,142 @@
+"""
+Port Inventory
+Cached list of serial ports, kept current by a background hotplug watcher
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List
+
+import serial.tools.list_ports
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of /dev for added or removed device nodes
+WATCH_INTERVAL = 1.0
+
+# Full rescan at least this often, for systems where /dev does not reflect hotplug
+RESCAN_INTERVAL = 30.0
+
+DEV_DIR = '/dev'
+
+PORT_SCANS = registry.counter('rgb_serial_port_scans', 'Serial port enumerations (comports)')
+PORT_SCAN_SECONDS = registry.histogram('rgb_serial_port_scan_seconds', 'Time to enumerate serial ports')
+
+
+class PortInventory:
+    """Serial ports enumerated once and served from memory
+
+    comports() walks sysfs on Linux, which is slow enough to matter on
+    every /api/status hit and every reconnect. The watcher thread lists
+    /dev (microseconds) and only re-enumerates when a device node appears
+    or disappears, or every RESCAN_INTERVAL seconds. Listeners are called
+    on the watcher thread with (added, removed) device paths when the
+    port set changes. With scan=False the first scan is left to the
+    caller (e.g. a startup task); reading the ports before then scans.
+    """
+
+    def __init__(self, watch_interval=WATCH_INTERVAL, rescan_interval=RESCAN_INTERVAL, scan=True):
+        self.watch_interval = watch_interval
+        self.rescan_interval = rescan_interval
+        self._ports = []  # ListPortInfo from the last scan
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._dev_entries = None
+        self._scanned_at = time.monotonic()
+        self._scanned = threading.Event()
+        self._first_scan_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if scan:
+            self.refresh()
+
+    def ensure_scanned(self):
+        """Scan now unless a scan has already run"""
+        if not self._scanned.is_set():
+            with self._first_scan_lock:
+                if not self._scanned.is_set():
+                    self.refresh()
+
+    def ports(self) -> list:
+        """ListPortInfo for every serial port, as of the last scan"""
+        self.ensure_scanned()
+        with self._lock:
+            return list(self._ports)
+
+    def get_available_ports(self) -> List[Dict]:
+        """Serial ports as dicts, the shape /api/status reports"""
+        return [{
+            'device': port.device,
+            'description': port.description,
+            'hwid': port.hwid,
+            'vid': port.vid,
+            'pid': port.pid
+        } for port in self.ports()]
+
+    def add_listener(self, callback: Callable[[List[str], List[str]], None]):
+        """Register callback(added, removed), called when the port set changes"""
+        self._listeners.append(callback)
+
+    def refresh(self) -> bool:
+        """Re-enumerate ports now. Returns True if the port set changed
+
+        The first scan is the baseline: nothing was plugged in, so
+        listeners are not called for it.
+        """
+        with PORT_SCAN_SECONDS.time():
+            ports = list(serial.tools.list_ports.comports())
+        PORT_SCANS.inc()
+        self._scanned_at = time.monotonic()
+
+        with self._lock:
+            baseline = not self._scanned.is_set()
+            before = {port.device for port in self._ports}
+            self._ports = ports
+            self._scanned.set()
+        after = {port.device for port in ports}
+        added, removed = sorted(after - before), sorted(before - after)
+        if baseline or not (added or removed):
+            return False
+
+        logger.info(f"Serial ports changed - added: {', '.join(added) or 'none'}, removed: {', '.join(removed) or 'none'}")
+        for callback in self._listeners:
+            try:
+                callback(added, removed)
+            except Exception as e:
+                logger.error(f"Error in port change listener: {e}")
+        return True
+
+    def _dev_changed(self) -> bool:
+        try:
+            entries = frozenset(os.listdir(DEV_DIR))
+        except OSError:
+            return False
+        changed = self._dev_entries is not None and entries != self._dev_entries
+        self._dev_entries = entries
+        return changed
+
+    def start(self):
+        """Start the hotplug watcher thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._dev_changed()  # baseline listing
+        self._thread = threading.Thread(target=self._watch_loop, name="port-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def _watch_loop(self):
+        while not self._stop.wait(self.watch_interval):
+            try:
+                if self._dev_changed() or time.monotonic() - self._scanned_at >= self.rescan_interval:
+                    self.refresh()
+            except Exception as e:
+                logger.error(f"Error watching serial ports: {e}")
@@ -0,0 +1,250 @@
+"""
+Queue Journal
+Append-only log of queue events so pending color requests survive a restart
+"""
+
+import json
+import logging
+import os
+import threading
+
+from serving import offload
+
+logger = logging.getLogger(__name__)
+
+# Seconds between group fsyncs; events written within an interval share one fsync
+SYNC_INTERVAL = 0.1
+
+# Compact once the journal holds this many records and most of them are dead
+COMPACT_MIN_RECORDS = 10000
+COMPACT_RATIO = 4
+
+# Event types
+OP_ENQUEUE = 'enqueue'
+OP_UPDATE = 'update'
+OP_DISPATCH = 'dispatch'
+OP_CANCEL = 'cancel'
+OP_CLEAR = 'clear'
+
+
+def _fsync_directory(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class QueueJournal:
+    """Crash-safe record of enqueue, update, dispatch, cancel and clear events
+
+    Events are appended as JSON lines and fsynced in groups by a background
+    thread, so a request accepted by the API is on disk within
+    SYNC_INTERVAL. The journal mirrors the set of pending requests in
+    memory; whenever dead records outnumber live ones by COMPACT_RATIO the
+    file is rewritten as a snapshot of pending requests (written to a
+    temporary file and renamed over the old one). The snapshot is written
+    and fsynced without holding the lock, since appends happen under the
+    queue lock; only the rename waits for them.
+
+    recover() replays the journal once at startup, compacts it and opens it
+    for appending. A torn last line from a crash is ignored.
+    """
+
+    def __init__(self, path, sync_interval=SYNC_INTERVAL):
+        self.path = path
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._file = None
+        self._pending = {}  # request_id -> enqueue record, in enqueue order
+        self._records = 0   # records currently in the file
+        self._dirty = False
+        self._tail = None   # lines appended while a compaction is writing its snapshot
+        self._stop = threading.Event()
+        self._thread = None
+        self.sync_count = 0
+        self.compactions = 0
+
+    def recover(self) -> list:
+        """Replay the journal and start journaling. Returns pending enqueue records in order"""
+        pending = {}
+        records = self._read_records()
+        for record in records:
+            self._apply(pending, record)
+        records = len(records)
+
+        with self._lock:
+            self._pending = pending
+        self._compact(opening=True)
+
+        self._thread = threading.Thread(target=self._sync_loop, daemon=True)
+        self._thread.start()
+        logger.info(f"Recovered {len(pending)} pending requests from {records} journal records")
+        return list(pending.values())
+
+    def _read_records(self) -> list:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = f.read()
+        if not data.strip():
+            return []
+
+        # One parse of the whole file as a JSON array is much faster than one per line
+        try:
+            return json.loads('[' + data.rstrip('\n').replace('\n', ',') + ']')
+        except ValueError:
+            pass
+
+        records = []
+        for line_number, line in enumerate(data.splitlines(), 1):
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                logger.warning(f"Skipping unreadable journal line {line_number}")
+        return records
+
+    @staticmethod
+    def _apply(pending: dict, record: dict):
+        op = record.get('op')
+        if op == OP_ENQUEUE:
+            pending[record['id']] = record
+        elif op == OP_UPDATE:
+            existing = pending.get(record['id'])
+            if existing is not None:
+                existing.update(r=record['r'], g=record['g'], b=record['b'], devices=record.get('devices'))
+        elif op in (OP_DISPATCH, OP_CANCEL):
+            pending.pop(record['id'], None)
+        elif op == OP_CLEAR:
+            pending.clear()
+
+    def record_enqueue(self, color_request: dict):
+        record = {
+            'op': OP_ENQUEUE,
+            'id': color_request['request_id'],
+            'user': color_request['username'],
+            'r': color_request['r'],
+            'g': color_request['g'],
+            'b': color_request['b'],
+            'seq': color_request['_key'][1],
+            't': color_request['queued_at'].timestamp()
+        }
+        if color_request.get('devices'):
+            record['devices'] = color_request['devices']
+        self._append(record)
+
+    def record_update(self, color_request: dict):
+        self._append({'op': OP_UPDATE, 'id': color_request['request_id'],
+                      'r': color_request['r'], 'g': color_request['g'], 'b': color_request['b'],
+                      'devices': color_request.get('devices')})
+
+    def record_dispatch(self, request_id: str):
+        self._append({'op': OP_DISPATCH, 'id': request_id})
+
+    def record_cancel(self, request_id: str):
+        self._append({'op': OP_CANCEL, 'id': request_id})
+
+    def record_clear(self):
+        self._append({'op': OP_CLEAR})
+
+    def _append(self, record: dict):
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line)
+            if self._tail is not None:
+                self._tail.append(line)
+            self._records += 1
+            self._apply(self._pending, record)
+            self._dirty = True
+
+    def _sync_loop(self):
+        while not self._stop.wait(self.sync_interval):
+            try:
+                self.sync()
+                self._maybe_compact()
+            except Exception as e:
+                logger.error(f"Error syncing queue journal: {e}")
+
+    def sync(self):
+        """Flush buffered events and fsync them"""
+        with self._lock:
+            if not self._dirty or self._file is None:
+                return
+            self._file.flush()
+            fd = self._file.fileno()
+            self._dirty = False
+        offload(os.fsync, fd)
+        self.sync_count += 1
+
+    def _maybe_compact(self):
+        with self._lock:
+            if self._records < COMPACT_MIN_RECORDS or self._records < COMPACT_RATIO * len(self._pending):
+                return
+            before = self._records
+        if self._compact():
+            self.compactions += 1
+            logger.info(f"Compacted queue journal from {before} to {self._records} records")
+
+    def _compact(self, opening: bool = False) -> bool:
+        """Replace the journal with a snapshot of pending requests. Returns False if closed meanwhile
+
+        The lock is held only to copy the pending requests and, at the end,
+        to carry over lines appended in between and rename the file.
+        """
+        with self._lock:
+            snapshot = [dict(record) for record in self._pending.values()]
+            self._tail = []
+
+        temp_path = self.path + '.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for record in snapshot:
+                    f.write(json.dumps(record, separators=(',', ':')) + '\n')
+                f.flush()
+                offload(os.fsync, f.fileno())
+        except Exception:
+            with self._lock:
+                self._tail = None
+            raise
+
+        with self._lock:
+            tail, self._tail = self._tail, None
+            if self._file is None and not opening:
+                os.remove(temp_path)
+                return False
+            # Synced with the next group fsync, like any other append
+            with open(temp_path, 'a', encoding='utf-8') as f:
+                f.writelines(tail)
+            if self._file is not None:
+                self._file.close()
+            os.replace(temp_path, self.path)
+            self._file = open(self.path, 'a', encoding='utf-8')
+            self._records = len(snapshot) + len(tail)
+            self._dirty = bool(tail)
+
+        # Make the rename itself survive a power loss
+        offload(_fsync_directory, os.path.dirname(os.path.abspath(self.path)))
+        return True
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                'path': self.path,
+                'pending': len(self._pending),
+                'records': self._records,
+                'syncs': self.sync_count,
+                'compactions': self.compactions
+            }
+
+    def close(self):
+        """Stop the sync thread and fsync anything still buffered"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self.sync()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
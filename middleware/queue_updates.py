@@ -0,0 +1,179 @@
+"""
+Queue Position Updates
+Pushes per-request position/ETA changes to web viewers over Socket.IO
+"""
+
+import logging
+import threading
+from flask import request
+from flask_socketio import emit, join_room, leave_room
+
+logger = logging.getLogger(__name__)
+
+# Public namespace for web viewers (the default namespace is reserved for OBS)
+QUEUE_NAMESPACE = '/queue'
+
+# Seconds between broadcast ticks; all queue changes within a tick are coalesced
+UPDATE_INTERVAL = 1.0
+
+# States after which a request can no longer change
+FINAL_STATES = ('done', 'cancelled')
+
+
+class QueueUpdateBroadcaster:
+    """Batches queue changes and emits one update per subscribed request per tick
+
+    Each request id is a Socket.IO room in the /queue namespace. The color
+    queue only flags that something changed; a single background task then
+    reads the states of all subscribed requests under one lock acquisition
+    and emits to the rooms whose position, state or schedule moved.
+    """
+
+    def __init__(self, socketio, color_queue, interval=UPDATE_INTERVAL):
+        self.socketio = socketio
+        self.color_queue = color_queue
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._subscribers = {}  # request_id -> set of sids
+        self._sid_requests = {}  # sid -> set of request_ids
+        self._last_sent = {}  # request_id -> (state, queue_position, scheduled_time)
+        self._dirty = False
+        self._task = None
+
+        color_queue.add_listener(self.mark_dirty)
+
+    def start(self):
+        """Start the background broadcast task"""
+        if self._task is None:
+            self._task = self.socketio.start_background_task(self._broadcast_loop)
+
+    def mark_dirty(self):
+        """Called by the color queue on every change; cheap and non-blocking"""
+        self._dirty = True
+
+    def subscribe(self, sid, request_id):
+        with self._lock:
+            self._subscribers.setdefault(request_id, set()).add(sid)
+            self._sid_requests.setdefault(sid, set()).add(request_id)
+
+    def unsubscribe(self, sid, request_id):
+        with self._lock:
+            self._remove_locked(sid, request_id)
+            requests = self._sid_requests.get(sid)
+            if requests is not None:
+                requests.discard(request_id)
+                if not requests:
+                    del self._sid_requests[sid]
+
+    def remove_client(self, sid):
+        with self._lock:
+            for request_id in self._sid_requests.pop(sid, ()):
+                self._remove_locked(sid, request_id)
+
+    def _remove_locked(self, sid, request_id):
+        sids = self._subscribers.get(request_id)
+        if sids is None:
+            return
+        sids.discard(sid)
+        if not sids:
+            del self._subscribers[request_id]
+            self._last_sent.pop(request_id, None)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._sid_requests)
+
+    def _broadcast_loop(self):
+        while True:
+            self.socketio.sleep(self.interval)
+            if not self._dirty:
+                continue
+            self._dirty = False
+            try:
+                self.broadcast()
+            except Exception as e:
+                logger.error(f"Error broadcasting queue updates: {e}")
+
+    def broadcast(self) -> int:
+        """Emit changed states to subscribed rooms. Returns the number of rooms updated"""
+        with self._lock:
+            request_ids = list(self._subscribers)
+        if not request_ids:
+            return 0
+
+        statuses = self.color_queue.get_request_statuses(request_ids)
+        sent = 0
+        finished = []
+        for request_id, status in statuses.items():
+            if status is None:
+                continue
+            fingerprint = (status['state'], status.get('queue_position'), status['scheduled_time'])
+            if self._last_sent.get(request_id) == fingerprint:
+                continue
+            self._last_sent[request_id] = fingerprint
+            self.socketio.emit('queue_update', status, to=request_id, namespace=QUEUE_NAMESPACE)
+            sent += 1
+            if status['state'] in FINAL_STATES:
+                finished.append(request_id)
+
+        # Nothing more will change for finished requests, so stop tracking them
+        if finished:
+            with self._lock:
+                for request_id in finished:
+                    for sid in self._subscribers.pop(request_id, ()):
+                        requests = self._sid_requests.get(sid)
+                        if requests is not None:
+                            requests.discard(request_id)
+                            if not requests:
+                                del self._sid_requests[sid]
+                    self._last_sent.pop(request_id, None)
+
+        if sent:
+            logger.debug(f"Pushed queue updates to {sent} request rooms")
+        return sent
+
+
+def _request_id_from(data):
+    """The request_id of a subscribe/unsubscribe payload, or None if it is missing or malformed"""
+    if not isinstance(data, dict):
+        return None
+    request_id = data.get('request_id')
+    return request_id if isinstance(request_id, str) and request_id else None
+
+
+def setup_queue_updates(socketio, color_queue):
+    """Set up the public /queue namespace and start the update broadcaster"""
+    broadcaster = QueueUpdateBroadcaster(socketio, color_queue)
+
+    @socketio.on('subscribe', namespace=QUEUE_NAMESPACE)
+    def handle_subscribe(data):
+        request_id = _request_id_from(data)
+        if request_id is None:
+            emit('queue_error', {'error': 'Expected {"request_id": "<id>"}'})
+            return
+
+        status = color_queue.get_request_status(request_id)
+        if status is None:
+            emit('queue_error', {'error': 'Request not found', 'request_id': request_id})
+            return
+
+        join_room(request_id)
+        broadcaster.subscribe(request.sid, request_id)
+        # Send the current state right away; later changes arrive on the next tick
+        emit('queue_update', status)
+
+    @socketio.on('unsubscribe', namespace=QUEUE_NAMESPACE)
+    def handle_unsubscribe(data):
+        request_id = _request_id_from(data)
+        if request_id is None:
+            emit('queue_error', {'error': 'Expected {"request_id": "<id>"}'})
+            return
+        leave_room(request_id)
+        broadcaster.unsubscribe(request.sid, request_id)
+
+    @socketio.on('disconnect', namespace=QUEUE_NAMESPACE)
+    def handle_queue_disconnect():
+        broadcaster.remove_client(request.sid)
+
+    broadcaster.start()
+    return broadcaster
@@ -1,17 +1,27 @@
-from flask import request, jsonify
+from flask import request, jsonify, Response, stream_with_context
 from datetime import datetime
 import logging
 from color_queue import timer
 from database import get_request_database
-from better_profanity import profanity
+from moderation import username_moderator
+from metrics import registry
 
 logger = logging.getLogger(__name__)
 
-# Initialize profanity filter
-profanity.load_censor_words()
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
 
-def register_routes(app, serial_controller, color_queue):
-    """Register all API routes with the Flask app"""
+# Per-stage latency of POST /api/color
+COLOR_REQUEST_SECONDS = registry.histogram('rgb_color_request_seconds', 'Time to handle POST /api/color')
+PROFANITY_CHECK_SECONDS = registry.histogram('rgb_profanity_check_seconds', 'Time spent checking usernames for profanity')
+DB_LOG_SECONDS = registry.histogram('rgb_db_log_seconds', 'Time spent logging a request to the database')
+
+def is_local_request():
+    """True if the request comes from this machine (same check as the OBS routes)"""
+    client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR', ''))
+    return client_ip.startswith('127.0.0.1') or client_ip.startswith('::1') or client_ip.startswith('localhost') or client_ip == ''
+
+def register_routes(app, serial_controller, color_queue, get_database=get_request_database):
+    """Register all API routes with the Flask app; get_database returns the RequestDatabase to log to"""
     
     @app.route('/', methods=['GET'])
     def health_check():
@@ -24,6 +34,7 @@ def register_routes(app, serial_controller, color_queue):
         })
 
     @app.route('/api/color', methods=['POST'])
+    @COLOR_REQUEST_SECONDS.time()
     def set_color():
         """
         Main API endpoint to set RGB color
@@ -34,7 +45,8 @@ def register_routes(app, serial_controller, color_queue):
                 "r": 255,
                 "g": 128,
                 "b": 64
-            }
+            },
+            "devices": ["porch", "stage"]  (optional, default: every board)
         }
         """
         try:
@@ -55,7 +67,9 @@ def register_routes(app, serial_controller, color_queue):
             username = data['username']
             
             # Check username for profanity
-            if profanity.contains_profanity(username):
+            with PROFANITY_CHECK_SECONDS.time():
+                contains_profanity = username_moderator.contains_profanity(username)
+            if contains_profanity:
                 logger.warning(f"Profanity detected in username: '{username}'")
                 return jsonify({
                     'error': 'Username contains inappropriate language. Please choose a different username.',
@@ -71,33 +85,57 @@ def register_routes(app, serial_controller, color_queue):
                 if not isinstance(color[component], int) or not (0 <= color[component] <= 255):
                     return jsonify({'error': f'Color {component} must be integer between 0-255'}), 400
             
-            # Log the request
-            logger.info(f"Color change request from user '{username}': RGB({color['r']}, {color['g']}, {color['b']})")
+            # Validate the target boards
+            devices = data.get('devices')
+            if devices is not None:
+                if not isinstance(devices, list) or not devices or not all(isinstance(name, str) for name in devices):
+                    return jsonify({'error': 'Devices must be a non-empty list of device names'}), 400
+                known_devices = serial_controller.get_device_names()
+                unknown_devices = [name for name in devices if name not in known_devices]
+                if unknown_devices:
+                    return jsonify({'error': f'Unknown devices: {", ".join(unknown_devices)}'}), 400
+            
+            # Log the request (lazily formatted: this runs on every /api/color)
+            logger.debug("Color change request from user '%s': RGB(%s, %s, %s)", username, color['r'], color['g'], color['b'])
             
             # Add color request to queue with proper timing
-            color_request = color_queue.add_request(username, color['r'], color['g'], color['b'])
+            color_request = color_queue.add_request(username, color['r'], color['g'], color['b'], devices)
             
             # Log request to database
             try:
-                db = get_request_database()
-                db_id = db.log_request(username, color['r'], color['g'], color['b'])
-                logger.debug(f"Request logged to database with ID: {db_id}")
+                db = get_database()
+                with DB_LOG_SECONDS.time():
+                    db_id = db.log_request(username, color['r'], color['g'], color['b'])
+                if db_id is not None:
+                    logger.debug("Request logged to database with ID: %s", db_id)
             except Exception as db_error:
                 logger.error(f"Failed to log request to database: {db_error}")
                 # Don't fail the request if database logging fails
             
+            if color_request['coalesced']:
+                message = f'Pending color request updated - Position {color_request["queue_position"]} in queue, estimated wait: {color_request["estimated_wait_seconds"]} seconds'
+            else:
+                message = f'Color request queued successfully - Position {color_request["queue_position"]} in queue, estimated wait: {color_request["estimated_wait_seconds"]} seconds'
+
             response = {
                 'status': 'queued',
-                'message': f'Color request queued successfully - Position {color_request["queue_position"]} in queue, estimated wait: {color_request["estimated_wait_seconds"]} seconds',
+                'message': message,
                 'username': username,
                 'color': color,
+                'devices': devices,
                 'request_id': color_request['request_id'],
                 'queue_position': color_request['queue_position'],
                 'estimated_wait_seconds': color_request['estimated_wait_seconds'],
                 'scheduled_time': color_request['scheduled_time'].isoformat(),
+                'coalesced': color_request['coalesced'],
                 'timestamp': datetime.now().isoformat()
             }
-            logger.info(f"Successfully queued color request for user '{username}' (ID: {color_request['request_id']}) - Position: {color_request['queue_position']}, Wait: {color_request['estimated_wait_seconds']}s")
+            logger.info("Successfully queued color request for user '%s' (ID: %s) - Position: %s, Wait: %ss",
+                        username, color_request['request_id'], color_request['queue_position'],
+                        color_request['estimated_wait_seconds'],
+                        extra={'username': username, 'request_id': color_request['request_id'],
+                               'queue_position': color_request['queue_position'],
+                               'wait_seconds': color_request['estimated_wait_seconds']})
             return jsonify(response), 200
                 
         except Exception as e:
@@ -109,12 +147,21 @@ def register_routes(app, serial_controller, color_queue):
             }), 500
 
 
+    @app.route('/api/color/<request_id>', methods=['GET'])
+    def get_color_request_status(request_id):
+        """Get the state of a submitted color request (queued/displaying/done/cancelled)"""
+        status = color_queue.get_request_status(request_id)
+        if status is None:
+            return jsonify({'error': 'Request not found', 'request_id': request_id}), 404
+        return jsonify(status)
+
     @app.route('/api/status', methods=['GET'])
     def get_status():
         """Get current system status"""
         return jsonify({
             'serial_connected': serial_controller.is_connected(),
             'serial_port': serial_controller.get_port_info(),
+            'devices': serial_controller.get_devices(),
             'uptime': datetime.now().isoformat(),
             'available_ports': serial_controller.get_available_ports(),
             'queue_status': color_queue.get_queue_status()
@@ -122,11 +169,25 @@ def register_routes(app, serial_controller, color_queue):
 
     @app.route('/api/queue', methods=['GET'])
     def get_queue_status():
-        """Get detailed queue status"""
+        """Get detailed queue status
+
+        Optional query parameters ``offset`` and ``limit`` page through the
+        queue contents instead of returning the whole backlog.
+        """
+        offset = request.args.get('offset', 0, type=int)
+        limit = request.args.get('limit', type=int)
         status = color_queue.get_queue_status()
-        status['queue_contents'] = color_queue.get_queue_contents()
+        status['queue_contents'] = color_queue.get_queue_contents(max(0, offset), limit)
         return jsonify(status)
 
+    @app.route('/api/queue/curve', methods=['GET'])
+    def get_queue_curve():
+        """Get throughput versus wait per backlog depth, for tuning adaptive slots"""
+        return jsonify({
+            'slot_seconds': color_queue.get_queue_status()['slot_seconds'],
+            'curve': color_queue.get_slot_curve()
+        })
+
     @app.route('/api/queue/clear', methods=['POST'])
     def clear_queue():
         """Clear all pending requests from the queue"""
@@ -137,6 +198,39 @@ def register_routes(app, serial_controller, color_queue):
             'cleared_count': cleared_count
         })
 
+    @app.route('/api/export', methods=['GET'])
+    def export_requests():
+        """
+        Stream the request log (local access only)
+        Query parameters:
+            format: csv (default) or ndjson
+            gzip: 1 to gzip-compress the stream
+            since_id: only rows with a larger id (for incremental exports)
+            since / until: ISO timestamp window, until is exclusive
+        """
+        if not is_local_request():
+            logger.warning("Blocked external access to /api/export")
+            return jsonify({'error': 'Access denied'}), 403
+
+        fmt = request.args.get('format', 'csv')
+        if fmt not in EXPORT_MIMETYPES:
+            return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+
+        compress = request.args.get('gzip', '0').lower() in ('1', 'true')
+        window = {
+            'since_id': request.args.get('since_id', 0, type=int),
+            'since': request.args.get('since'),
+            'until': request.args.get('until')
+        }
+
+        filename = f"requests_export.{fmt}" + ('.gz' if compress else '')
+        stream = get_database().iter_export(fmt, compress=compress, **window)
+        return Response(
+            stream_with_context(stream),
+            mimetype='application/gzip' if compress else EXPORT_MIMETYPES[fmt],
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+
     @app.errorhandler(404)
     def not_found(error):
         return jsonify({'error': 'Endpoint not found'}), 404
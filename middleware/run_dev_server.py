@@ -14,16 +14,24 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 # Load environment variables
 load_dotenv()
 
-from app import app
+from app import ASYNC_MODE, create_app, startup
+from serving import ASYNC_THREADING
 
 if __name__ == '__main__':
+    app = create_app(startup)
+    socketio = app.extensions['middleware']['socketio']
     print("Starting RGB Controller Middleware API...")
     print(f"Server will run at http://127.0.0.1:5000")
     print("Press CTRL+C to stop the server")
     print("-" * 50)
     
-    app.run(
+    # Through SocketIO so the OBS source and queue viewers can connect
+    server_options = {'allow_unsafe_werkzeug': True} if ASYNC_MODE == ASYNC_THREADING else {}
+    startup.accepting()
+    socketio.run(
+        app,
         host='127.0.0.1',
         port=5000,
-        debug=False
+        debug=False,
+        **server_options
     )
\ No newline at end of file
@@ -1,19 +1,106 @@
 import serial
 import serial.tools.list_ports
+import random
+import threading
 import time
 import logging
+from collections import deque
+from concurrent.futures import Future
 from typing import Tuple, List, Optional, Dict
 
+import serial_protocol
+from metrics import registry
+
 logger = logging.getLogger(__name__)
 
+# Maximum number of commands waiting for the writer thread; the oldest is dropped when full
+COMMAND_BUFFER_SIZE = 64
+
+# Time the ESP32 needs to boot after the port is opened (opening toggles DTR and resets it)
+CONNECT_SETTLE_SECONDS = 2.0
+
+# Read timeout for the reader thread, bounds how long it takes to notice a disconnect
+READ_POLL_SECONDS = 0.2
+
+# Reconnect backoff: first retry after this long, doubling up to the configured maximum
+RECONNECT_INITIAL_DELAY = 0.25
+MAX_RETRY_DELAY_SECONDS = 5.0
+
+# The supervisor sends TEST after this long without hearing from the board, and
+# reconnects after HEARTBEAT_MISSES unanswered heartbeats in a row
+HEARTBEAT_INTERVAL = 5.0
+HEARTBEAT_TIMEOUT = 2.0
+HEARTBEAT_MISSES = 2
+
+SERIAL_WRITE_SECONDS = registry.histogram('rgb_serial_write_seconds', 'Time to write and flush one command')
+SERIAL_ECHO_RTT_SECONDS = registry.histogram('rgb_serial_echo_rtt_seconds', 'Time from write until the ESP32 echoes or ACKs a command')
+SERIAL_WRITE_ERRORS = registry.counter('rgb_serial_write_errors', 'Commands that could not be written')
+SERIAL_COMMANDS_DROPPED = registry.counter('rgb_serial_commands_dropped', 'Commands dropped because the buffer was full')
+SERIAL_CONNECTS = registry.counter('rgb_serial_connects', 'Successful connections to the ESP32')
+SERIAL_RECONNECTS = registry.counter('rgb_serial_reconnects', 'Reconnection attempts after an established connection was lost')
+SERIAL_RECONNECT_FAILURES = registry.counter('rgb_serial_reconnect_failures', 'Reconnection attempts that failed')
+SERIAL_HEARTBEAT_MISSES = registry.counter('rgb_serial_heartbeat_misses', 'Heartbeats the ESP32 did not answer')
+
 class SerialController:
-    """Handles USB serial communication with the ESP32"""
+    """Handles USB serial communication with the ESP32
+
+    All writes go through a persistent writer thread fed from a bounded
+    command buffer, and all reads happen on a reader thread that parses the
+    ESP32's echo output. Callers get a Future back, so the queue worker
+    never blocks on serial latency or on the post-connect boot delay.
+
+    With binary_protocol enabled, each connection offers the compact frame
+    format from serial_protocol and switches to it once the firmware
+    confirms; until then (or with older firmware) the RGB: text protocol
+    is used.
+
+    port pins the controller to one device (e.g. the esp32_emulator pty)
+    instead of auto-detecting by VID/PID, including on reconnects. With an
+    inventory (port_inventory.PortInventory), port listings come from its
+    cache instead of enumerating the system each time.
+
+    Once start_supervisor() is called, a supervisor thread owns connection
+    health. It reconnects with jittered exponential backoff and sends
+    heartbeats while the line is quiet. Writes fail fast while the board is
+    down instead of reconnecting inline, and after reconnecting the latest
+    color is shown again, because opening the port resets the board.
+    """
     
-    def __init__(self):
+    def __init__(self, binary_protocol: bool = True, port: Optional[str] = None,
+                 settle_seconds: float = CONNECT_SETTLE_SECONDS, inventory=None,
+                 max_retry_delay: float = MAX_RETRY_DELAY_SECONDS,
+                 heartbeat_interval: float = HEARTBEAT_INTERVAL,
+                 heartbeat_timeout: float = HEARTBEAT_TIMEOUT):
         self.serial_connection = None
+        self.inventory = inventory
         self.port = None
+        self.configured_port = port
+        self.settle_seconds = settle_seconds
         self.baud_rate = 115200
         self.timeout = 2
+        self.binary_protocol = binary_protocol
+        self.protocol = 'text'  # protocol in use on the current connection
+        self._commands = deque()  # (label, rgb tuple or None, Future)
+        self._commands_changed = threading.Condition()
+        self._writer_thread = None
+        self._reader_thread = None
+        self._ready_at = 0.0  # monotonic time after which the board accepts commands
+        self._pending_echoes = deque(maxlen=COMMAND_BUFFER_SIZE)  # (command label, monotonic send time) awaiting echo or ACK
+        self._test_echo = threading.Event()
+        self.last_echo_rtt = None  # seconds between write and the ESP32 echoing the command
+        self.last_transition_complete = None  # last "Transition complete" line from the ESP32
+        self._connect_lock = threading.Lock()
+        self._last_rx = 0.0  # monotonic time the board last sent anything
+        self._last_color = None  # last color written, shown again after a reconnect
+        self._latest_color = None  # newest color that arrived while disconnected
+        self.max_retry_delay = max_retry_delay
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.reconnect_attempts = 0  # consecutive failed reconnects
+        self._has_connected = False  # once set, connection attempts count as reconnects
+        self._supervisor_thread = None
+        self._supervisor_stop = threading.Event()
+        self._wake = threading.Event()  # interrupts the supervisor's wait (disconnect, hotplug, stop)
         self.esp32_vid_pid_pairs = [
             ('10C4', '0001'),  # Silicon Labs CP210x
             ('1A86', '7523'),  # QinHeng Electronics HL-340
@@ -22,8 +109,15 @@ class SerialController:
             ('2341', '0001'),  # Arduino
         ]
     
+    def _list_ports(self) -> list:
+        if self.inventory is not None:
+            return self.inventory.ports()
+        return list(serial.tools.list_ports.comports())
+    
     def get_available_ports(self) -> List[Dict]:
         """Get list of available serial ports"""
+        if self.inventory is not None:
+            return self.inventory.get_available_ports()
         ports = []
         for port in serial.tools.list_ports.comports():
             ports.append({
@@ -35,32 +129,49 @@ class SerialController:
             })
         return ports
     
-    def find_esp32_port(self) -> Optional[str]:
-        """Automatically find ESP32 port by VID/PID"""
-        for port in serial.tools.list_ports.comports():
+    def find_esp32_ports(self) -> List[str]:
+        """Find every port that looks like an ESP32 by VID/PID, or by description if none does"""
+        ports = []
+        available = self._list_ports()
+        for port in available:
             if port.vid and port.pid:
                 vid_hex = f"{port.vid:04X}"
-                pid_hex = f"{port.pid:04X}"
                 
                 # Check if it matches known ESP32 VID/PID pairs
-                for known_vid, known_pid in self.esp32_vid_pid_pairs:
-                    if vid_hex == known_vid or 'CP210' in port.description or 'ESP32' in port.description:
-                        logger.info(f"Found potential ESP32 at {port.device}: {port.description}")
-                        return port.device
+                if any(vid_hex == known_vid for known_vid, _ in self.esp32_vid_pid_pairs) \
+                        or 'CP210' in port.description or 'ESP32' in port.description:
+                    logger.info(f"Found potential ESP32 at {port.device}: {port.description}")
+                    ports.append(port.device)
+        
+        if ports:
+            return ports
         
         # Fallback: look for common ESP32 device names
-        for port in serial.tools.list_ports.comports():
+        for port in available:
             description = port.description.upper()
             if any(keyword in description for keyword in ['CP210', 'ESP32', 'SILICON LABS', 'USB-SERIAL']):
                 logger.info(f"Found potential ESP32 by description at {port.device}: {port.description}")
-                return port.device
+                ports.append(port.device)
         
-        return None
+        return ports
+    
+    def find_esp32_port(self) -> Optional[str]:
+        """Automatically find ESP32 port by VID/PID"""
+        ports = self.find_esp32_ports()
+        return ports[0] if ports else None
     
     def connect(self, port: Optional[str] = None) -> bool:
         """Connect to ESP32 via serial"""
+        with self._connect_lock:
+            # The supervisor, a hotplug event and the writer may all try at once
+            if self.is_connected() and (port is None or port == self.port):
+                return True
+            return self._connect(port)
+    
+    def _connect(self, port: Optional[str]) -> bool:
         try:
             # Auto-detect port if not specified
+            port = port or self.configured_port
             if not port:
                 port = self.find_esp32_port()
                 if not port:
@@ -71,22 +182,38 @@ class SerialController:
             if self.serial_connection and self.serial_connection.is_open:
                 self.serial_connection.close()
             
-            # Create new connection
+            # Create new connection; short read timeout so the reader thread stays responsive
             self.serial_connection = serial.Serial(
                 port=port,
                 baudrate=self.baud_rate,
-                timeout=self.timeout,
+                timeout=READ_POLL_SECONDS,
                 write_timeout=self.timeout
             )
             
             self.port = port
+            self.protocol = 'text'  # Opening the port resets the board, so renegotiate
+            self._pending_echoes.clear()
             
-            # Wait for connection to stabilize
-            time.sleep(2)
+            # The writer holds commands until the board has booted instead of sleeping here
+            self._ready_at = time.monotonic() + self.settle_seconds
+            self._start_reader()
+            self._ensure_writer()
             
             # Test connection by sending a ping
             if self.test_connection():
+                # Offer binary framing; the reader switches over if the firmware agrees
+                if self.binary_protocol:
+                    self._submit(serial_protocol.NEGOTIATE_COMMAND)
+                SERIAL_CONNECTS.inc()
+                self._has_connected = True
                 logger.info(f"Successfully connected to ESP32 at {port}")
+                
+                # Opening the port reset the board; show the newest color again
+                restore = self._latest_color or self._last_color
+                self._latest_color = None
+                if restore is not None:
+                    logger.info(f"Restoring RGB{restore} on {port}")
+                    self._submit("RGB:{},{},{}".format(*restore), restore)
                 return True
             else:
                 logger.error(f"Connection test failed for {port}")
@@ -102,78 +229,293 @@ class SerialController:
     
     def disconnect(self):
         """Disconnect from serial port"""
-        if self.serial_connection and self.serial_connection.is_open:
-            self.serial_connection.close()
-            logger.info(f"Disconnected from {self.port}")
+        connection = self.serial_connection
         self.serial_connection = None
+        if connection and connection.is_open:
+            connection.close()
+            logger.info(f"Disconnected from {self.port}")
         self.port = None
+        self._wake.set()  # let the supervisor start reconnecting
     
     def is_connected(self) -> bool:
         """Check if connected to ESP32"""
         return (self.serial_connection is not None and 
                 self.serial_connection.is_open)
     
-    def test_connection(self) -> bool:
-        """Test if ESP32 is responding"""
+    def test_connection(self, timeout: float = 0.0) -> bool:
+        """Test if ESP32 is responding
+
+        Queues a TEST message; with a timeout, waits for the reader thread to
+        see it echoed back. Without one only the port state is checked, as
+        the board may legitimately still be booting.
+        """
         try:
             if not self.is_connected():
                 return False
             
-            # Clear any pending data
-            self.serial_connection.reset_input_buffer()
+            self._test_echo.clear()
+            future = self._submit("TEST")
+            if timeout <= 0:
+                return True  # Even if no echo yet, connection might be working
             
-            # Send test message
-            test_message = "TEST\n"
-            self.serial_connection.write(test_message.encode('utf-8'))
-            
-            # Wait for response (ESP32 should echo)
-            time.sleep(0.5)
-            
-            # Check if there's any response
-            if self.serial_connection.in_waiting > 0:
-                response = self.serial_connection.read(self.serial_connection.in_waiting)
-                logger.debug(f"Connection test response: {response}")
-                return True
-            
-            return True  # Even if no echo, connection might be working
+            success, _ = future.result(timeout=timeout + self.settle_seconds)
+            return success and self._test_echo.wait(timeout)
             
         except Exception as e:
             logger.error(f"Connection test failed: {e}")
             return False
     
-    def send_color(self, r: int, g: int, b: int) -> Tuple[bool, str]:
-        """Send RGB color to ESP32"""
+    def send_color_async(self, r: int, g: int, b: int, devices: Optional[List[str]] = None) -> Future:
+        """Queue an RGB color for the writer thread
+
+        Returns a Future resolving to (success, message) once the command has
+        been written. Never blocks on the serial port. devices is accepted
+        for the same signature as DevicePool; a single board shows every
+        color whatever names are given.
+        """
+        return self._submit(f"RGB:{r},{g},{b}", (r, g, b))
+    
+    def send_color(self, r: int, g: int, b: int, devices: Optional[List[str]] = None) -> Tuple[bool, str]:
+        """Send RGB color to ESP32 and wait for the write to complete"""
+        try:
+            return self.send_color_async(r, g, b, devices).result(timeout=self.settle_seconds + self.timeout * 2)
+        except Exception as e:
+            logger.error(f"Unexpected error sending color: {e}")
+            return False, f"Unexpected error: {e}"
+    
+    def _submit(self, label: str, rgb: Optional[Tuple[int, int, int]] = None) -> Future:
+        """Append a command to the ring buffer, evicting the oldest if it is full
+
+        Colors carry their rgb values so the writer can encode them for
+        whichever protocol is active when they are actually sent.
+        """
+        future = Future()
+        self._ensure_writer()
+        with self._commands_changed:
+            if len(self._commands) >= COMMAND_BUFFER_SIZE:
+                _, _, dropped = self._commands.popleft()
+                dropped.set_result((False, "Dropped: serial command buffer full"))
+                SERIAL_COMMANDS_DROPPED.inc()
+                logger.warning("Serial command buffer full - dropped oldest command")
+            self._commands.append((label, rgb, future))
+            self._commands_changed.notify()
+        return future
+    
+    def _ensure_writer(self):
+        if self._writer_thread is None or not self._writer_thread.is_alive():
+            self._writer_thread = threading.Thread(target=self._writer_loop, name="serial-writer", daemon=True)
+            self._writer_thread.start()
+    
+    def _start_reader(self):
+        self._reader_thread = threading.Thread(
+            target=self._reader_loop, args=(self.serial_connection,), name="serial-reader", daemon=True)
+        self._reader_thread.start()
+    
+    def _writer_loop(self):
+        """Owns all writes to the port, one command at a time"""
+        while True:
+            with self._commands_changed:
+                while not self._commands:
+                    self._commands_changed.wait()
+                label, rgb, future = self._commands.popleft()
+            
+            if not future.set_running_or_notify_cancel():
+                continue
+            future.set_result(self._write(label, rgb))
+    
+    def _write(self, label: str, rgb: Optional[Tuple[int, int, int]]) -> Tuple[bool, str]:
         try:
             # Ensure connection
             if not self.is_connected():
+                if self.is_supervised():
+                    # Fail fast; the supervisor reconnects and shows the newest color
+                    if rgb is not None:
+                        self._latest_color = rgb
+                    return False, "ESP32 disconnected - reconnecting in the background"
+                reconnecting = self._has_connected
+                if reconnecting:
+                    SERIAL_RECONNECTS.inc()
                 if not self.connect():
+                    if reconnecting:
+                        SERIAL_RECONNECT_FAILURES.inc()
                     return False, "Could not establish serial connection"
             
-            # Format RGB command
-            command = f"RGB:{r},{g},{b}\n"
+            # Hold the command until the board has finished booting
+            delay = self._ready_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
             
-            # Send command
-            self.serial_connection.write(command.encode('utf-8'))
-            self.serial_connection.flush()
+            connection = self.serial_connection
+            if connection is None:
+                return False, "Serial connection closed"
             
-            logger.info(f"Sent RGB command: {command.strip()}")
+            if rgb is not None and self.protocol == 'binary':
+                payload = serial_protocol.encode_rgb_frame(*rgb)
+                self._pending_echoes.append((label, time.monotonic()))
+            else:
+                payload = f"{label}\n".encode('utf-8')
+                # In binary mode the firmware no longer echoes text commands
+                if self.protocol == 'text':
+                    self._pending_echoes.append((label, time.monotonic()))
             
-            # Optional: Read response from ESP32
-            time.sleep(0.1)
-            if self.serial_connection.in_waiting > 0:
-                response = self.serial_connection.read(self.serial_connection.in_waiting)
-                logger.debug(f"ESP32 response: {response.decode('utf-8', errors='ignore')}")
+            # Send command
+            with SERIAL_WRITE_SECONDS.time():
+                connection.write(payload)
+                connection.flush()
             
+            if rgb is not None:
+                self._last_color = rgb
+            logger.info(f"Sent command: {label} ({self.protocol})")
             return True, "Color sent successfully"
             
         except serial.SerialException as e:
-            logger.error(f"Serial error sending color: {e}")
+            SERIAL_WRITE_ERRORS.inc()
+            logger.error(f"Serial error sending {label}: {e}")
             self.disconnect()  # Reset connection on error
             return False, f"Serial communication error: {e}"
         except Exception as e:
-            logger.error(f"Unexpected error sending color: {e}")
+            SERIAL_WRITE_ERRORS.inc()
+            logger.error(f"Unexpected error sending {label}: {e}")
             return False, f"Unexpected error: {e}"
     
+    def _reader_loop(self, connection):
+        """Reads and parses ESP32 output until the connection is closed
+
+        Output is text lines, except that binary replies (SYNC plus one
+        status byte) may arrive between lines once binary mode is active.
+        """
+        line = bytearray()
+        expecting_reply = False
+        while connection is self.serial_connection and connection.is_open:
+            try:
+                chunk = connection.read(connection.in_waiting or 1)
+            except Exception as e:
+                if connection is self.serial_connection:
+                    logger.error(f"Serial read error: {e}")
+                    self.disconnect()
+                break
+            if chunk:
+                self._last_rx = time.monotonic()
+            for byte in chunk:
+                if expecting_reply:
+                    expecting_reply = False
+                    self._handle_reply(byte)
+                elif byte == serial_protocol.SYNC and not line:
+                    expecting_reply = True
+                elif byte == 0x0A:  # newline
+                    self._handle_line(line.decode('utf-8', errors='ignore').strip())
+                    line.clear()
+                else:
+                    line.append(byte)
+    
+    def start_supervisor(self):
+        """Start the thread that keeps the connection up"""
+        if self.is_supervised():
+            return
+        self._supervisor_stop.clear()
+        self._supervisor_thread = threading.Thread(target=self._supervise_loop, name="serial-supervisor", daemon=True)
+        self._supervisor_thread.start()
+    
+    def stop_supervisor(self):
+        self._supervisor_stop.set()
+        self._wake.set()
+        if self._supervisor_thread is not None and self._supervisor_thread is not threading.current_thread():
+            self._supervisor_thread.join(timeout=2)
+        self._supervisor_thread = None
+    
+    def is_supervised(self) -> bool:
+        return self._supervisor_thread is not None and not self._supervisor_stop.is_set()
+    
+    def request_reconnect(self):
+        """Retry now instead of waiting out the backoff (e.g. the port was just plugged in)"""
+        self.reconnect_attempts = 0
+        self._wake.set()
+    
+    def _backoff_delay(self, attempt: int) -> float:
+        """Delay before retry number attempt (0-based)
+
+        Jittered so boards sharing a hub do not retry in lockstep.
+        """
+        delay = min(self.max_retry_delay, RECONNECT_INITIAL_DELAY * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
+    
+    def _supervise_loop(self):
+        """Reconnects while the board is down and heartbeats while it is quiet"""
+        misses = 0
+        while not self._supervisor_stop.is_set():
+            self._wake.clear()
+            if not self.is_connected():
+                # The first connection (board not plugged in yet) is not a reconnect
+                reconnecting = self._has_connected
+                if reconnecting:
+                    SERIAL_RECONNECTS.inc()
+                if self.connect():
+                    self.reconnect_attempts = 0
+                    misses = 0
+                    continue
+                if reconnecting:
+                    SERIAL_RECONNECT_FAILURES.inc()
+                delay = self._backoff_delay(self.reconnect_attempts)
+                self.reconnect_attempts += 1
+                logger.warning(f"Reconnect to {self.configured_port or 'ESP32'} failed (attempt {self.reconnect_attempts}), retrying in {delay:.2f}s")
+                self._wake.wait(delay)
+                continue
+            
+            now = time.monotonic()
+            quiet = now - max(self._last_rx, self._ready_at)
+            if now >= self._ready_at and quiet >= self.heartbeat_interval:
+                self._test_echo.clear()
+                self._submit("TEST")
+                if self._test_echo.wait(self.heartbeat_timeout) or self._last_rx > now:
+                    misses = 0
+                else:
+                    misses += 1
+                    SERIAL_HEARTBEAT_MISSES.inc()
+                    logger.warning(f"ESP32 at {self.port} missed heartbeat {misses}/{HEARTBEAT_MISSES}")
+                    if misses >= HEARTBEAT_MISSES:
+                        misses = 0
+                        self.disconnect()
+                continue
+            self._wake.wait(self.heartbeat_interval - quiet)
+    
+    def _handle_reply(self, status: int):
+        """Handle a binary ACK/NAK from the ESP32"""
+        if status == serial_protocol.ACK_FLAG | serial_protocol.OP_SET_RGB:
+            if self._pending_echoes:
+                _, sent_at = self._pending_echoes.popleft()
+                self.last_echo_rtt = time.monotonic() - sent_at
+                SERIAL_ECHO_RTT_SECONDS.observe(self.last_echo_rtt)
+        elif status == serial_protocol.NAK:
+            if self._pending_echoes:
+                label, _ = self._pending_echoes.popleft()
+                logger.warning(f"ESP32 rejected binary frame for {label}")
+        else:
+            logger.debug(f"Unexpected binary reply from ESP32: 0x{status:02X}")
+    
+    def _handle_line(self, line: str):
+        """Interpret one line of ESP32 output (see firmware SerialHandler::processReceivedData)"""
+        if not line:
+            return
+        if line.startswith("Raw data: "):
+            echoed = line[len("Raw data: "):]
+            # Echoes arrive in send order; drop anything the board never echoed
+            while self._pending_echoes:
+                label, sent_at = self._pending_echoes.popleft()
+                if label == echoed:
+                    self.last_echo_rtt = time.monotonic() - sent_at
+                    SERIAL_ECHO_RTT_SECONDS.observe(self.last_echo_rtt)
+                    break
+        elif line == "Echo: TEST":
+            # Generic commands are echoed in both text and binary mode
+            self._test_echo.set()
+        elif line == serial_protocol.NEGOTIATE_REPLY:
+            # Earlier text commands were acknowledged by their echo; the ACKs that follow map to frames
+            self._pending_echoes.clear()
+            self.protocol = 'binary'
+            logger.info("ESP32 accepted binary serial framing")
+        elif line.startswith("Transition complete"):
+            self.last_transition_complete = line
+        logger.debug(f"ESP32: {line}")
     
     def get_port_info(self) -> Optional[Dict]:
         """Get information about current port"""
@@ -183,5 +525,7 @@ class SerialController:
         return {
             'port': self.port,
             'baud_rate': self.baud_rate,
-            'connected': self.is_connected()
+            'protocol': self.protocol,
+            'connected': self.is_connected(),
+            'reconnect_attempts': self.reconnect_attempts
         }
\ No newline at end of file
@@ -0,0 +1,60 @@
+"""
+Binary Serial Framing
+Compact frames for sending colors to the ESP32 (see firmware SerialHandler)
+
+Frame:  SYNC | OPCODE | R | G | B | CRC8      (6 bytes vs up to 16 for "RGB:r,g,b\\n")
+Reply:  SYNC | (ACK_FLAG | OPCODE)   on success
+        SYNC | NAK                   on a bad CRC or unknown opcode
+
+The CRC is CRC-8/SMBUS (polynomial 0x07, init 0x00) over OPCODE..B.
+Binary mode is negotiated per connection by sending the text line
+"PROTO:BIN"; firmware that supports it answers "PROTO:BIN OK", anything
+else means the text protocol stays in use.
+"""
+
+SYNC = 0xA5
+OP_SET_RGB = 0x01
+ACK_FLAG = 0x80
+NAK = 0x7F
+
+FRAME_LENGTH = 6
+
+NEGOTIATE_COMMAND = "PROTO:BIN"
+NEGOTIATE_REPLY = "PROTO:BIN OK"
+
+
+def _build_crc8_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+
+_CRC8_TABLE = _build_crc8_table()
+
+
+def crc8(data: bytes) -> int:
+    """CRC-8/SMBUS checksum"""
+    crc = 0
+    for byte in data:
+        crc = _CRC8_TABLE[crc ^ byte]
+    return crc
+
+
+def encode_rgb_frame(r: int, g: int, b: int) -> bytes:
+    """Encode a set-color frame"""
+    body = bytes((OP_SET_RGB, r, g, b))
+    return bytes((SYNC,)) + body + bytes((crc8(body),))
+
+
+def decode_frame(frame: bytes):
+    """Decode a frame into (opcode, payload), or None if it is malformed"""
+    if len(frame) != FRAME_LENGTH or frame[0] != SYNC:
+        return None
+    body = frame[1:-1]
+    if crc8(body) != frame[-1]:
+        return None
+    return body[0], body[1:]
@@ -0,0 +1,66 @@
+"""
+Serving
+Async mode selection for Flask-SocketIO, and a bridge that keeps blocking
+calls (SQLite commits, fsync) off the event loop
+"""
+
+import importlib
+import sys
+
+ASYNC_THREADING = 'threading'  # one OS thread per connection (werkzeug)
+ASYNC_EVENTLET = 'eventlet'  # green threads on one event loop
+ASYNC_MODES = (ASYNC_THREADING, ASYNC_EVENTLET)
+
+
+def is_green() -> bool:
+    """True once eventlet has monkey-patched threading"""
+    eventlet = sys.modules.get('eventlet')
+    if eventlet is None:
+        return False
+    from eventlet import patcher
+    return patcher.is_monkey_patched('thread')
+
+
+def prepare_async_mode(mode: str) -> str:
+    """Monkey-patch the standard library for mode and return the mode to hand to SocketIO
+
+    Call this before importing anything that creates sockets, threads or
+    locks. Under `gunicorn --worker-class eventlet` the worker has already
+    patched everything, so eventlet is used whatever mode is configured.
+    """
+    if mode not in ASYNC_MODES:
+        raise ValueError(f"Unknown async mode: {mode}")
+    if mode == ASYNC_EVENTLET:
+        import eventlet
+        eventlet.monkey_patch()
+    elif is_green():
+        return ASYNC_EVENTLET
+    return mode
+
+
+def offload(func, *args, **kwargs):
+    """Call func on a native thread when the event loop owns this one
+
+    Under eventlet the worker, serial and database "threads" are green
+    threads sharing one OS thread, so a slow C call (a SQLite commit, an
+    fsync) would stall every connection. Those run in eventlet's native
+    thread pool instead. func must not touch green locks or queues. In
+    threading mode this is a plain call.
+    """
+    if is_green():
+        from eventlet import tpool
+        return tpool.execute(func, *args, **kwargs)
+    return func(*args, **kwargs)
+
+
+def native_module(name: str):
+    """The standard library module name as it was before monkey-patching
+
+    For code that must run on a real OS thread under eventlet (e.g. a
+    writer blocking on file I/O), so it never stalls the event loop. In
+    threading mode this is the ordinary module.
+    """
+    if is_green():
+        from eventlet import patcher
+        return patcher.original(name)
+    return importlib.import_module(name)
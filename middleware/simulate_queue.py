@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Queue simulation
+
+Replays an arrival trace through a ColorQueue on a simulated clock and
+reports the wait-time distribution, slot utilization and dispatch
+lateness, so scheduling changes can be compared before going live.
+
+The trace is either synthetic (Poisson arrivals, with a few heavy users
+submitting a share of all requests) or a recorded export from
+GET /api/export / RequestDatabase.iter_export (CSV or NDJSON).
+
+By default time jumps from event to event, so hours of traffic replay in
+well under a second. With --speed the real worker thread runs against a
+clock that is that many times faster than wall time (e.g. 1000), which
+also exercises the worker's wake-ups and shows real dispatch lateness.
+
+Usage: python simulate_queue.py --duration 120 --rate 6 --heavy-users 3 --heavy-share 0.5
+       python simulate_queue.py --policy fair --coalesce --adaptive-slots
+       python simulate_queue.py --trace export.csv --speed 1000
+"""
+import argparse
+import csv
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+import color_queue
+from clock import ScaledClock, SimulatedClock
+from color_queue import ColorQueue
+
+SIMULATION_START = datetime(2025, 1, 1, 20, 0, 0)
+
+
+class NullSerialController:
+    """Accepts every color immediately"""
+
+    def send_color_async(self, r, g, b, devices=None):
+        future = Future()
+        future.set_result((True, "Simulated"))
+        return future
+
+
+def synthetic_trace(duration_minutes, rate_per_minute, users, heavy_users, heavy_share, seed=42):
+    """Poisson arrivals; heavy_users together submit heavy_share of all requests"""
+    rng = random.Random(seed)
+    arrivals = []
+    moment = SIMULATION_START
+    end = SIMULATION_START + timedelta(minutes=duration_minutes)
+    while True:
+        moment += timedelta(seconds=rng.expovariate(rate_per_minute / 60.0))
+        if moment >= end:
+            break
+        if heavy_users and rng.random() < heavy_share:
+            username = f"heavy{rng.randrange(heavy_users)}"
+        else:
+            username = f"viewer{rng.randrange(users)}"
+        arrivals.append((moment, username, rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    return arrivals
+
+
+def load_trace(path):
+    """Read (timestamp, username, r, g, b) rows from a CSV or NDJSON request export"""
+    with open(path, newline='') as f:
+        if path.endswith('.ndjson') or path.endswith('.jsonl'):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    arrivals = [(datetime.fromisoformat(row['timestamp']), row['username'],
+                 int(row['r']), int(row['g']), int(row['b'])) for row in rows]
+    arrivals.sort(key=lambda arrival: arrival[0])
+    return arrivals
+
+
+def run_discrete(queue, clock, arrivals):
+    """Jump the clock from event to event. Returns the dispatched requests in order"""
+    dispatched = []
+    index = 0
+    while index < len(arrivals) or queue.get_queue_depth():
+        due = queue.next_due_time()
+        if index < len(arrivals) and (due is None or arrivals[index][0] <= due):
+            moment, username, r, g, b = arrivals[index]
+            clock.advance_to(moment)
+            queue.add_request(username, r, g, b)
+            index += 1
+        else:
+            clock.advance_to(due)
+            color_request = queue.dispatch_due()
+            dispatched.append({
+                'username': color_request['username'],
+                'queued_at': color_request['queued_at'],
+                'dispatched_at': color_request['scheduled_time'],
+                'slot_seconds': color_request['slot_seconds']
+            })
+    return dispatched
+
+
+def run_scaled(queue, clock, arrivals):
+    """Replay arrivals in accelerated real time with the worker thread dispatching"""
+    dispatched = []
+    queued_at = {}
+    seen = set()
+    lock = threading.Lock()
+
+    def on_change():
+        current = queue.get_current_request()
+        with lock:
+            if current is None or current['request_id'] in seen:
+                return
+            seen.add(current['request_id'])
+        dispatched.append({
+            'username': current['username'],
+            'queued_at': queued_at.get(current['request_id']),
+            'dispatched_at': datetime.fromisoformat(current['dispatched_at']),
+            'slot_seconds': current['slot_seconds']
+        })
+
+    queue.add_listener(on_change)
+    queue.start_worker()
+    for moment, username, r, g, b in arrivals:
+        delay = (moment - clock.now()).total_seconds() / clock.speed
+        if delay > 0:
+            time.sleep(delay)
+        color_request = queue.add_request(username, r, g, b)
+        with lock:
+            queued_at.setdefault(color_request['request_id'], color_request['queued_at'])
+    while queue.get_queue_depth():
+        time.sleep(0.01)
+    time.sleep(0.05)
+    queue.stop_worker()
+    return [record for record in dispatched if record['queued_at'] is not None]
+
+
+def summarize(arrivals, dispatched, queue):
+    waits = sorted((record['dispatched_at'] - record['queued_at']).total_seconds() for record in dispatched)
+
+    def percentile(values, p):
+        return round(values[min(len(values) - 1, int(p * len(values)))], 1) if values else None
+
+    # A slot is busy from its dispatch until it ends or the next color replaces it
+    busy = 0.0
+    for current, following in zip(dispatched, dispatched[1:] + [None]):
+        end = current['dispatched_at'] + timedelta(seconds=current['slot_seconds'])
+        if following is not None:
+            end = min(end, following['dispatched_at'])
+        busy += (end - current['dispatched_at']).total_seconds()
+    span = 0.0
+    if dispatched:
+        last = dispatched[-1]
+        span = (last['dispatched_at'] + timedelta(seconds=last['slot_seconds']) - arrivals[0][0]).total_seconds()
+
+    submissions = {}
+    for _, username, _, _, _ in arrivals:
+        submissions[username] = submissions.get(username, 0) + 1
+    light_waits = sorted((record['dispatched_at'] - record['queued_at']).total_seconds()
+                         for record in dispatched if submissions[record['username']] <= 2)
+
+    return {
+        'arrivals': len(arrivals),
+        'dispatched': len(dispatched),
+        'coalesced': len(arrivals) - len(dispatched),
+        'users': len(submissions),
+        'users_served_per_hour': round(len({record['username'] for record in dispatched}) / (span / 3600), 1) if span else None,
+        'wait_seconds': {
+            'p50': percentile(waits, 0.50), 'p90': percentile(waits, 0.90),
+            'p99': percentile(waits, 0.99), 'max': round(waits[-1], 1) if waits else None
+        },
+        'light_user_wait_seconds': {'p50': percentile(light_waits, 0.50), 'p90': percentile(light_waits, 0.90)},
+        'slot_utilization': round(busy / span, 3) if span else None,
+        'dispatch_lateness_ms': queue.get_dispatch_jitter()
+    }
+
+
+def simulate(arrivals, policy='fifo', coalesce=False, adaptive_slots=False,
+             min_slot=color_queue.MIN_SLOT_SECONDS, target_depth=color_queue.ADAPTIVE_TARGET_DEPTH, speed=None):
+    """Run one simulation and return its summary"""
+    if speed:
+        clock = ScaledClock(speed, start=arrivals[0][0] - timedelta(seconds=1))
+    else:
+        clock = SimulatedClock(start=arrivals[0][0] - timedelta(seconds=1))
+    queue = ColorQueue(NullSerialController(), policy=policy, coalesce=coalesce, adaptive_slots=adaptive_slots,
+                       min_slot=min_slot, target_depth=target_depth, clock=clock)
+    dispatched = run_scaled(queue, clock, arrivals) if speed else run_discrete(queue, clock, arrivals)
+    return summarize(arrivals, dispatched, queue)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trace', help='CSV or NDJSON request export to replay instead of a synthetic trace')
+    parser.add_argument('--duration', type=float, default=120, help='synthetic trace length in minutes')
+    parser.add_argument('--rate', type=float, default=4, help='synthetic arrivals per minute')
+    parser.add_argument('--users', type=int, default=300, help='distinct light users')
+    parser.add_argument('--heavy-users', type=int, default=3)
+    parser.add_argument('--heavy-share', type=float, default=0.4, help='share of arrivals from heavy users')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--policy', choices=color_queue.POLICIES, default=color_queue.POLICY_FIFO)
+    parser.add_argument('--coalesce', action='store_true')
+    parser.add_argument('--adaptive-slots', action='store_true')
+    parser.add_argument('--min-slot', type=float, default=color_queue.MIN_SLOT_SECONDS)
+    parser.add_argument('--target-depth', type=int, default=color_queue.ADAPTIVE_TARGET_DEPTH)
+    parser.add_argument('--speed', type=float, help='run the real worker at this many times real time')
+    args = parser.parse_args()
+
+    # Per-request queue logging would swamp the summary
+    logging.basicConfig(level=logging.ERROR)
+
+    if args.trace:
+        arrivals = load_trace(args.trace)
+    else:
+        arrivals = synthetic_trace(args.duration, args.rate, args.users, args.heavy_users, args.heavy_share, args.seed)
+    if not arrivals:
+        raise SystemExit("Trace is empty")
+
+    started = time.perf_counter()
+    summary = simulate(arrivals, policy=args.policy, coalesce=args.coalesce, adaptive_slots=args.adaptive_slots,
+                       min_slot=args.min_slot, target_depth=args.target_depth, speed=args.speed)
+    summary['runtime_seconds'] = round(time.perf_counter() - started, 3)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
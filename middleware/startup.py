@@ -0,0 +1,115 @@
+"""
+Startup
+Timed startup steps, background bring-up of slow resources, and the /ready endpoint
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+TASK_RUNNING = 'running'
+TASK_DONE = 'done'
+TASK_FAILED = 'failed'
+
+
+def _format_timings(timings: Dict[str, float]) -> str:
+    return ', '.join(f"{name} {seconds:.2f}s" for name, seconds in timings.items())
+
+
+class StartupTasks:
+    """Startup steps and their timings
+
+    The steps the server needs before it can take requests run in order and
+    are marked as they finish (mark). Slow resources (the database, the
+    ESP32 boards, the profanity matcher) are brought up on background
+    threads (run_in_background) while the server is already accepting
+    requests. The app is ready once every background task has finished.
+    """
+
+    def __init__(self):
+        self._started = time.monotonic()
+        self._last_mark = self._started
+        self.steps = {}  # name -> seconds, in order
+        self.tasks = {}  # name -> {'state', 'seconds', 'error'}
+        self.accepting_after = None
+        self.ready_after = None
+        self._changed = threading.Condition()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self._started
+
+    def mark(self, name: str):
+        """Record a step that just finished, timed from the previous mark"""
+        now = time.monotonic()
+        self.steps[name] = now - self._last_mark
+        self._last_mark = now
+
+    def run_in_background(self, name: str, func: Callable, *args):
+        """Run func(*args) on its own thread as a startup task"""
+        with self._changed:
+            self.tasks[name] = {'state': TASK_RUNNING, 'seconds': None, 'error': None}
+            self.ready_after = None
+        threading.Thread(target=self._run, args=(name, func, args), name=f"startup-{name}", daemon=True).start()
+
+    def _run(self, name: str, func: Callable, args: tuple):
+        started = time.monotonic()
+        state, error = TASK_DONE, None
+        try:
+            func(*args)
+        except Exception as e:
+            logger.error(f"Startup task {name} failed: {e}")
+            state, error = TASK_FAILED, str(e)
+
+        with self._changed:
+            self.tasks[name] = {'state': state, 'seconds': time.monotonic() - started, 'error': error}
+            finished = all(task['state'] != TASK_RUNNING for task in self.tasks.values())
+            if finished:
+                self.ready_after = self.elapsed()
+            self._changed.notify_all()
+        if finished:
+            timings = {task_name: task['seconds'] for task_name, task in self.tasks.items()}
+            logger.info(f"Startup tasks finished after {self.ready_after:.2f}s ({_format_timings(timings)})")
+
+    def accepting(self):
+        """Note that the server is about to accept requests and log the breakdown so far"""
+        self.accepting_after = self.elapsed()
+        logger.info(f"Accepting requests {self.accepting_after:.2f}s after startup ({_format_timings(self.steps)})")
+
+    def is_ready(self) -> bool:
+        """True once every background task has finished without failing"""
+        with self._changed:
+            return all(task['state'] == TASK_DONE for task in self.tasks.values())
+
+    def wait(self, timeout=None) -> bool:
+        """Wait for the background tasks to finish. Returns is_ready()"""
+        with self._changed:
+            self._changed.wait_for(lambda: all(task['state'] != TASK_RUNNING for task in self.tasks.values()),
+                                   timeout)
+        return self.is_ready()
+
+    def get_status(self) -> dict:
+        with self._changed:
+            tasks = {name: dict(task) for name, task in self.tasks.items()}
+        return {
+            'ready': all(task['state'] == TASK_DONE for task in tasks.values()),
+            'uptime_seconds': round(self.elapsed(), 3),
+            'accepting_after_seconds': None if self.accepting_after is None else round(self.accepting_after, 3),
+            'ready_after_seconds': None if self.ready_after is None else round(self.ready_after, 3),
+            'steps': {name: round(seconds, 3) for name, seconds in self.steps.items()},
+            'tasks': {name: dict(task, seconds=None if task['seconds'] is None else round(task['seconds'], 3))
+                      for name, task in tasks.items()}
+        }
+
+
+def setup_ready_routes(app, startup: StartupTasks, serial_controller):
+    """Set up /ready: 200 once startup has finished, 503 while it is still running or a task failed"""
+    from flask import jsonify
+
+    @app.route('/ready', methods=['GET'])
+    def ready():
+        status = startup.get_status()
+        status['serial_connected'] = serial_controller.is_connected()
+        return jsonify(status), 200 if status['ready'] else 503
@@ -0,0 +1,56 @@
+"""
+Request Statistics
+Routes serving pre-aggregated request statistics from the database rollups
+"""
+
+import logging
+from flask import jsonify, request
+from database import get_request_database
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds for the limit/minutes query parameters
+MAX_LIMIT = 100
+MAX_RATE_MINUTES = 24 * 60
+
+def _bounded_arg(name, default, maximum):
+    value = request.args.get(name, default, type=int)
+    return max(1, min(value, maximum))
+
+def setup_stats_routes(app, get_database=get_request_database):
+    """Set up the /api/stats endpoints on the existing Flask app"""
+
+    @app.route('/api/stats/summary', methods=['GET'])
+    def stats_summary():
+        """Total requests plus the top user and color"""
+        db = get_database()
+        top_users = db.get_top_users(1)
+        top_colors = db.get_top_colors(1)
+        return jsonify({
+            'total_requests': db.get_total_requests(),
+            'top_user': top_users[0] if top_users else None,
+            'top_color': top_colors[0] if top_colors else None
+        })
+
+    @app.route('/api/stats/top-users', methods=['GET'])
+    def stats_top_users():
+        """Users with the most requests (?limit=10)"""
+        limit = _bounded_arg('limit', 10, MAX_LIMIT)
+        return jsonify({'users': get_database().get_top_users(limit)})
+
+    @app.route('/api/stats/colors', methods=['GET'])
+    def stats_top_colors():
+        """Most popular colors, quantized to 4 bits per channel (?limit=10)"""
+        limit = _bounded_arg('limit', 10, MAX_LIMIT)
+        return jsonify({'colors': get_database().get_top_colors(limit)})
+
+    @app.route('/api/stats/rate', methods=['GET'])
+    def stats_request_rate():
+        """Requests per minute over the last N minutes (?minutes=60)"""
+        minutes = _bounded_arg('minutes', 60, MAX_RATE_MINUTES)
+        return jsonify({'minutes': minutes, 'rate': get_database().get_request_rate(minutes)})
+
+    @app.route('/api/stats/hues', methods=['GET'])
+    def stats_hue_histogram():
+        """Hue histogram in 10 degree buckets; hue -1 counts greys"""
+        return jsonify({'hues': get_database().get_hue_histogram()})
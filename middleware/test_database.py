@@ -4,8 +4,14 @@ Test script to demonstrate the SQLite request logging system
 """
 import sys
 import os
-sys.path.append('/Users/nathan/Documents/GitHub/rgboo/middleware')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import database
 from database import RequestDatabase
 from datetime import datetime
 
@@ -32,6 +38,22 @@ def test_request_logging():
         hex_color = f"#{r:02x}{g:02x}{b:02x}"
         print(f"  ✓ {username}: {hex_color} (DB ID: {db_id})")
     
+    # Write-behind logging: rows are buffered and written in one batch
+    print(f"\n⏱️  Testing write-behind logging...")
+    buffered_db = RequestDatabase('demo_requests.db', write_behind=True, batch_size=50, flush_interval=0.2)
+    for i in range(120):
+        assert buffered_db.log_request(f"burst_user{i}", i, 255 - i, 128) is None
+    buffered_db.close()
+    stats = buffered_db.get_flush_stats()
+    print(f"  ✓ {stats['rows_written']} rows in {stats['batches']} batches (last flush {stats['last_flush_ms']} ms)")
+    assert stats['rows_written'] == 120
+    assert stats['rows_buffered'] == 0
+
+    # Rollups are kept in step with the logged rows
+    top_users = db.get_top_users(1)
+    print(f"\n📊 Top user: {top_users[0]['username']} ({top_users[0]['count']} requests)")
+    assert db.get_total_requests() >= len(test_requests) + 120
+
     # Export to CSV
     print(f"\n💾 Exporting to CSV...")
     if db.export_to_csv('demo_export.csv'):
@@ -43,5 +65,133 @@ def test_request_logging():
     print(f"  ✅ Thread-safe operations")
     print(f"  ✅ SQLite storage with validation")
 
+def test_failed_flush_is_retried():
+    print("\n🔁 Testing write-behind retry after a failed flush")
+    print("=" * 50)
+
+    db = RequestDatabase('demo_requests.db', write_behind=True, batch_size=1000, flush_interval=0.05)
+    write_rows = db._write_rows
+    failures = []
+
+    def locked_once(conn, rows):
+        if not failures:
+            failures.append(len(rows))
+            raise sqlite3.OperationalError("database is locked")
+        write_rows(conn, rows)
+
+    db._write_rows = locked_once
+    try:
+        before = db.get_total_requests()
+        for i in range(10):
+            db.log_request(f"retry_user{i}", i, i, i)
+        deadline = time.monotonic() + 5
+        while db.get_flush_stats()['rows_written'] < 10 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        stats = db.get_flush_stats()
+        print(f"  ✓ First flush failed ({failures[0]} rows), retry wrote {stats['rows_written']}")
+        assert failures and stats['rows_failed'] == failures[0]
+        assert stats['rows_written'] == 10 and stats['rows_buffered'] == 0 and stats['rows_dropped'] == 0
+        assert db.get_total_requests() == before + 10
+    finally:
+        db.close()
+
+def test_full_buffer_drops_oldest():
+    print("\n🪣 Testing a full write-behind buffer")
+    print("=" * 50)
+
+    workdir = tempfile.mkdtemp(prefix='db-')
+    original = database.WRITE_BEHIND_MAX_BUFFER
+    database.WRITE_BEHIND_MAX_BUFFER = 5
+    try:
+        db = RequestDatabase(os.path.join(workdir, 'requests.db'), write_behind=True,
+                             batch_size=1000, flush_interval=3600)
+        for i in range(8):
+            db.log_request(f"old{i}", i, i, i)
+        assert db.get_flush_stats()['rows_dropped'] == 3
+
+        # Rows logged while a flush fails are kept; the failed batch loses its oldest rows to make room
+        write_rows = db._write_rows
+        def fail_with_arrivals(conn, rows):
+            for i in range(3):
+                db.log_request(f"new{i}", i, i, i)
+            raise sqlite3.OperationalError("database is locked")
+        db._write_rows = fail_with_arrivals
+        assert db.flush() == 0
+        db._write_rows = write_rows
+        assert db.flush() == 5
+
+        with db.get_connection() as conn:
+            names = [row[0] for row in conn.execute('SELECT username FROM color_requests ORDER BY id')]
+        stats = db.get_flush_stats()
+        print(f"  ✓ Written in order: {names}, {stats['rows_dropped']} dropped")
+        assert names == ['old6', 'old7', 'new0', 'new1', 'new2']
+        assert stats['rows_dropped'] == 6
+        db.close()
+    finally:
+        database.WRITE_BEHIND_MAX_BUFFER = original
+        shutil.rmtree(workdir)
+
+def test_pooled_wal_connections():
+    print("\n🔌 Testing pooled WAL connections")
+    print("=" * 50)
+
+    workdir = tempfile.mkdtemp(prefix='db-')
+    path = os.path.join(workdir, 'requests.db')
+    db = RequestDatabase(path)
+    writer = RequestDatabase(path, write_behind=True, batch_size=100000, flush_interval=3600)
+    try:
+        with db.get_connection() as conn:
+            assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+            pooled = conn
+
+        # Queries borrow the same connection instead of opening new ones
+        opened = []
+        open_connection = db._open_connection
+        db._open_connection = lambda: opened.append(1) or open_connection()
+        for _ in range(50):
+            db.get_total_requests()
+        with db.get_connection() as conn:
+            assert conn is pooled
+        assert opened == []
+        print("  ✓ 51 queries on one reused WAL connection")
+
+        # Readers keep going while a large batch is committed, and never see half of it
+        rows = 20000
+        for i in range(rows):
+            writer.log_request(f"wal_user{i % 100}", i % 256, 0, 0)
+        counts, errors = [], []
+        stop = threading.Event()
+
+        def read():
+            while not stop.is_set():
+                try:
+                    with db.get_connection() as conn:
+                        counts.append(conn.execute('SELECT COUNT(*) FROM color_requests').fetchone()[0])
+                except sqlite3.OperationalError as e:
+                    errors.append(e)
+
+        readers = [threading.Thread(target=read) for _ in range(3)]
+        for reader in readers:
+            reader.start()
+        started = time.perf_counter()
+        written = writer.flush()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        for reader in readers:
+            reader.join()
+
+        during = sum(1 for count in counts if count == 0)
+        print(f"  ✓ {written} rows flushed in {elapsed * 1000:.0f} ms with {len(counts)} reads ({during} before the commit)")
+        assert written == rows and not errors, errors
+        assert during > 0 and set(counts) <= {0, rows}
+        assert len(opened) < len(readers)  # the pooled connection plus one per extra reader
+    finally:
+        writer.close()
+        db.close()
+        shutil.rmtree(workdir)
+
 if __name__ == "__main__":
-    test_request_logging()
\ No newline at end of file
+    test_request_logging()
+    test_failed_flush_is_retried()
+    test_full_buffer_drops_oldest()
+    test_pooled_wal_connections()
\ No newline at end of file
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Test script for driving several virtual ESP32 boards through a DevicePool
+"""
+import time
+
+from clock import ScaledClock
+from color_queue import ColorQueue
+from device_pool import DevicePool, parse_devices
+from esp32_emulator import ESP32Emulator
+from serial_controller import SerialController
+from test_helpers import wait_for
+
+BOARDS = ('porch', 'window', 'stage')
+
+def test_parse_devices():
+    assert parse_devices("porch=/dev/ttyUSB0, stage=/dev/ttyUSB1") == {'porch': '/dev/ttyUSB0', 'stage': '/dev/ttyUSB1'}
+    assert parse_devices("/dev/ttyACM0") == {'ttyACM0': '/dev/ttyACM0'}
+    assert parse_devices("") == {}
+
+def start_pool():
+    emulators = {name: ESP32Emulator(transition_seconds=0.01) for name in BOARDS}
+    for emulator in emulators.values():
+        emulator.start()
+    pool = DevicePool({name: emulator.port for name, emulator in emulators.items()}, settle_seconds=0)
+    assert pool.connect()
+    assert wait_for(lambda: all(controller.protocol == 'binary' for controller in pool.controllers().values()))
+    return pool, emulators
+
+def stop_pool(pool, emulators):
+    pool.disconnect()
+    for emulator in emulators.values():
+        emulator.stop()
+
+def test_fan_out_and_subsets():
+    print("🧪 Testing fan-out to three boards")
+    print("=" * 50)
+
+    pool, emulators = start_pool()
+    try:
+        assert pool.get_device_names() == list(BOARDS)
+        assert all(device['connected'] for device in pool.get_devices())
+
+        success, message = pool.send_color(10, 20, 30)
+        assert success, message
+        assert wait_for(lambda: all(emulator.color == (10, 20, 30) for emulator in emulators.values()))
+        print(f"  All boards: {message}")
+
+        assert pool.send_color(40, 50, 60, devices=['porch'])[0]
+        assert wait_for(lambda: emulators['porch'].color == (40, 50, 60))
+        time.sleep(0.05)
+        assert emulators['window'].color == emulators['stage'].color == (10, 20, 30)
+
+        success, message = pool.send_color(1, 2, 3, devices=['basement'])
+        assert not success and message == "No ESP32 devices available"
+    finally:
+        stop_pool(pool, emulators)
+    print("✅ Colors reach every board, or only the chosen ones")
+
+def test_hung_board():
+    print("\n🧪 Testing a hung board")
+    print("=" * 50)
+
+    pool, emulators = start_pool()
+    try:
+        # Every write to the stage board now takes half a second
+        stage = pool.controllers()['stage'].serial_connection
+        write = stage.write
+        stage.write = lambda payload: (time.sleep(0.5), write(payload))[1]
+
+        started = time.monotonic()
+        futures = [pool.send_color_async(0, 0, index) for index in range(1, 5)]
+        assert wait_for(lambda: all(emulator.color == (0, 0, 4) for name, emulator in emulators.items() if name != 'stage'))
+        healthy = time.monotonic() - started
+        print(f"  Healthy boards showed all 4 colors after {healthy * 1000:.0f} ms")
+        assert healthy < 0.5
+        assert emulators['stage'].color != (0, 0, 4)
+        assert not futures[-1].done()
+
+        # The stage board catches up on its own writer thread
+        assert all(future.result(timeout=5)[0] for future in futures)
+        assert wait_for(lambda: emulators['stage'].color == (0, 0, 4))
+    finally:
+        stop_pool(pool, emulators)
+    print("✅ A hung board only delays itself")
+
+def test_single_board_queue():
+    print("\n🧪 Testing device-targeted requests on a single board")
+    print("=" * 50)
+
+    emulator = ESP32Emulator(transition_seconds=0.01)
+    emulator.start()
+    controller = SerialController(port=emulator.port, settle_seconds=0)
+    assert controller.connect()
+    queue = ColorQueue(controller, clock=ScaledClock(100))
+    queue.start_worker()
+    try:
+        # e.g. restored from a journal written by a multi-board setup
+        request_id = queue.add_request('viewer', 7, 8, 9, devices=['porch'])['request_id']
+        assert wait_for(lambda: emulator.color == (7, 8, 9))
+        assert queue.get_request_status(request_id)['state'] in ('displaying', 'done')
+    finally:
+        queue.stop_worker()
+        controller.disconnect()
+        emulator.stop()
+    print("✅ A single board shows requests whatever boards they name")
+
+if __name__ == "__main__":
+    test_parse_devices()
+    test_fan_out_and_subsets()
+    test_hung_board()
+    test_single_board_queue()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test script driving SerialController against the virtual ESP32
+"""
+import time
+
+from esp32_emulator import ESP32Emulator, parse_rgb_command
+from serial_controller import SerialController
+from test_helpers import wait_for
+
+def test_parse_rgb_command():
+    assert parse_rgb_command("RGB:255,0,16") == (255, 0, 16, 255)
+    assert parse_rgb_command("RGB:1,2,3,100") == (1, 2, 3, 100)
+    assert parse_rgb_command("RGB:1,2") is None
+    assert parse_rgb_command("RGB:256,0,0") is None
+    assert parse_rgb_command("RGB:x,2,3") == (0, 2, 3, 255)  # String::toInt returns 0
+
+def test_text_and_binary_protocols():
+    print("🧪 Testing SerialController against the ESP32 emulator")
+    print("=" * 50)
+
+    emulator = ESP32Emulator(transition_seconds=0.05)
+    emulator.start()
+    try:
+        text = SerialController(port=emulator.port, settle_seconds=0, binary_protocol=False)
+        assert text.connect()
+        assert text.send_color(10, 20, 30)[0]
+        assert wait_for(lambda: text.last_transition_complete == "Transition complete: R=10, G=20, B=30")
+        assert text.last_echo_rtt is not None
+        print(f"  Text echo round trip: {text.last_echo_rtt * 1000:.1f} ms")
+        text.disconnect()
+
+        binary = SerialController(port=emulator.port, settle_seconds=0)
+        assert binary.connect()
+        assert wait_for(lambda: binary.protocol == 'binary')
+        assert binary.send_color(40, 50, 60)[0]
+        assert wait_for(lambda: emulator.color == (40, 50, 60))
+        assert emulator.stats['frames_acked'] == 1
+        print(f"  Binary ACK round trip: {binary.last_echo_rtt * 1000:.1f} ms")
+
+        # Unplug: the reader notices, and the next command reconnects to the same port
+        emulator.disconnect()
+        assert wait_for(lambda: not binary.is_connected())
+        assert binary.send_color(70, 80, 90)[0]
+        assert wait_for(lambda: emulator.color == (70, 80, 90))
+        assert binary.is_connected()
+        binary.disconnect()
+    finally:
+        emulator.stop()
+    print("✅ Colors arrive over text and binary framing, and survive a disconnect")
+
+def test_dropped_bytes():
+    print("\n🧪 Testing a lossy link")
+    print("=" * 50)
+
+    emulator = ESP32Emulator(drop_rate=0.02, seed=7, transition_seconds=0.01, boot_banner=False)
+    emulator.start()
+    try:
+        controller = SerialController(port=emulator.port, settle_seconds=0, binary_protocol=False)
+        assert controller.connect()
+        for i in range(100):
+            controller.send_color_async(i, i, i)
+        assert controller.send_color(1, 1, 1)[0]
+        time.sleep(0.3)
+        print(f"  {emulator.stats}")
+        assert emulator.stats['bytes_dropped'] > 0
+        assert 0 < emulator.stats['colors'] < 102
+        controller.disconnect()
+    finally:
+        emulator.stop()
+    print("✅ Dropped bytes lose commands without stalling the writer")
+
+if __name__ == "__main__":
+    test_parse_rgb_command()
+    test_text_and_binary_protocols()
+    test_dropped_bytes()
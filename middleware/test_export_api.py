@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test the streaming /api/export endpoint through the Flask test client
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from flask import Flask
+
+from color_queue import ColorQueue
+from database import EXPORT_CHUNK_SIZE, RequestDatabase
+from routes import register_routes
+from simulate_queue import NullSerialController
+
+ROWS = EXPORT_CHUNK_SIZE * 2 + 500  # spans three pages
+
+def make_client(db):
+    app = Flask(__name__)
+    controller = NullSerialController()
+    register_routes(app, controller, ColorQueue(controller), get_database=lambda: db)
+    return app.test_client()
+
+def test_export_api():
+    print("📤 Testing /api/export")
+    print("=" * 50)
+
+    workdir = tempfile.mkdtemp(prefix='export-')
+    db = RequestDatabase(os.path.join(workdir, 'requests.db'), write_behind=True, batch_size=ROWS + 1)
+    try:
+        for i in range(ROWS):
+            db.log_request(f"export_user{i % 50}", i % 256, (i * 7) % 256, (i * 13) % 256)
+        assert db.flush() == ROWS
+        client = make_client(db)
+
+        # CSV: every row once, in id order, across page boundaries
+        response = client.get('/api/export')
+        assert response.status_code == 200 and response.mimetype == 'text/csv'
+        assert 'requests_export.csv' in response.headers['Content-Disposition']
+        plain = response.get_data()
+        rows = list(csv.reader(io.StringIO(plain.decode('utf-8'))))
+        assert rows[0] == ['id', 'timestamp', 'username', 'r', 'g', 'b']
+        ids = [int(row[0]) for row in rows[1:]]
+        assert len(ids) == ROWS and ids == sorted(set(ids))
+        assert rows[1][2:] == ['export_user0', '0', '0', '0']
+        print(f"  ✓ CSV: {len(ids)} rows over {EXPORT_CHUNK_SIZE}-row pages, ordered, no duplicates")
+
+        # NDJSON with since_id resumes after the last id already received
+        since_id = ids[EXPORT_CHUNK_SIZE + 100]
+        response = client.get(f'/api/export?format=ndjson&since_id={since_id}')
+        assert response.mimetype == 'application/x-ndjson'
+        records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert [record['id'] for record in records] == ids[EXPORT_CHUNK_SIZE + 101:]
+        assert set(records[0]) == {'id', 'timestamp', 'username', 'r', 'g', 'b'}
+        print(f"  ✓ NDJSON since_id={since_id}: {len(records)} newer rows")
+
+        # gzip decodes to the same bytes as the plain export
+        response = client.get('/api/export?gzip=1')
+        assert response.mimetype == 'application/gzip'
+        assert response.headers['Content-Disposition'].endswith('requests_export.csv.gz')
+        compressed = response.get_data()
+        assert gzip.decompress(compressed) == plain
+        print(f"  ✓ gzip: {len(plain)} bytes compressed to {len(compressed)}")
+
+        assert client.get('/api/export?format=xml').status_code == 400
+
+        # Only this machine may export
+        response = client.get('/api/export', environ_base={'REMOTE_ADDR': '203.0.113.7'})
+        assert response.status_code == 403
+        print("  ✓ Remote clients get 403")
+    finally:
+        db.close()
+        shutil.rmtree(workdir)
+    print("✅ Exports stream every row once, plain or gzipped, to local clients only")
+
+if __name__ == "__main__":
+    test_export_api()
@@ -0,0 +1,13 @@
+"""
+Helpers shared by the test scripts
+"""
+import time
+
+def wait_for(condition, timeout=2.0):
+    """Poll condition() until it is true or timeout seconds pass. Returns whether it became true"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Test script for the queue-based logging pipeline
+"""
+import json
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import time
+
+from log_pipeline import LOG_RECORDS_DROPPED, LogWriter, NonBlockingQueueHandler, parse_levels, setup_logging
+
+class SlowHandler(logging.Handler):
+    """Stands in for a log file on a slow SD card"""
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+        self.messages = []
+
+    def emit(self, record):
+        time.sleep(self.delay)
+        self.messages.append(record.getMessage())
+
+def test_levels():
+    root, levels = parse_levels('WARNING, color_queue=debug ,engineio=INFO')
+    assert root == 'WARNING'
+    assert levels == {'socketio': 'WARNING', 'engineio': 'INFO', 'color_queue': 'DEBUG'}
+    assert parse_levels('')[0] == 'INFO'
+    try:
+        parse_levels('INFO,routes=LOUD')
+        assert False, "accepted an unknown level"
+    except ValueError:
+        pass
+
+def test_callers_do_not_wait():
+    print("🧪 Testing that logging calls never wait on the writer")
+    print("=" * 50)
+
+    handler = SlowHandler(0.01)
+    log_queue = queue.Queue(50)
+    writer = LogWriter(log_queue, handler)
+    logger = logging.getLogger('test_log_pipeline.slow')
+    logger.propagate = False
+    logger.addHandler(NonBlockingQueueHandler(log_queue))
+    writer.start()
+    try:
+        dropped = LOG_RECORDS_DROPPED.value
+        started = time.perf_counter()
+        for n in range(200):
+            logger.warning("Record %d", n)
+        elapsed = time.perf_counter() - started
+    finally:
+        writer.stop()
+        logger.handlers.clear()
+
+    print(f"  200 calls took {elapsed * 1000:.1f} ms against a 10 ms/record writer")
+    assert elapsed < 0.5
+    # Whatever did not fit in the queue was counted, and everything else was written in order
+    assert len(handler.messages) + (LOG_RECORDS_DROPPED.value - dropped) == 200
+    assert handler.messages[0] == "Record 0"
+    print(f"  {len(handler.messages)} written, {LOG_RECORDS_DROPPED.value - dropped} dropped")
+    print("✅ Log I/O stays on the writer thread")
+
+def test_json_file_and_rotation():
+    print("\n🧪 Testing JSON output, levels and rotation")
+    print("=" * 50)
+
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    workdir = tempfile.mkdtemp(prefix='logs-')
+    log_file = os.path.join(workdir, 'middleware.log')
+    try:
+        writer = setup_logging('INFO,test_log_pipeline.noisy=ERROR', log_file, max_bytes=2000, backup_count=2,
+                               console=False)
+        logger = logging.getLogger('test_log_pipeline')
+        logger.info("Queued %s", 'alice', extra={'request_id': 'r-1'})
+        logger.debug("Hidden below INFO")
+        logging.getLogger('test_log_pipeline.noisy').warning("Hidden below ERROR")
+        assert logging.getLogger('engineio.server').getEffectiveLevel() == logging.WARNING
+        writer.stop()
+
+        with open(log_file) as f:
+            entries = [json.loads(line) for line in f]
+        assert len(entries) == 1
+        entry = entries[0]
+        assert entry['message'] == 'Queued alice' and entry['request_id'] == 'r-1'
+        assert entry['level'] == 'INFO' and entry['logger'] == 'test_log_pipeline'
+        print(f"  {json.dumps(entry)}")
+
+        # Setting up again replaces the pipeline and stops the old writer
+        replaced = setup_logging('INFO', log_file, console=False)
+        writer = setup_logging('INFO', log_file, max_bytes=2000, backup_count=2,
+                               console=False)
+        assert replaced._thread is None and len(root.handlers) == 1
+        for n in range(200):
+            logger.info("Filler line %d", n)
+        writer.stop()
+        files = sorted(os.listdir(workdir))
+        assert files == ['middleware.log', 'middleware.log.1', 'middleware.log.2'], files
+        assert all(os.path.getsize(os.path.join(workdir, name)) <= 2000 for name in files)
+        print(f"  Rotated into {files}")
+    finally:
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        for handler in saved_handlers:
+            root.addHandler(handler)
+        root.setLevel(saved_level)
+        for name in ('socketio', 'engineio', 'test_log_pipeline.noisy'):
+            logging.getLogger(name).setLevel(logging.NOTSET)
+        shutil.rmtree(workdir)
+    print("✅ The log file is JSON lines and stays within its size limit")
+
+if __name__ == "__main__":
+    test_levels()
+    test_callers_do_not_wait()
+    test_json_file_and_rotation()
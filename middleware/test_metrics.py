@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Test script for the metrics registry and the /metrics endpoint
+"""
+from flask import Flask
+
+from metrics import MetricsRegistry, registry, setup_metrics_routes
+
+def test_registry_rendering():
+    print("🧪 Testing Metrics Registry")
+    print("=" * 50)
+
+    metrics = MetricsRegistry()
+    requests = metrics.counter('demo_requests', 'Requests handled')
+    depth = metrics.gauge('demo_depth', 'Queue depth', lambda: 7)
+    latency = metrics.histogram('demo_latency_seconds', 'Latency', buckets=(0.1, 1.0))
+
+    requests.inc()
+    requests.inc(2)
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(3.0)
+    with latency.time():
+        pass
+
+    assert metrics.counter('demo_requests', 'Requests handled') is requests  # registering twice is harmless
+    text = metrics.render()
+    print(text)
+    assert "# TYPE demo_requests counter" in text
+    assert "demo_requests_total 3" in text
+    assert "demo_depth 7" in text
+    assert 'demo_latency_seconds_bucket{le="0.1"} 2' in text
+    assert 'demo_latency_seconds_bucket{le="1.0"} 3' in text
+    assert 'demo_latency_seconds_bucket{le="+Inf"} 4' in text
+    assert "demo_latency_seconds_count 4" in text
+    assert depth.value == 7
+    print("✅ Counters, gauges and histograms render in exposition format")
+
+def test_metrics_endpoint():
+    print("\n🧪 Testing /metrics Endpoint")
+    print("=" * 50)
+
+    import color_queue  # registers the queue metrics
+    app = Flask(__name__)
+    setup_metrics_routes(app)
+    client = app.test_client()
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+    assert b"rgb_queue_dispatch_lateness_seconds_bucket" in response.data
+
+    remote = client.get('/metrics', environ_base={'REMOTE_ADDR': '203.0.113.5'})
+    assert remote.status_code == 403
+    print(f"✅ /metrics serves {len(registry.render().splitlines())} lines locally and refuses remote clients")
+
+if __name__ == "__main__":
+    test_registry_rendering()
+    test_metrics_endpoint()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Test script comparing the compiled username moderator with better_profanity
+"""
+from better_profanity import profanity
+from better_profanity.utils import get_complete_path_of_file, read_wordlist
+from moderation import UsernameModerator
+
+def test_moderation():
+    print("🛡️  Testing Compiled Username Moderation")
+    print("=" * 45)
+
+    moderator = UsernameModerator()
+    profanity.load_censor_words()
+
+    words = list(read_wordlist(get_complete_path_of_file("profanity_wordlist.txt")))
+    usernames = ["alice", "bob123", "gaming_pro", "cooluser", "stream_fan", "scunthorpe",
+                 "f***ing_gamer", "sh*t_user", "", "a", "user_2025", "hand_job", "@ss"]
+    for word in words:
+        usernames += [word, word.upper(), f"x_{word}_y", f"{word}123", word.replace('a', '@')]
+
+    # Everything better_profanity flags must still be flagged
+    missed = [name for name in usernames
+              if profanity.contains_profanity(name) and not moderator.contains_profanity(name)]
+    print(f"\n📝 Checked {len(usernames)} usernames, {len(missed)} missed")
+    assert not missed, missed
+
+    for name in ["alice", "bob123", "gaming_pro", "stream_fan", "user_2025"]:
+        assert not moderator.contains_profanity(name), name
+
+    # Repeat checks come from the verdict cache
+    moderator.check_many(["alice", "ALICE", "gaming_pro"])
+    stats = moderator.get_stats()
+    print(f"  ✓ Cache: {stats['hits']} hits, {stats['misses']} misses")
+    assert stats['hits'] >= 3
+
+if __name__ == "__main__":
+    test_moderation()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Test script for the cached port inventory and hotplug handling
+"""
+import os
+import tempfile
+import time
+
+import serial.tools.list_ports
+from serial.tools.list_ports_common import ListPortInfo
+
+import port_inventory
+from device_pool import DevicePool
+from esp32_emulator import ESP32Emulator
+from port_inventory import PortInventory
+from serial_controller import SerialController
+from test_helpers import wait_for
+
+class FakeSystem:
+    """Stands in for comports() and /dev so ports can be plugged in on demand"""
+
+    def __init__(self):
+        self.dev_dir = tempfile.mkdtemp(prefix='dev-')
+        self.ports = []
+        self.scans = 0
+
+    def comports(self):
+        self.scans += 1
+        return list(self.ports)
+
+    def plug(self, device, vid=None, description='n/a'):
+        info = ListPortInfo(device, skip_link_detection=True)
+        info.vid, info.pid, info.description = vid, 0xEA60 if vid else None, description
+        self.ports.append(info)
+        open(os.path.join(self.dev_dir, os.path.basename(device)), 'w').close()
+
+    def __enter__(self):
+        self._saved = serial.tools.list_ports.comports, port_inventory.DEV_DIR
+        serial.tools.list_ports.comports = self.comports
+        port_inventory.DEV_DIR = self.dev_dir
+        return self
+
+    def __exit__(self, *exc):
+        serial.tools.list_ports.comports, port_inventory.DEV_DIR = self._saved
+        for name in os.listdir(self.dev_dir):
+            os.remove(os.path.join(self.dev_dir, name))
+        os.rmdir(self.dev_dir)
+
+def test_cached_listing_and_change_events():
+    print("🧪 Testing the cached port inventory")
+    print("=" * 50)
+
+    with FakeSystem() as system:
+        system.plug('/dev/ttyS0')
+        inventory = PortInventory(watch_interval=0.02, rescan_interval=3600)
+        events = []
+        inventory.add_listener(lambda added, removed: events.append((added, removed)))
+        inventory.start()
+        try:
+            scans = system.scans
+            for _ in range(100):
+                assert inventory.get_available_ports()[0]['device'] == '/dev/ttyS0'
+            time.sleep(0.1)
+            assert system.scans == scans, "listing or idle watching enumerated ports"
+
+            system.plug('/dev/ttyUSB0', vid=0x10C4, description='CP2102 USB to UART')
+            assert wait_for(lambda: events == [(['/dev/ttyUSB0'], [])])
+            assert [port['device'] for port in inventory.get_available_ports()] == ['/dev/ttyS0', '/dev/ttyUSB0']
+            print(f"  Hotplug noticed with {system.scans - scans} extra scan(s)")
+        finally:
+            inventory.stop()
+    print("✅ Ports are served from memory and rescanned only on changes")
+
+def test_deferred_first_scan():
+    print("\n🧪 Testing a first scan left to a startup task")
+    print("=" * 50)
+
+    with FakeSystem() as system:
+        system.plug('/dev/ttyUSB0', vid=0x10C4, description='CP2102 USB to UART')
+        inventory = PortInventory(scan=False)
+        events = []
+        inventory.add_listener(lambda added, removed: events.append((added, removed)))
+        assert system.scans == 0
+
+        # The first scan is the baseline, not a hotplug
+        inventory.ensure_scanned()
+        assert system.scans == 1 and events == []
+        assert [port.device for port in inventory.ports()] == ['/dev/ttyUSB0']
+        inventory.ensure_scanned()
+        assert system.scans == 1
+        system.plug('/dev/ttyUSB1', vid=0x10C4, description='CP2102 USB to UART')
+        assert inventory.refresh() and events == [(['/dev/ttyUSB1'], [])]
+
+        # Reading the ports first scans on demand
+        assert PortInventory(scan=False).get_available_ports()[0]['device'] == '/dev/ttyUSB0'
+        assert system.scans == 3
+    print("✅ The constructor can leave the scan for later")
+
+def test_hotplugged_boards_connect():
+    print("\n🧪 Testing boards plugged in after startup")
+    print("=" * 50)
+
+    emulators = [ESP32Emulator(transition_seconds=0.01) for _ in range(2)]
+    for emulator in emulators:
+        emulator.start()
+    with FakeSystem() as system:
+        inventory = PortInventory(watch_interval=0.02, rescan_interval=3600)
+        inventory.start()
+        pinned = DevicePool({'stage': emulators[0].port}, settle_seconds=0, inventory=inventory)
+        discovered = DevicePool(settle_seconds=0, inventory=inventory)
+        try:
+            assert not discovered.connect()
+            assert not pinned.is_connected() and discovered.get_device_names() == []
+
+            # The pinned board reopens, and the new ESP32 is registered and opened
+            system.plug(emulators[0].port)
+            system.plug(emulators[1].port, vid=0x10C4, description='CP2102 USB to UART')
+            assert wait_for(pinned.is_connected)
+            assert wait_for(discovered.is_connected)
+            assert discovered.get_device_names() == ['ttyESP32']
+            assert discovered.send_color(1, 2, 3)[0]
+            assert wait_for(lambda: emulators[1].color == (1, 2, 3))
+        finally:
+            inventory.stop()
+            pinned.disconnect()
+            discovered.disconnect()
+            for emulator in emulators:
+                emulator.stop()
+    print("✅ Plugged-in boards connect without waiting for a color")
+
+def test_description_fallback():
+    print("\n🧪 Testing ESP32 discovery by description")
+    print("=" * 50)
+
+    with FakeSystem() as system:
+        system.plug('/dev/ttyUSB0', description='USB-Serial Controller')
+        controller = SerialController()
+        assert controller.find_esp32_ports() == ['/dev/ttyUSB0']
+        print("  With no VID match, the description is used")
+
+        # A board found by VID means the unrelated USB-serial adapter is left alone
+        system.plug('/dev/ttyUSB1', vid=0x10C4, description='CP2102 USB to UART')
+        assert controller.find_esp32_ports() == ['/dev/ttyUSB1']
+    print("✅ Description matching is only a fallback")
+
+if __name__ == "__main__":
+    test_cached_listing_and_change_events()
+    test_deferred_first_scan()
+    test_hotplugged_boards_connect()
+    test_description_fallback()
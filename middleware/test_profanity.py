@@ -4,7 +4,7 @@ Test script to verify profanity filtering in usernames
 """
 import sys
 import os
-sys.path.append('/Users/nathan/Documents/GitHub/rgboo/middleware')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from better_profanity import profanity
 
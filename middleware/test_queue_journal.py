@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Test script for the crash-safe queue journal and restart recovery
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+import queue_journal
+from color_queue import ColorQueue
+from queue_journal import QueueJournal
+from test_queue_timing import MockSerialController
+
+def test_restart_recovery():
+    print("🧪 Testing Queue Journal Recovery")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'journal.log')
+
+        journal = QueueJournal(path)
+        queue = ColorQueue(MockSerialController(), journal=journal, coalesce=True)
+        assert queue.restore_from_journal() == 0
+
+        first = queue.add_request("user1", 255, 0, 0)
+        second = queue.add_request("user2", 0, 255, 0)
+        third = queue.add_request("user3", 0, 0, 255)
+        queue.add_request("user1", 1, 2, 3)  # coalesced into the first request
+        queue.cancel_request(second['request_id'])
+        # Simulate a crash: fsync without the orderly close
+        journal.sync()
+
+        restarted = ColorQueue(MockSerialController(), journal=QueueJournal(path))
+        assert restarted.restore_from_journal() == 2
+        contents = restarted.get_queue_contents()
+        assert [item['request_id'] for item in contents] == [first['request_id'], third['request_id']]
+        assert restarted.get_request_status(first['request_id'])['color'] == {'r': 1, 'g': 2, 'b': 3}
+
+        # New requests never reuse a restored id
+        fresh = restarted.add_request("user4", 9, 9, 9)
+        assert fresh['request_id'] not in (first['request_id'], third['request_id'])
+        restarted.journal.close()
+        print(f"  Restored {len(contents)} pending requests")
+
+        # A torn last line from a crash mid-write is skipped
+        with open(path, 'a') as f:
+            f.write('{"op":"enqueue","id":"tor')
+        again = ColorQueue(MockSerialController(), journal=QueueJournal(path))
+        assert again.restore_from_journal() == 3
+        again.journal.close()
+
+    print("✅ Pending requests survive a restart")
+
+def test_large_journal_recovery():
+    print("\n🧪 Testing Recovery Time for a Large Journal")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'journal.log')
+
+        # 100k journal records: 50k enqueues, all but 1000 of them dispatched again
+        with open(path, 'w') as f:
+            for i in range(50000):
+                f.write(json.dumps({'op': 'enqueue', 'id': f"bench-{i}", 'user': f"user{i % 500}",
+                                    'r': i % 256, 'g': 0, 'b': 0, 'seq': i + 1, 't': time.time()}) + '\n')
+            for i in range(49000):
+                f.write(json.dumps({'op': 'dispatch', 'id': f"bench-{i}"}) + '\n')
+
+        started = time.perf_counter()
+        restarted = ColorQueue(MockSerialController(), journal=QueueJournal(path))
+        restored = restarted.restore_from_journal()
+        elapsed = time.perf_counter() - started
+        restarted.journal.close()
+        print(f"  Restored {restored} requests in {elapsed * 1000:.0f} ms")
+        assert restored == 1000
+        assert elapsed < 1.0
+        assert restarted.journal.get_stats()['records'] == 1000  # compacted on recovery
+
+    print("✅ Recovery stays under a second")
+
+def test_compaction():
+    print("\n🧪 Testing Background Compaction")
+    print("=" * 50)
+
+    original = queue_journal.COMPACT_MIN_RECORDS
+    queue_journal.COMPACT_MIN_RECORDS = 100
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            journal = QueueJournal(os.path.join(tmp, 'journal.log'), sync_interval=0.01)
+            queue = ColorQueue(MockSerialController(), journal=journal)
+            queue.restore_from_journal()
+            requests = [queue.add_request(f"user{i}", 0, 0, 0) for i in range(200)]
+            for request in requests[:190]:
+                queue.cancel_request(request['request_id'])
+            time.sleep(0.2)
+            stats = journal.get_stats()
+            journal.close()
+            print(f"  {stats}")
+            assert stats['compactions'] >= 1 and stats['records'] == 10
+    finally:
+        queue_journal.COMPACT_MIN_RECORDS = original
+
+    print("✅ Dead records are compacted away")
+
+def test_appends_during_compaction():
+    print("\n🧪 Testing Appends While a Compaction Is Writing")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'journal.log')
+        journal = QueueJournal(path, sync_interval=3600)
+        queue = ColorQueue(MockSerialController(), journal=journal)
+        queue.restore_from_journal()
+        first = queue.add_request("user1", 1, 1, 1)
+
+        # Hold the snapshot's fsync, as a slow SD card would
+        writing, release = threading.Event(), threading.Event()
+        original = queue_journal.offload
+        def slow_offload(func, *args):
+            if func is os.fsync and threading.current_thread().name == 'compactor':
+                writing.set()
+                release.wait(5)
+            return original(func, *args)
+
+        queue_journal.offload = slow_offload
+        try:
+            compactor = threading.Thread(target=journal._compact, name='compactor')
+            compactor.start()
+            assert writing.wait(2)
+            started = time.perf_counter()
+            second = queue.add_request("user2", 2, 2, 2)
+            queue.cancel_request(first['request_id'])
+            elapsed = time.perf_counter() - started
+            release.set()
+            compactor.join(2)
+        finally:
+            queue_journal.offload = original
+        print(f"  Enqueue and cancel during the compaction took {elapsed * 1000:.1f} ms")
+        assert elapsed < 0.1
+        # The one-record snapshot plus the two lines appended meanwhile
+        assert journal.get_stats()['records'] == 3
+        journal.close()
+
+        restarted = ColorQueue(MockSerialController(), journal=QueueJournal(path))
+        assert restarted.restore_from_journal() == 1
+        assert [item['request_id'] for item in restarted.get_queue_contents()] == [second['request_id']]
+        restarted.journal.close()
+
+    print("✅ Compaction does not block the queue")
+
+if __name__ == "__main__":
+    test_restart_recovery()
+    test_large_journal_recovery()
+    test_compaction()
+    test_appends_during_compaction()
@@ -4,14 +4,22 @@ Test script to demonstrate the fixed color queue timing
 """
 import sys
 import time
+from concurrent.futures import Future
 from datetime import datetime
+from clock import ScaledClock
 from color_queue import ColorQueue
+from test_helpers import wait_for
 
 class MockSerialController:
-    def send_color(self, r, g, b):
+    def send_color(self, r, g, b, devices=None):
         print(f"Mock ESP32: Received RGB({r}, {g}, {b})")
         return True, "Success"
 
+    def send_color_async(self, r, g, b, devices=None):
+        future = Future()
+        future.set_result(self.send_color(r, g, b))
+        return future
+
 def mock_obs_callback(username):
     print(f"Mock OBS: Updated username to {username}")
     return True
@@ -53,6 +61,16 @@ def test_queue_timing():
     for i, item in enumerate(contents, 1):
         print(f"  {i}. {item['username']} - Scheduled: {item['scheduled_time'][:19]} - Position: {item['queue_position']}")
     
+    # Cancel the middle request and check positions shift without draining the queue
+    print(f"\n🗑️  Cancelling user2's request:")
+    assert queue.cancel_request(request2['request_id'])
+    assert queue.get_position(request2['request_id']) is None
+    assert queue.get_request_status(request2['request_id'])['state'] == 'cancelled'
+    assert queue.get_request_status(request3['request_id'])['state'] == 'queued'
+    assert queue.get_position(request3['request_id']) == 2
+    assert queue.get_request_at(2)['username'] == "user3"
+    print(f"  user3 moved up to position {queue.get_position(request3['request_id'])}")
+
     print(f"\n✅ Queue is now properly maintaining order!")
     print(f"✅ Each user gets exactly 20 seconds of display time!")
     print(f"✅ Estimated wait times are calculated correctly!")
@@ -62,5 +80,144 @@ def test_queue_timing():
     print(f"  - user2: Shows after 20s (20s wait)")  
     print(f"  - user3: Shows after 40s (40s wait)")
     
+def test_fair_policy():
+    print("\n🧪 Testing Fair-Share Scheduling")
+    print("=" * 50)
+
+    queue = ColorQueue(MockSerialController(), mock_obs_callback, policy='fair')
+
+    # One user floods the queue before two others arrive
+    flood = [queue.add_request("flooder", 255, 255, 255) for _ in range(5)]
+    alice = queue.add_request("alice", 255, 0, 0)
+    bob = queue.add_request("bob", 0, 0, 255)
+
+    order = [item['username'] for item in queue.get_queue_contents()]
+    print(f"  Dispatch order: {order}")
+    assert order == ["flooder", "alice", "bob", "flooder", "flooder", "flooder", "flooder"]
+    assert alice['queue_position'] == 2 and bob['queue_position'] == 3
+
+    # ETAs follow positions: the flooder's later requests moved back two slots
+    status = queue.get_request_status(flood[1]['request_id'])
+    assert status['queue_position'] == 4
+    assert status['estimated_wait_seconds'] >= 3 * 20 - 1
+
+    # Cancelling closes the gap for everyone behind it
+    assert queue.cancel_request(alice['request_id'])
+    assert queue.get_position(bob['request_id']) == 2
+    assert queue.get_queue_status()['policy'] == 'fair'
+    print("✅ Other users are interleaved with the flooder's requests")
+
+def test_coalescing():
+    print("\n🧪 Testing Per-User Coalescing")
+    print("=" * 50)
+
+    queue = ColorQueue(MockSerialController(), mock_obs_callback, coalesce=True)
+    first = queue.add_request("user1", 255, 0, 0)
+    other = queue.add_request("user2", 0, 255, 0)
+    before = queue.get_request_status(other['request_id'])['scheduled_time']
+
+    # A second submission replaces the pending color without taking a new slot
+    second = queue.add_request("user1", 0, 0, 255)
+    assert second['coalesced'] and not first['coalesced']
+    assert second['request_id'] == first['request_id']
+    assert second['queue_position'] == 1
+    assert queue.get_queue_status()['queue_size'] == 2
+    assert queue.get_request_status(first['request_id'])['color'] == {'r': 0, 'g': 0, 'b': 255}
+    assert queue.get_request_status(other['request_id'])['scheduled_time'] == before
+
+    # Once the pending request is gone the user queues normally again
+    assert queue.cancel_request(first['request_id'])
+    third = queue.add_request("user1", 10, 10, 10)
+    assert not third['coalesced'] and third['queue_position'] == 2
+    print("✅ Repeat submissions reuse the pending slot")
+
+def test_adaptive_slots():
+    print("\n🧪 Testing Adaptive Slot Duration")
+    print("=" * 50)
+
+    queue = ColorQueue(MockSerialController(), mock_obs_callback, adaptive_slots=True, min_slot=5, target_depth=4)
+    first = queue.add_request("user0", 0, 0, 0)
+    for i in range(1, 4):
+        queue.add_request(f"user{i}", i, i, i)
+    assert queue.get_queue_status()['slot_seconds'] == 20
+
+    # Twice the target depth halves the slot, and every ETA follows
+    for i in range(4, 8):
+        queue.add_request(f"user{i}", i, i, i)
+    assert queue.get_queue_status()['slot_seconds'] == 10
+    last = queue.get_request_at(8)
+    assert 75 <= last['estimated_wait_seconds'] <= 80
+    assert queue.get_request_status(first['request_id'])['estimated_wait_seconds'] <= 10
+
+    # Never below the floor
+    for i in range(8, 40):
+        queue.add_request(f"user{i}", i, i, i)
+    assert queue.get_queue_status()['slot_seconds'] == 5
+    print(f"  Slot at depth 40: {queue.get_queue_status()['slot_seconds']}s")
+
+    # Relaxes back as the queue drains
+    queue.clear_queue()
+    queue.add_request("late", 1, 2, 3)
+    assert queue.get_queue_status()['slot_seconds'] == 20
+    print("✅ Slots shrink with depth and recover when the queue drains")
+
+class RecordingClock(ScaledClock):
+    """ScaledClock that records the timeout of every worker wait"""
+
+    def __init__(self, speed):
+        super().__init__(speed)
+        self.waits = []
+
+    def wait(self, condition, timeout=None):
+        self.waits.append(timeout)
+        return super().wait(condition, timeout)
+
+def test_worker_wakeups():
+    print("\n🧪 Testing Worker Wakeups")
+    print("=" * 50)
+
+    speed = 40  # a 20 s slot passes in 0.5 s
+    clock = RecordingClock(speed)
+    queue = ColorQueue(MockSerialController(), clock=clock)
+    queue.start_worker()
+    try:
+        # Idle: the worker sleeps until something is queued
+        assert wait_for(lambda: clock.waits[-1:] == [None])
+
+        # A request wakes it, and it sleeps again until that request's slot
+        queue.add_request("user1", 1, 1, 1)
+        assert wait_for(lambda: clock.waits[-1] is not None)
+        assert 19 < clock.waits[-1] <= 20
+
+        # Clearing wakes it back to an idle sleep
+        queue.clear_queue()
+        assert wait_for(lambda: clock.waits[-1] is None)
+
+        # Dispatched on its deadline after one sleep, not by polling
+        waits = len(clock.waits)
+        queue.add_request("user2", 2, 2, 2)
+        assert wait_for(lambda: queue.get_dispatch_jitter()['count'] == 1)
+        late_ms = queue.get_dispatch_jitter()['last'] / speed
+        print(f"  Dispatched {late_ms:.2f} ms after its deadline, {len(clock.waits) - waits} wait(s)")
+        assert late_ms < 20
+        assert len(clock.waits) - waits <= 3
+
+        # Stopping interrupts a sleep toward the next deadline
+        queue.add_request("user3", 3, 3, 3)
+        assert wait_for(lambda: (clock.waits[-1] or 0) > 1)
+        started = time.perf_counter()
+        queue.stop_worker()
+        queue.worker_thread.join(1)
+        elapsed = time.perf_counter() - started
+        assert not queue.worker_thread.is_alive() and elapsed < 0.1
+        print(f"  Worker stopped in {elapsed * 1000:.1f} ms")
+    finally:
+        queue.stop_worker()
+    print("✅ The worker sleeps until the deadline and wakes on every change")
+
 if __name__ == "__main__":
-    test_queue_timing()
\ No newline at end of file
+    test_queue_timing()
+    test_fair_policy()
+    test_coalescing()
+    test_adaptive_slots()
+    test_worker_wakeups()
\ No newline at end of file
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Test script for the /queue position update broadcaster
+"""
+import threading
+
+from flask import Flask, request
+
+import queue_updates
+from clock import SimulatedClock
+from color_queue import ColorQueue
+from queue_updates import QUEUE_NAMESPACE, UPDATE_INTERVAL, QueueUpdateBroadcaster, setup_queue_updates
+from simulate_queue import NullSerialController
+
+class FakeSocketIO:
+    """Records emits; the broadcast loop only ticks when the test calls tick()"""
+
+    def __init__(self):
+        self.emits = []
+        self.intervals = []
+        self.handlers = {}
+        self._go = threading.Semaphore(0)
+        self._idle = threading.Event()
+
+    def start_background_task(self, target):
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        return thread
+
+    def on(self, event, namespace=None):
+        def register(handler):
+            self.handlers[event] = handler
+            return handler
+        return register
+
+    def sleep(self, seconds):
+        self.intervals.append(seconds)
+        self._idle.set()
+        self._go.acquire()
+
+    def emit(self, event, data, to=None, namespace=None):
+        assert event == 'queue_update' and namespace == QUEUE_NAMESPACE
+        self.emits.append((to, data['state'], data.get('queue_position')))
+
+    def tick(self):
+        """Let the loop run one tick; returns what it emitted"""
+        assert self._idle.wait(2)
+        self._idle.clear()
+        sent = len(self.emits)
+        self._go.release()
+        assert self._idle.wait(2)
+        return self.emits[sent:]
+
+def dispatch_next(queue, clock):
+    clock.advance_to(queue.next_due_time())
+    assert queue.dispatch_due() is not None
+
+def test_broadcaster_ticks():
+    print("🧪 Testing queue update ticks")
+    print("=" * 50)
+
+    clock = SimulatedClock()
+    queue = ColorQueue(NullSerialController(), clock=clock)
+    ids = [queue.add_request(f"user{i}", i, i, i)['request_id'] for i in range(4)]
+    socketio = FakeSocketIO()
+    broadcaster = QueueUpdateBroadcaster(socketio, queue)
+    broadcaster.subscribe('sid-a', ids[1])
+    broadcaster.subscribe('sid-a', ids[2])
+    broadcaster.subscribe('sid-b', ids[2])
+    broadcaster.start()
+
+    assert socketio.tick() == []
+    assert socketio.intervals[0] == UPDATE_INTERVAL
+
+    # Several changes within one tick become one emit per room
+    queue.cancel_request(ids[0])
+    queue.add_request('late', 1, 1, 1)
+    queue.add_request('later', 2, 2, 2)
+    emitted = socketio.tick()
+    print(f"  3 queue changes, 1 tick: {emitted}")
+    assert sorted(emitted) == [(ids[1], 'queued', 1), (ids[2], 'queued', 2)]
+
+    # Changes that move nobody subscribed send nothing
+    queue.add_request('another', 3, 3, 3)
+    assert socketio.tick() == []
+    assert socketio.tick() == []
+
+    dispatch_next(queue, clock)
+    assert sorted(socketio.tick()) == [(ids[1], 'displaying', None), (ids[2], 'queued', 1)]
+
+    # Finished requests are sent once more, then their rooms are dropped
+    dispatch_next(queue, clock)
+    assert sorted(socketio.tick()) == [(ids[1], 'done', None), (ids[2], 'displaying', None)]
+    assert ids[1] not in broadcaster._subscribers and ids[1] not in broadcaster._last_sent
+    assert broadcaster.subscriber_count() == 2
+
+    dispatch_next(queue, clock)
+    assert socketio.tick() == [(ids[2], 'done', None)]
+    assert broadcaster.subscriber_count() == 0
+    assert not broadcaster._subscribers and not broadcaster._last_sent
+    dispatch_next(queue, clock)
+    assert socketio.tick() == []
+    print("  Finished rooms cleaned up")
+    print("✅ One emit per changed room per tick")
+
+def test_malformed_subscriptions():
+    print("\n🧪 Testing malformed /queue payloads")
+    print("=" * 50)
+
+    queue = ColorQueue(NullSerialController(), clock=SimulatedClock())
+    request_id = queue.add_request('viewer', 1, 2, 3)['request_id']
+    socketio = FakeSocketIO()
+    replies, rooms = [], []
+    patched = {name: getattr(queue_updates, name) for name in ('emit', 'join_room', 'leave_room')}
+    queue_updates.emit = lambda event, data: replies.append(event)
+    queue_updates.join_room = rooms.append
+    queue_updates.leave_room = rooms.remove
+    try:
+        broadcaster = setup_queue_updates(socketio, queue)
+        with Flask(__name__).test_request_context():
+            request.sid = 'sid-a'
+            for event in ('subscribe', 'unsubscribe'):
+                for payload in ('oops', ['x'], 42, None, {}, {'request_id': 5}):
+                    socketio.handlers[event](payload)
+                    assert replies.pop() == 'queue_error', (event, payload)
+            assert rooms == [] and broadcaster.subscriber_count() == 0
+            print("  Strings, lists and bad ids get queue_error")
+
+            socketio.handlers['subscribe']({'request_id': request_id})
+            assert replies == ['queue_update'] and rooms == [request_id]
+            socketio.handlers['unsubscribe']({'request_id': request_id})
+            assert rooms == [] and broadcaster.subscriber_count() == 0
+    finally:
+        for name, function in patched.items():
+            setattr(queue_updates, name, function)
+    print("✅ Only well-formed subscriptions join a room")
+
+if __name__ == "__main__":
+    test_broadcaster_ticks()
+    test_malformed_subscriptions()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test script for the serial reconnect supervisor against the virtual ESP32
+"""
+import os
+import tempfile
+import time
+
+from esp32_emulator import ESP32Emulator
+from metrics import registry
+from serial_controller import SerialController
+from test_helpers import wait_for
+
+def test_backoff():
+    controller = SerialController(max_retry_delay=2.0)
+    delays = [controller._backoff_delay(attempt) for attempt in range(8)]
+    assert 0.125 <= delays[0] <= 0.25
+    assert 0.25 <= delays[1] <= 0.5
+    assert all(1.0 <= delay <= 2.0 for delay in delays[4:])
+
+def test_unplug_and_replug():
+    print("🧪 Testing reconnects with backoff and color replay")
+    print("=" * 50)
+
+    link_dir = tempfile.mkdtemp(prefix='esp32-')
+    link = os.path.join(link_dir, 'ttyESP32')
+    emulator = ESP32Emulator(transition_seconds=0.01, link_path=link)
+    emulator.start()
+    controller = SerialController(port=link, settle_seconds=0, max_retry_delay=0.5)
+    reconnects = registry.get('rgb_serial_reconnects')
+    failures = registry.get('rgb_serial_reconnect_failures')
+    try:
+        counted, failed = reconnects.value, failures.value
+        controller.start_supervisor()
+        assert wait_for(controller.is_connected)
+        assert reconnects.value == counted, "the first connection counted as a reconnect"
+        assert controller.send_color(10, 20, 30)[0]
+        assert wait_for(lambda: emulator.color == (10, 20, 30))
+
+        # A reset board (reopened port) gets its color back
+        emulator.disconnect()
+        assert wait_for(lambda: emulator.stats['colors'] >= 2, timeout=4)
+        assert wait_for(lambda: emulator.color == (10, 20, 30))
+        print("  Color replayed after a link reset")
+
+        # While unplugged, sends fail fast instead of reconnecting inline
+        emulator.stop()
+        assert wait_for(lambda: not controller.is_connected())
+        started = time.monotonic()
+        success, message = controller.send_color(40, 50, 60)
+        elapsed = time.monotonic() - started
+        assert not success and 'disconnected' in message
+        assert elapsed < 0.1
+        print(f"  Send while unplugged failed in {elapsed * 1000:.1f} ms: {message}")
+        assert wait_for(lambda: controller.reconnect_attempts >= 2)
+        assert reconnects.value > counted + 1
+        assert failures.value >= failed + 2
+
+        # Plugged back in: the newest color is shown without being resent
+        emulator = ESP32Emulator(transition_seconds=0.01, link_path=link)
+        emulator.start()
+        assert wait_for(controller.is_connected, timeout=3)
+        assert wait_for(lambda: emulator.color == (40, 50, 60))
+        assert controller.reconnect_attempts == 0
+    finally:
+        controller.stop_supervisor()
+        controller.disconnect()
+        emulator.stop()
+        os.rmdir(link_dir)
+    print("✅ The supervisor reconnects and restores the latest color")
+
+def test_heartbeat():
+    print("\n🧪 Testing heartbeats on a hung board")
+    print("=" * 50)
+
+    emulator = ESP32Emulator(transition_seconds=0.01)
+    emulator.start()
+    controller = SerialController(port=emulator.port, settle_seconds=0,
+                                  heartbeat_interval=0.1, heartbeat_timeout=0.1)
+    misses = registry.get('rgb_serial_heartbeat_misses')
+    try:
+        controller.start_supervisor()
+        assert wait_for(controller.is_connected)
+        time.sleep(0.5)
+        before = misses.value
+        assert before == 0, "a healthy board missed heartbeats"
+
+        connects = registry.get('rgb_serial_connects').value
+        emulator.paused = True
+        assert wait_for(lambda: misses.value >= before + 2)
+        emulator.paused = False
+        assert wait_for(lambda: registry.get('rgb_serial_connects').value > connects)
+        assert wait_for(controller.is_connected)
+        print(f"  {misses.value - before} missed heartbeats triggered a reconnect")
+    finally:
+        controller.stop_supervisor()
+        controller.disconnect()
+        emulator.stop()
+    print("✅ A board that stops answering is reopened")
+
+if __name__ == "__main__":
+    test_backoff()
+    test_unplug_and_replug()
+    test_heartbeat()
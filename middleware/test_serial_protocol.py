@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Test script for the binary serial framing used with the ESP32
+"""
+from serial_protocol import crc8, encode_rgb_frame, decode_frame, SYNC, OP_SET_RGB, FRAME_LENGTH
+
+def test_serial_protocol():
+    print("📦 Testing Binary Serial Framing")
+    print("=" * 40)
+
+    # CRC-8/SMBUS check value
+    assert crc8(b"123456789") == 0xF4
+    print("  ✓ CRC8 check value matches CRC-8/SMBUS")
+
+    frame = encode_rgb_frame(255, 128, 64)
+    print(f"  Frame for RGB(255, 128, 64): {frame.hex(' ')}")
+    assert len(frame) == FRAME_LENGTH
+    assert frame[0] == SYNC
+    assert decode_frame(frame) == (OP_SET_RGB, bytes((255, 128, 64)))
+
+    # Corrupt one payload byte - the CRC must catch it
+    corrupted = frame[:2] + bytes((frame[2] ^ 0x01,)) + frame[3:]
+    assert decode_frame(corrupted) is None
+    print("  ✓ Corrupted frame rejected")
+
+    text_size = len("RGB:255,128,64\n")
+    print(f"\n✅ {FRAME_LENGTH} bytes per color instead of {text_size}")
+
+if __name__ == "__main__":
+    test_serial_protocol()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Test script for the async serving helpers
+"""
+import os
+import subprocess
+import sys
+import threading
+
+from serving import ASYNC_THREADING, offload, prepare_async_mode
+
+# Run in a fresh interpreter so monkey-patching does not leak into the other tests
+EVENTLET_CHECK = '''
+from serving import ASYNC_EVENTLET, is_green, offload, prepare_async_mode
+assert prepare_async_mode(ASYNC_EVENTLET) == ASYNC_EVENTLET and is_green()
+
+import threading, time
+from eventlet.patcher import original
+real_threading = original('threading')
+
+hub_thread = real_threading.get_ident()
+ticks = []
+def ticker():
+    while len(ticks) < 5:
+        ticks.append(1)
+        time.sleep(0.01)
+threading.Thread(target=ticker).start()
+
+def blocking():
+    original('time').sleep(0.2)  # a slow C call, like a SQLite commit
+    return real_threading.get_ident()
+
+worker_thread = offload(blocking)
+assert worker_thread != hub_thread, "offload ran on the event loop thread"
+assert len(ticks) == 5, f"event loop stalled during offload ({len(ticks)} ticks)"
+print("ok")
+'''
+
+def test_threading_mode():
+    print("🧪 Testing threading mode")
+    print("=" * 50)
+
+    assert prepare_async_mode(ASYNC_THREADING) == ASYNC_THREADING
+    assert offload(threading.get_ident) == threading.get_ident()
+    try:
+        prepare_async_mode('asgi')
+        assert False, "unknown mode accepted"
+    except ValueError:
+        pass
+    print("✅ Blocking calls run inline and unknown modes are rejected")
+
+def test_eventlet_offload():
+    print("\n🧪 Testing eventlet offload")
+    print("=" * 50)
+
+    result = subprocess.run([sys.executable, '-c', EVENTLET_CHECK], capture_output=True, text=True, timeout=30,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == 'ok'
+    print("✅ Blocking calls run on a native thread while green threads keep running")
+
+if __name__ == "__main__":
+    test_threading_mode()
+    test_eventlet_offload()
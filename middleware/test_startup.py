@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test script for background startup tasks and the /ready endpoint
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+from flask import Flask
+
+from esp32_emulator import ESP32Emulator
+from startup import StartupTasks, setup_ready_routes
+
+MIDDLEWARE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Boots app.py in a scratch directory and reports its startup status
+BOOT_SCRIPT = """
+import json, sys
+sys.path.insert(0, sys.argv[1])
+import app
+assert not hasattr(app, 'app'), "importing app.py built an app"
+application = app.create_app(app.startup)
+client = application.test_client()
+app.startup.accepting()
+app.startup.wait(timeout=10)
+response = client.get('/ready')
+# A second app gets its own components, gauges and database
+first = application.extensions['middleware']
+second = app.create_app(db_path='second.db')
+other = second.extensions['middleware']
+assert other['color_queue'] is not first['color_queue'] and other['database'] is not first['database']
+other['color_queue'].add_request('viewer', 1, 2, 3)
+assert 'rgb_queue_depth 1' in second.test_client().get('/metrics').get_data(as_text=True)
+assert 'rgb_queue_depth 0' in client.get('/metrics').get_data(as_text=True)
+other['cleanup']()
+# Tearing it down leaves the first app's database open
+first['database']().log_request('viewer', 1, 2, 3)
+assert first['database']().flush() == 1
+print(json.dumps({'code': response.status_code, 'status': response.get_json()}))
+application.extensions['middleware']['cleanup']()
+"""
+
+class FakeDevices:
+    def is_connected(self):
+        return False
+
+def test_ready_endpoint():
+    print("🧪 Testing startup tasks and /ready")
+    print("=" * 50)
+
+    startup = StartupTasks()
+    startup.mark('imports')
+    app = Flask(__name__)
+    setup_ready_routes(app, startup, FakeDevices())
+    client = app.test_client()
+
+    release = threading.Event()
+    startup.run_in_background('database', lambda: None)
+    startup.run_in_background('serial', release.wait)
+    startup.accepting()
+    response = client.get('/ready')
+    assert response.status_code == 503
+    assert response.get_json()['tasks']['serial']['state'] == 'running'
+    assert response.get_json()['steps'].keys() == {'imports'}
+    print("  Not ready while the boards are still connecting")
+
+    release.set()
+    assert startup.wait(timeout=2)
+    status = client.get('/ready').get_json()
+    assert status['ready'] and status['ready_after_seconds'] is not None
+    assert client.get('/ready').status_code == 200
+
+    startup.run_in_background('moderation', lambda: 1 / 0)
+    assert not startup.wait(timeout=2)
+    response = client.get('/ready')
+    assert response.status_code == 503
+    assert response.get_json()['tasks']['moderation']['error'] == 'division by zero'
+    print("  A failed task keeps the app unready")
+    print("✅ /ready follows the background tasks")
+
+def test_app_starts_without_waiting():
+    print("\n🧪 Testing app startup with a board attached")
+    print("=" * 50)
+
+    emulator = ESP32Emulator(transition_seconds=0.01)
+    emulator.start()
+    workdir = tempfile.mkdtemp(prefix='startup-')
+    env = dict(os.environ, QUEUE_JOURNAL_PATH='', AUTO_RECONNECT='False', DEBUG='False',
+               SERIAL_DEVICES=f"board={emulator.port}")
+    try:
+        result = subprocess.run([sys.executable, '-c', BOOT_SCRIPT, MIDDLEWARE_DIR], cwd=workdir, env=env,
+                                capture_output=True, text=True, timeout=60)
+    finally:
+        emulator.stop()
+        shutil.rmtree(workdir)
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    status = report['status']
+    assert report['code'] == 200 and status['serial_connected']
+    assert set(status['tasks']) == {'ports', 'database', 'serial', 'moderation'}
+
+    setup = sum(seconds for step, seconds in status['steps'].items() if step != 'imports')
+    print(f"  Steps: {status['steps']}")
+    print(f"  Accepting after {status['accepting_after_seconds']}s, ready after {status['ready_after_seconds']}s")
+    assert setup < 0.5, "setup before accepting requests is slow"
+    print("✅ Requests are accepted while the hardware comes up")
+
+if __name__ == "__main__":
+    test_ready_endpoint()
+    test_app_starts_without_waiting()